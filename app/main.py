@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from dotenv import load_dotenv
+from typing import AsyncIterator
 import os
 
 # Ensure environment is loaded from the unified directory
@@ -12,6 +14,10 @@ from routes.sync import router as sync_router
 from routes.status import router as status_router
 from routes.logs import router as logs_router
 from routes.files_upload import router as files_upload_router
+from utils import metrics, profiling, tracing
+from utils.health import start_health_prober
+from utils.http_client import close_async_client
+from utils.warmup import start_model_keeper
 
 
 def require_api_key(authorization: str | None = Header(default=None)):
@@ -37,11 +43,69 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Continues the caller's trace when it sends a traceparent header. The span
+    # stays open until the body has been sent, so streamed responses count in full.
+    with tracing.span(f"{request.method} {request.url.path}", traceparent=request.headers.get("traceparent")) as span:
+        response = await call_next(request)
+        if span is not None and hasattr(response, "body_iterator"):
+            tracing.defer(span)
+            response.body_iterator = _end_span_after(response.body_iterator, span)
+        return response
+
+
+async def _end_span_after(body: AsyncIterator[bytes], span: tracing.Span) -> AsyncIterator[bytes]:
+    error = None
+    try:
+        async for chunk in body:
+            yield chunk
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        tracing.end(span, error)
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # X-Debug-Profile: cpu|memory, honoured only with DEBUG_PROFILE_HEADER=1
+    mode = profiling.requested_mode(request.headers.get(profiling.HEADER))
+    if not mode:
+        return await call_next(request)
+    try:
+        with profiling.profile(mode, f"{request.method}-{request.url.path}") as prof:
+            response = await call_next(request)
+    except profiling.ProfileBusy:
+        return await call_next(request)
+    response.headers["X-Profile-Output"] = prof.prefix
+    return response
+
+
+@app.on_event("startup")
+def warm_models():
+    # Loads OLLAMA_MODEL and OLLAMA_EMBED_MODEL in the background and renews them while busy
+    start_model_keeper(base_url=os.getenv("OLLAMA_URL"))
+    # /status serves the snapshot this refreshes in the background
+    start_health_prober()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await close_async_client()
+
+
 @app.get("/")
 def root():
     return {"service": "vofc-backend", "status": "ok"}
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Unauthenticated like /status so Prometheus can scrape it
+    return Response(metrics.render_prometheus(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
 # Protected routes
 app.include_router(process_one_router, dependencies=[Depends(require_api_key)])
 app.include_router(process_pending_router, dependencies=[Depends(require_api_key)])
@@ -2,10 +2,12 @@ from flask import Blueprint, request, jsonify
 from pathlib import Path
 from datetime import datetime
 from app.services.file_manager import list_pending, move_to_processed, move_to_errors
-from app.services.vofc_parser import read_file_text, parse_text_to_vofc
+from app.services.vofc_parser import read_file_text, parse_text_to_vofc, reprocess_failed_vofc
 from app.services.supabase_client import insert_submission_meta, update_submission_meta
 from app.utils.config import INCOMING_DIR, PROCESSED_DIR
 from app.utils.logger import get_logger
+from utils import tracing
+from utils.file_handler import UPLOAD_CHUNK_BYTES, StreamingUpload, UploadTooLarge
 from app.models.submission_schema import Submission, ProcessResult
 import json, uuid
 
@@ -24,10 +26,15 @@ def submit():
         f = request.files.get("file")
         if not f:
             return jsonify({"error": "file is required"}), 400
-        fname = f.filename or f"upload-{uuid.uuid4().hex}.bin"
-        dest = INCOMING_DIR / fname
-        dest.parent.mkdir(parents=True, exist_ok=True)
-        f.save(dest)
+        fname = Path(f.filename).name if f.filename else f"upload-{uuid.uuid4().hex}.bin"
+        # Stream to a temp file and rename into /incoming, so the watcher never sees a partial file
+        with StreamingUpload(str(INCOMING_DIR)) as upload:
+            try:
+                for chunk in iter(lambda: f.stream.read(UPLOAD_CHUNK_BYTES), b""):
+                    upload.write(chunk)
+            except UploadTooLarge as e:
+                return jsonify({"error": str(e)}), 413
+            dest = Path(upload.commit(fname))
         sub_id = uuid.uuid4().hex
         insert_submission_meta("submissions", {
             "id": sub_id,
@@ -49,24 +56,30 @@ def _process_file(path: Path, sub_id: str | None = None) -> ProcessResult:
     """Internal helper to process a single file."""
     sub_id = sub_id or uuid.uuid4().hex
     try:
-        text = read_file_text(path)
-        vofc = parse_text_to_vofc(text)
+        with tracing.span("extract", submission_id=sub_id, file=path.name):
+            text = read_file_text(path)
+        vofc = parse_text_to_vofc(text, doc_id=sub_id)
         out_name = f"{path.stem}.vofc.json"
         out_path = PROCESSED_DIR / out_name
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        out_path.write_text(json.dumps(vofc, indent=2))
-
-        move_to_processed(path)
-        update_submission_meta(
-            "submissions",
-            {"id": sub_id},
-            {
-                "status": "completed",
-                "output_name": out_name,
-                "completed_at": datetime.utcnow().isoformat() + "Z",
-            },
+        with tracing.span("persist", submission_id=sub_id):
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            out_path.write_text(json.dumps(vofc, indent=2))
+
+            move_to_processed(path)
+            update_submission_meta(
+                "submissions",
+                {"id": sub_id},
+                {
+                    "status": "completed",
+                    "output_name": out_name,
+                    "completed_at": datetime.utcnow().isoformat() + "Z",
+                },
+            )
+        return ProcessResult(
+            status="completed",
+            output_path=str(out_path),
+            meta={"submission_id": sub_id, "failed_chunks": vofc.get("failed_chunks", [])},
         )
-        return ProcessResult(status="completed", output_path=str(out_path))
     except Exception as e:
         move_to_errors(path, str(e))
         update_submission_meta(
@@ -112,6 +125,31 @@ def process_pending():
     return jsonify({"count": len(results), "results": results}), 200
 
 
+@bp.post("/reprocess-failed")
+def reprocess_failed():
+    """
+    JSON: { submission_id: string, output_name: string }
+    Reruns only the chunks that failed for a submission and merges them into its processed output.
+    """
+    body = request.get_json(silent=True) or {}
+    sub_id = body.get("submission_id")
+    out_name = body.get("output_name")
+    if not sub_id or not out_name:
+        return jsonify({"error": "submission_id and output_name are required"}), 400
+    out_path = PROCESSED_DIR / Path(out_name).name
+    if not out_path.exists():
+        return jsonify({"error": f"output not found: {out_path.name}"}), 404
+
+    existing = json.loads(out_path.read_text())
+    vofc = reprocess_failed_vofc(sub_id, existing)
+    out_path.write_text(json.dumps(vofc, indent=2))
+    return jsonify(ProcessResult(
+        status="completed",
+        output_path=str(out_path),
+        meta={"submission_id": sub_id, "failed_chunks": vofc["failed_chunks"]},
+    ).model_dump()), 200
+
+
 @bp.post("/sync")
 def sync():
     """
@@ -1,8 +1,8 @@
 from flask import Blueprint, jsonify
-import requests
-from app.utils.config import OLLAMA_URL, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
-from app.services.supabase_client import supabase
+from app.utils.config import OLLAMA_URL, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, INCOMING_DIR
 from app.utils.logger import get_logger
+from utils.health import start_health_prober
+from utils.warmup import model_keeper
 
 
 bp = Blueprint("health", __name__, url_prefix="/api/system")
@@ -11,20 +11,21 @@ logger = get_logger("health")
 
 @bp.get("/health")
 def health():
-    status = {"flask": "ok", "ollama": "down", "supabase": "down"}
-    # Ollama
-    try:
-        r = requests.get(f"{OLLAMA_URL}/api/tags", timeout=3)
-        status["ollama"] = "ok" if r.status_code == 200 else "down"
-    except Exception:
-        status["ollama"] = "down"
-    # Supabase
-    try:
-        if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY and supabase():
-            status["supabase"] = "ok"
-        else:
-            status["supabase"] = "not_configured"
-    except Exception:
-        status["supabase"] = "down"
+    """Served from the background prober's snapshot; never waits on Ollama or Supabase."""
+    prober = start_health_prober(
+        ollama_url=OLLAMA_URL,
+        supabase_url=SUPABASE_URL,
+        supabase_key=SUPABASE_SERVICE_ROLE_KEY,
+        incoming_dir=str(INCOMING_DIR),
+    )
+    snapshot = prober.snapshot()
+    status = {
+        "flask": "ok",
+        "ollama": snapshot["ollama"]["status"],
+        "supabase": snapshot["supabase"]["status"],
+        "checks": snapshot,
+    }
+    keeper = model_keeper()
+    if keeper:
+        status["models"] = keeper.status()
     return jsonify(status), 200
-
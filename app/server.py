@@ -1,8 +1,12 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from app.routes.health import bp as health_bp
 from app.routes.documents import bp as documents_bp
-from app.utils.config import ensure_dirs, HOST, PORT, FLASK_ENV
+from app.utils.config import ensure_dirs, HOST, PORT, FLASK_ENV, OLLAMA_URL, OLLAMA_MODEL, OLLAMA_EMBED_MODEL, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, INCOMING_DIR
 from app.utils.logger import get_logger
+from utils import metrics, profiling, tracing
+from utils.file_handler import MAX_UPLOAD_BYTES
+from utils.health import start_health_prober
+from utils.warmup import start_model_keeper
 
 
 logger = get_logger("server")
@@ -11,8 +15,23 @@ logger = get_logger("server")
 def create_app() -> Flask:
     ensure_dirs()
     app = Flask(__name__)
+    # Reject oversized request bodies before they are read (uploads also check while streaming)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES or None
+    # One trace span per request, continuing the caller's traceparent header
+    app.wsgi_app = tracing.wsgi_middleware(app.wsgi_app)
+    # X-Debug-Profile: cpu|memory, honoured only with DEBUG_PROFILE_HEADER=1
+    app.wsgi_app = profiling.wsgi_middleware(app.wsgi_app)
     app.register_blueprint(health_bp)
     app.register_blueprint(documents_bp)
+    # Preload the generation and embedding models in the background and keep them resident while documents are processed
+    start_model_keeper(models=[(OLLAMA_MODEL, False), (OLLAMA_EMBED_MODEL, True)], base_url=OLLAMA_URL)
+    # Health checks read a snapshot refreshed in the background
+    start_health_prober(
+        ollama_url=OLLAMA_URL,
+        supabase_url=SUPABASE_URL,
+        supabase_key=SUPABASE_SERVICE_ROLE_KEY,
+        incoming_dir=str(INCOMING_DIR),
+    )
 
 
     @app.get("/")
@@ -20,6 +39,11 @@ def create_app() -> Flask:
         return jsonify({"service": "ollama-backend", "env": FLASK_ENV})
 
 
+    @app.get("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render_prometheus(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
     return app
 
 
@@ -1,21 +1,37 @@
-import requests, json
+import json
 from typing import Any, Optional
 from app.utils.config import OLLAMA_URL, OLLAMA_MODEL
 from app.utils.logger import get_logger
+from utils.http_client import client
+from utils.ollama_client import generate_structured
+from utils.vofc_schema import Schema
 
 
 logger = get_logger("ollama-client")
 
 
-def generate(prompt: str, options: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+def generate(
+    prompt: str,
+    options: Optional[dict[str, Any]] = None,
+    schema: Optional[Schema] = None,
+    system: Optional[str] = None,
+) -> dict[str, Any]:
     """
     Calls Ollama /api/generate with a structured prompt.
     Expects model to return a single JSON payload block.
+    With `schema`, decoding is constrained to it and the validated payload is
+    returned (StructuredOutputError if it still does not fit); `system` then
+    carries the fixed instructions as a chat system message.
     """
+    if schema is not None:
+        return generate_structured(
+            prompt, schema, model=OLLAMA_MODEL, options=options, base_url=OLLAMA_URL, timeout=120, system=system
+        )
+
     url = f"{OLLAMA_URL}/api/generate"
     payload = {
         "model": OLLAMA_MODEL,
-        "prompt": prompt,
+        "prompt": f"{system}\n\n{prompt}" if system else prompt,
         "stream": False,
     }
     if options:
@@ -23,7 +39,7 @@ def generate(prompt: str, options: Optional[dict[str, Any]] = None) -> dict[str,
 
 
     logger.debug("Ollama request → %s", url)
-    r = requests.post(url, json=payload, timeout=120)
+    r = client(url).post(url, json=payload, timeout=120)
     r.raise_for_status()
     data = r.json()
     # Ollama returns {"response": "..."} — attempt to JSON-decode content
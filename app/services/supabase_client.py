@@ -1,6 +1,7 @@
 from typing import Optional, Any
 from app.utils.config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
 from app.utils.logger import get_logger
+from utils import metrics
 
 
 logger = get_logger("supabase-client")
@@ -33,7 +34,8 @@ def insert_submission_meta(table: str, row: dict[str, Any]) -> bool:
     if not sb:
         return False
     try:
-        sb.table(table).insert(row).execute()
+        with metrics.timer("supabase_write_seconds", table=table):
+            sb.table(table).insert(row).execute()
         return True
     except Exception as e:
         logger.error("Supabase insert failed: %s", e)
@@ -48,7 +50,8 @@ def update_submission_meta(table: str, match: dict[str, Any], patch: dict[str, A
         q = sb.table(table).update(patch)
         for k, v in match.items():
             q = q.eq(k, v)
-        q.execute()
+        with metrics.timer("supabase_write_seconds", table=table):
+            q.execute()
         return True
     except Exception as e:
         logger.error("Supabase update failed: %s", e)
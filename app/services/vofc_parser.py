@@ -8,11 +8,18 @@ Handles PDFs with tabular Category/Vulnerability/OFC layouts (SAFE, IST, CISA do
 
 from pathlib import Path
 from typing import Any, Dict, List
-import re, json, time
+import re, json
+from concurrent.futures import ThreadPoolExecutor
 
 from app.services.ollama_client import generate
 from app.utils.logger import get_logger
-from app.utils.config import OLLAMA_MODEL
+from app.utils.config import OLLAMA_MODEL, OLLAMA_URL
+from utils.chunk_retry import FailedChunkStore, reprocess_failed, run_with_retry
+from utils import metrics, tracing
+from utils.ollama_client import prompt_eval_per_call
+from utils.ollama_pool import get_pool
+from utils.text_cache import cached_extraction
+from utils.vofc_schema import VOFC_DOCUMENT
 
 
 logger = get_logger("vofc-parser")
@@ -22,7 +29,25 @@ logger = get_logger("vofc-parser")
 # 🔍 1. Robust Text Extraction
 # =============================
 def read_file_text(path: Path) -> str:
-    """Extracts text from PDF, DOCX, or text/HTML with best-effort fallbacks."""
+    """
+    Extracts text from PDF, DOCX, or text/HTML with best-effort fallbacks.
+    PDF and DOCX results are cached by file hash.
+    """
+    if path.suffix.lower() in {".pdf", ".docx"}:
+        try:
+            entry = cached_extraction(
+                str(path), "vofc_parser", "1",
+                lambda: {"text": _read_file_text(path)},
+                keep=lambda e: bool(e["text"].strip()),
+            )
+            return entry["text"]
+        except OSError as e:
+            logger.error("read_file_text failed: %s", e)
+            return ""
+    return _read_file_text(path)
+
+
+def _read_file_text(path: Path) -> str:
     try:
         if path.suffix.lower() == ".pdf":
             try:
@@ -63,7 +88,7 @@ def read_file_text(path: Path) -> str:
 # =======================================
 # 🧠 2. Enhanced Model Prompt Definition
 # =======================================
-PROMPT_TEMPLATE = """You are VOFC Engine, an analytical parser for DHS/CISA SAFE libraries.
+SYSTEM_PROMPT = """You are VOFC Engine, an analytical parser for DHS/CISA SAFE libraries.
 
 
 
@@ -117,9 +142,11 @@ If the text uses tabular SAFE formatting:
 
 - Return *only JSON*, no extra commentary.
 
+""" % {"model": OLLAMA_MODEL}
 
-
-Text snippet:
+# Per-chunk user message; the fixed instructions above go out as the chat
+# system message so Ollama reuses their evaluated tokens across chunks.
+CHUNK_TEMPLATE = """Text snippet:
 
 \"\"\"%(doc_text)s\"\"\"
 
@@ -144,26 +171,54 @@ def chunk_text(text: str, max_len: int = 6000) -> List[str]:
     return parts
 
 
-def parse_text_to_vofc(doc_text: str) -> Dict[str, Any]:
-    """Chunk document, call Ollama, merge structured results."""
-    chunks = chunk_text(doc_text)
+def _parse_chunk(chunk: str) -> Dict[str, Any]:
+    prompt = CHUNK_TEMPLATE % {"doc_text": chunk}
+    return generate(prompt, options={"num_predict": 4096}, schema=VOFC_DOCUMENT, system=SYSTEM_PROMPT)
+
+
+def parse_text_to_vofc(doc_text: str, doc_id: str | None = None) -> Dict[str, Any]:
+    """
+    Chunk document, call Ollama, merge structured results.
+    Failed chunks are retried, then recorded under `doc_id` for reprocess_failed_vofc().
+    """
+    with tracing.span("chunk", submission_id=doc_id, chars=len(doc_text)):
+        chunks = chunk_text(doc_text)
     results: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
     logger.info("Parsing document in %d chunk(s)", len(chunks))
 
-    for i, chunk in enumerate(chunks, start=1):
-        prompt = PROMPT_TEMPLATE % {"doc_text": chunk, "model": OLLAMA_MODEL}
-        try:
-            part = generate(prompt, options={"num_predict": 4096})
-            if isinstance(part, dict):
-                results.append(part)
-            else:
-                results.append({"raw": part})
+    # Pacing is left to the Ollama pool and its per-host limiters, which adapt to server latency
+    workers = max(1, min(len(chunks), get_pool(OLLAMA_URL).capacity()))
+    def _run(i: int, chunk: str):
+        with tracing.span("llm_chunk", submission_id=doc_id, chunk=i):
+            return run_with_retry(chunk, _parse_chunk, label=f"chunk-{i}")
+
+    with tracing.span("llm", submission_id=doc_id, chunks=len(chunks)), ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(tracing.wrap(_run), range(1, len(chunks) + 1), chunks))
+
+    for i, (parts, failures) in enumerate(outcomes, start=1):
+        results.extend(parts)
+        failed.extend(failures)
+        if failures:
+            logger.error("Chunk %d/%d failed after retries (%s)", i, len(chunks), failures[-1]["reason"])
+        else:
             logger.info("Chunk %d/%d parsed.", i, len(chunks))
-        except Exception as e:
-            logger.error("Chunk %d failed: %s", i, e)
-        time.sleep(0.3)  # gentle pacing
+    logger.info("Prompt eval: %.0f ms/chunk", prompt_eval_per_call(VOFC_DOCUMENT.name) * 1000)
+
+    if doc_id:
+        FailedChunkStore().save(doc_id, failed)
+    with tracing.span("merge", submission_id=doc_id), metrics.timer("pipeline_cpu_seconds", cpu=True, stage="merge"):
+        merged = merge_vofc_results(results)
+    merged["failed_chunks"] = [f["chunk_id"] for f in failed]
+    return merged
+
 
-    return merge_vofc_results(results)
+def reprocess_failed_vofc(doc_id: str, existing: Dict[str, Any]) -> Dict[str, Any]:
+    """Rerun only the failed chunks of `doc_id` and merge them into an earlier result."""
+    recovered, _, still_failed = reprocess_failed(doc_id, _parse_chunk)
+    merged = merge_vofc_results([existing, *recovered])
+    merged["failed_chunks"] = [f["chunk_id"] for f in still_failed]
+    return merged
 
 
 # =======================================
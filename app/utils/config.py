@@ -22,6 +22,7 @@ LIBRARY_DIR = STORAGE_ROOT / _env("LIBRARY_DIR", "library")
 
 OLLAMA_URL = _env("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = _env("OLLAMA_MODEL", "vofc-engine")
+OLLAMA_EMBED_MODEL = _env("OLLAMA_EMBED_MODEL", "nomic-embed-text")
 
 
 SUPABASE_URL = _env("SUPABASE_URL")
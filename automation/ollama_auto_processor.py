@@ -3,11 +3,19 @@
 """
 Ollama Auto Processor - Watcher Script
 Monitors incoming folder for new PDF/DOCX files and triggers processing.
+
+Files that arrive close together are handed to the pipeline as one batch so it
+can run each model once over all of them instead of swapping models per file.
 """
 
 import os
+import sys
+import json
 import time
+import queue
 import logging
+import threading
+import tempfile
 import subprocess
 from pathlib import Path
 from watchdog.observers import Observer
@@ -17,6 +25,14 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Shared Ollama helpers live in the repo-level utils package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from utils import tracing
+from utils.warmup import start_model_keeper
+
 # Configuration
 # Use the same data directory as Flask server for consistency
 DATA_DIR = os.path.join(os.path.expanduser('~'), 'AppData', 'Local', 'Ollama', 'data')
@@ -26,6 +42,12 @@ ERROR_FOLDER = os.getenv("ERROR_FOLDER", os.path.join(DATA_DIR, "errors"))
 LIBRARY_FOLDER = os.getenv("LIBRARY_FOLDER", os.path.join(DATA_DIR, "library"))
 LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(__file__), "logs"))
 PIPELINE_SCRIPT = os.path.join(os.path.dirname(__file__), "vofc_pipeline.py")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+# First model of the pipeline's phases; kept warm while files are waiting
+PRIMARY_MODEL = os.getenv("OLLAMA_MODEL", "vofc-engine:latest")
+# Collect files for this long after the first one arrives, up to BATCH_MAX_FILES
+BATCH_WINDOW_SECONDS = float(os.getenv("BATCH_WINDOW_SECONDS", "10"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
 
 # Setup logging with UTF-8 encoding for Windows compatibility
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -129,74 +151,106 @@ class DocumentHandler(FileSystemEventHandler):
         self.process_file(file_path)
     
     def process_file(self, file_path: Path):
-        """Process a document file."""
+        """Queue a document file for the next batch."""
         if file_path in processing_files:
             logger.warning(f"File {file_path.name} already being processed")
             return
         
         processing_files.add(file_path)
         logger.info(f"New file detected: {file_path.name} ({(file_path.stat().st_size / 1024):.2f} KB)")
-        
-        try:
-            # Run the pipeline script
-            logger.info(f"Starting processing for {file_path.name}...")
-            
+        pending_files.put(file_path)
+
+
+# Files waiting for the batch worker
+pending_files: "queue.Queue[Path]" = queue.Queue()
+
+
+def move_file(file_path: Path, folder: str, label: str):
+    """Move a file into `folder`, logging rather than raising on failure."""
+    try:
+        os.makedirs(folder, exist_ok=True)
+        file_path.rename(Path(folder) / file_path.name)
+        logger.info(f"Moved {file_path.name} to {label} folder")
+    except Exception as move_error:
+        logger.error(f"Failed to move {file_path.name} to {label}: {move_error}")
+
+
+def read_report(report_path: Path) -> dict:
+    """Per-file outcomes the pipeline wrote to `report_path`, keyed by path; empty if it wrote none."""
+    try:
+        return json.loads(report_path.read_text(encoding="utf-8")).get("files", {})
+    except (OSError, ValueError) as e:
+        logger.error(f"No pipeline report for this batch: {e}")
+        return {}
+
+
+def process_batch(file_paths: list):
+    """Run the pipeline once over a batch of files and sort them by the outcome it reports."""
+    logger.info(f"Starting processing for batch of {len(file_paths)} file(s): {', '.join(f.name for f in file_paths)}")
+    
+    fd, report_name = tempfile.mkstemp(prefix="batch_", suffix=".json", dir=LOG_DIR)
+    os.close(fd)
+    report_path = Path(report_name)
+    cmd = ["python", PIPELINE_SCRIPT, "--report", str(report_path)]
+    for file_path in file_paths:
+        cmd += ["--file", str(file_path)]
+    
+    try:
+        # The pipeline's spans join this one through TRACEPARENT in its environment
+        with tracing.span("watcher_batch", files=[f.name for f in file_paths]):
             result = subprocess.run(
-                ["python", PIPELINE_SCRIPT, "--file", str(file_path)],
+                cmd,
                 capture_output=True,
                 text=True,
-                timeout=3600,  # 1 hour timeout
-                cwd=os.path.dirname(__file__)
+                timeout=3600 * len(file_paths),  # 1 hour per file
+                cwd=os.path.dirname(__file__),
+                env=tracing.subprocess_env()
             )
-            
-            if result.returncode == 0:
+        if result.returncode != 0:
+            logger.error("Pipeline reported failures for this batch")
+            logger.error(f"Error output: {result.stderr}")
+    except subprocess.TimeoutExpired:
+        logger.error(f"Processing timeout for batch of {len(file_paths)} file(s)")
+    except Exception as e:
+        logger.error(f"Error processing batch: {e}")
+    
+    outcomes = read_report(report_path)
+    report_path.unlink(missing_ok=True)
+    for file_path in file_paths:
+        try:
+            outcome = outcomes.get(str(file_path))
+            if outcome is None:
+                # Never attempted (the run died or timed out first); the startup scan queues it again
+                logger.warning(f"No outcome for {file_path.name}, leaving it in the incoming folder")
+            elif outcome.get("success"):
                 logger.info(f"Successfully processed {file_path.name}")
-                
-                # Move to processed folder
-                processed_path = Path(PROCESSED_FOLDER) / file_path.name
-                try:
-                    os.makedirs(PROCESSED_FOLDER, exist_ok=True)
-                    file_path.rename(processed_path)
-                    logger.info(f"Moved {file_path.name} to processed folder")
-                except Exception as move_error:
-                    logger.error(f"Failed to move file to processed: {move_error}")
+                # Results were saved but the pipeline could not file the original in the library
+                if file_path.exists():
+                    move_file(file_path, PROCESSED_FOLDER, "processed")
             else:
-                logger.error(f"Processing failed for {file_path.name}")
-                logger.error(f"Error output: {result.stderr}")
-                
-                # Move to errors folder
-                error_path = Path(ERROR_FOLDER) / file_path.name
-                try:
-                    os.makedirs(ERROR_FOLDER, exist_ok=True)
-                    file_path.rename(error_path)
-                    logger.info(f"Moved {file_path.name} to errors folder")
-                except Exception as move_error:
-                    logger.error(f"Failed to move file to errors: {move_error}")
-        
-        except subprocess.TimeoutExpired:
-            logger.error(f"Processing timeout for {file_path.name}")
-            # Move to errors folder
-            try:
-                error_path = Path(ERROR_FOLDER) / file_path.name
-                os.makedirs(ERROR_FOLDER, exist_ok=True)
-                file_path.rename(error_path)
-            except Exception as move_error:
-                logger.error(f"Failed to move file to errors: {move_error}")
-        
-        except Exception as e:
-            logger.error(f"Error processing {file_path.name}: {e}")
-            # Move to errors folder
-            try:
-                error_path = Path(ERROR_FOLDER) / file_path.name
-                os.makedirs(ERROR_FOLDER, exist_ok=True)
-                file_path.rename(error_path)
-            except Exception as move_error:
-                logger.error(f"Failed to move file to errors: {move_error}")
-        
+                logger.error(f"Processing failed for {file_path.name}: {outcome.get('error')}")
+                if file_path.exists():
+                    move_file(file_path, ERROR_FOLDER, "errors")
         finally:
             processing_files.discard(file_path)
 
 
+def batch_worker():
+    """Gather files for BATCH_WINDOW_SECONDS after the first arrival, then process them together."""
+    while True:
+        batch = [pending_files.get()]
+        deadline = time.time() + BATCH_WINDOW_SECONDS
+        while len(batch) < BATCH_MAX_FILES:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending_files.get(timeout=remaining))
+            except queue.Empty:
+                break
+        process_batch(batch)
+
+
 def main():
     """Main watcher function."""
     watch_path = Path(WATCH_FOLDER)
@@ -218,6 +272,7 @@ def main():
     logger.info(f"Processed folder: {PROCESSED_FOLDER}")
     logger.info(f"Errors folder: {ERROR_FOLDER}")
     logger.info(f"Library folder: {LIBRARY_FOLDER}")
+    logger.info(f"Batch window: {BATCH_WINDOW_SECONDS:.0f}s (max {BATCH_MAX_FILES} files)")
     logger.info("=" * 50)
     logger.info("Watching folder for new files...")
     logger.info("Press Ctrl+C to stop")
@@ -225,6 +280,16 @@ def main():
     
     # Create event handler first
     event_handler = DocumentHandler()
+    threading.Thread(target=batch_worker, name="batch-worker", daemon=True).start()
+    # Preload the primary model and keep it warm while files wait for a batch.
+    # A running batch manages residency itself (one model per phase), so the
+    # keeper neither renews nor releases while files are being processed.
+    start_model_keeper(
+        models=[(PRIMARY_MODEL, False)],
+        base_url=OLLAMA_URL,
+        busy=lambda: not pending_files.empty(),
+        idle=lambda: not processing_files,
+    )
     
     # Process existing files in the incoming folder
     logger.info("Scanning for existing files in incoming folder...")
@@ -233,7 +298,7 @@ def main():
         logger.info(f"Found {len(existing_files)} existing file(s) to process")
         for file_path in existing_files:
             if file_path.is_file() and file_path.stat().st_size >= event_handler.min_file_size:
-                logger.info(f"Processing existing file: {file_path.name}")
+                logger.info(f"Queueing existing file: {file_path.name}")
                 event_handler.process_file(file_path)
     else:
         logger.info("No existing files found in incoming folder")
@@ -3,18 +3,34 @@
 """
 VOFC Intelligent Extraction Pipeline
 Processes documents using multiple Ollama models for better accuracy.
+
+Batches run model by model (all primary passes, then all validation passes,
+...) so each model is loaded once per batch instead of once per document.
 """
 
 import os
+import sys
 import json
 import time
 import logging
 import argparse
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime
 
+# Shared Ollama client and schemas live in the repo-level utils package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from utils import metrics, tracing
+from utils.http_client import client
+from utils.ollama_client import generate_structured, prompt_eval_per_call, unload_model
+from utils.ollama_pool import get_pool
+from utils.text_cache import cached_extraction
+from utils.vofc_schema import EXTRACTION_ITEMS, StructuredOutputError
+
 # Load environment variables
 load_dotenv()
 
@@ -35,6 +51,9 @@ MODELS = [
     {"name": "llama3:latest", "weight": 0.15, "role": "cross-check"}
 ]
 
+# How long a model stays resident between calls of its phase
+PHASE_KEEP_ALIVE = os.getenv("PHASE_KEEP_ALIVE", "15m")
+
 # Setup logging
 os.makedirs(LOG_DIR, exist_ok=True)
 log_file = os.path.join(LOG_DIR, f"pipeline_{time.strftime('%Y%m%d')}.log")
@@ -120,23 +139,27 @@ def extract_text_from_docx(file_path: Path) -> str:
 
 
 def extract_text(file_path: Path) -> str:
-    """Extract text from PDF or DOCX file."""
+    """Extract text from PDF or DOCX file (cached by file hash)."""
     suffix = file_path.suffix.lower()
     
     if suffix == '.pdf':
-        return extract_text_from_pdf(file_path)
+        extractor, extract = "pdfplumber", extract_text_from_pdf
     elif suffix == '.docx':
-        return extract_text_from_docx(file_path)
+        extractor, extract = "python-docx", extract_text_from_docx
     else:
         raise ValueError(f"Unsupported file type: {suffix}")
+    
+    entry = cached_extraction(
+        str(file_path), extractor, "1",
+        lambda: {"text": extract(file_path)},
+        keep=lambda e: bool(e["text"].strip()),
+    )
+    return entry["text"]
 
 
-def build_extraction_prompt(text: str) -> str:
-    """Build the extraction prompt for Ollama."""
-    return f"""Extract vulnerabilities and options for consideration from the following document text.
-
-Document text:
-{text[:8000]}  # Limit to avoid token limits
+# Fixed instructions, sent as the chat system message so every document (and
+# every model phase) reuses the same evaluated prefix
+EXTRACTION_SYSTEM_PROMPT = f"""Extract vulnerabilities and options for consideration from the document text you are given.
 
 {EXTRACTION_SCHEMA}
 
@@ -145,42 +168,39 @@ Categories to use: {', '.join(DISCIPLINE_CATEGORIES[:10])}
 Return only valid JSON array, no other text."""
 
 
-def process_with_model(model_config: dict, prompt: str) -> list:
+def build_extraction_prompt(text: str) -> str:
+    """Build the per-document extraction message for Ollama."""
+    # Limit to avoid token limits
+    return f"""Document text:
+{text[:8000]}"""
+
+
+def process_with_model(model_config: dict, prompt: str, keep_alive: str = None) -> list:
     """Process text with a single Ollama model."""
     model_name = model_config["name"]
     logger.info(f"🤖 Processing with {model_name} ({model_config['role']})...")
     
     try:
-        url = f"{OLLAMA_URL}/api/generate"
-        payload = {
-            "model": model_name,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
+        extracted = generate_structured(
+            prompt,
+            EXTRACTION_ITEMS,
+            model=model_name,
+            options={
                 "temperature": 0.3,
                 "top_p": 0.9,
                 "num_predict": 4096
-            }
-        }
-        
-        response = requests.post(url, json=payload, timeout=300)
-        response.raise_for_status()
-        
-        result = response.json()
-        response_text = result.get("response", "")
-        
-        # Try to extract JSON from response
-        import re
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if json_match:
-            extracted_json = json.loads(json_match.group())
-            if isinstance(extracted_json, list):
-                logger.info(f"✅ {model_name} returned {len(extracted_json)} items")
-                return extracted_json
-        
-        logger.warning(f"⚠️ {model_name} returned invalid JSON format")
-        return []
+            },
+            base_url=OLLAMA_URL,
+            timeout=300,
+            keep_alive=keep_alive,
+            system=EXTRACTION_SYSTEM_PROMPT,
+        )
+        logger.info(f"✅ {model_name} returned {len(extracted)} items")
+        return extracted
     
+    except StructuredOutputError as e:
+        logger.warning(f"⚠️ {model_name} returned output outside the schema: {e}")
+        return []
     except Exception as e:
         logger.error(f"❌ {model_name} failed: {e}")
         return []
@@ -261,7 +281,8 @@ def update_supabase(file_path: Path, results: list):
         }
         
         url = f"{SUPABASE_URL}/rest/v1/submissions"
-        response = requests.post(url, headers=headers, json=submission_data, params={"select": "id"})
+        with metrics.timer("supabase_write_seconds", table="submissions"):
+            response = client(url).post(url, headers=headers, json=submission_data, params={"select": "id"})
         
         if response.status_code in [200, 201]:
             logger.info(f"✅ Updated Supabase with processing results")
@@ -291,95 +312,179 @@ def move_to_library(file_path: Path):
         return None
 
 
-def process_document(file_path: Path):
-    """Main document processing function."""
-    start_time = time.time()
-    logger.info("=" * 50)
-    logger.info(f"🚀 Processing document: {file_path.name}")
-    logger.info("=" * 50)
-    
-    try:
-        # 1. Extract text
-        logger.info("📄 Extracting text from document...")
+def prepare_document(file_path: Path) -> str:
+    """Extract text and build the extraction prompt for one document."""
+    logger.info(f"📄 Extracting text from {file_path.name}...")
+    with tracing.span("extract", submission_id=file_path.name):
         text = extract_text(file_path)
-        logger.info(f"✅ Extracted {len(text)} characters from document")
-        
-        if len(text) < 100:
-            raise ValueError("Extracted text too short (may be image-only PDF)")
-        
-        # 2. Build prompt
-        prompt = build_extraction_prompt(text)
+    logger.info(f"✅ Extracted {len(text)} characters from {file_path.name}")
+    
+    if len(text) < 100:
+        raise ValueError("Extracted text too short (may be image-only PDF)")
+    
+    return build_extraction_prompt(text)
+
+
+def run_model_phases(prompts: dict) -> tuple:
+    """
+    Run every configured model over all prompts, one model at a time.
+    Each phase keeps its model resident with PHASE_KEEP_ALIVE and unloads it
+    before a different model takes over, so a batch pays one load per model.
+    Returns ({key: [model_result, ...]}, stats).
+    """
+    keys = list(prompts)
+    model_results = {key: [] for key in keys}
+    stats = {"documents": len(keys), "model_loads": 0, "load_seconds": 0.0, "phases": []}
+    workers = max(1, min(len(keys), get_pool(OLLAMA_URL).capacity()))
+    
+    for idx, model_config in enumerate(MODELS):
+        name = model_config["name"]
+        loads_before = metrics.get("ollama_model_loads_total", model=name)
+        load_s_before = metrics.get("ollama_model_load_seconds_total", model=name)
+        phase_start = time.time()
+        logger.info(f"🔄 Phase {idx + 1}/{len(MODELS)}: {name} ({model_config['role']}) over {len(keys)} document(s)")
         
-        # 3. Process with multiple models
-        logger.info(f"🔄 Processing with {len(MODELS)} models in parallel...")
-        model_results = []
+        def _run(key):
+            with tracing.span("llm", submission_id=key.name, model=name):
+                return process_with_model(model_config, prompts[key], keep_alive=PHASE_KEEP_ALIVE)
         
-        for model_config in MODELS:
-            data = process_with_model(model_config, prompt)
-            model_results.append({
-                "model": model_config["name"],
+        with tracing.span("model_phase", model=name), ThreadPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(tracing.wrap(_run), keys))
+        for key, data in zip(keys, outputs):
+            model_results[key].append({
+                "model": name,
                 "role": model_config["role"],
                 "weight": model_config["weight"],
                 "data": data
             })
         
-        # 4. Combine results
-        logger.info("🔗 Combining results from all models...")
-        combined_results = combine_model_results(model_results)
-        logger.info(f"✅ Combined into {len(combined_results)} unique vulnerabilities")
+        loads = int(metrics.get("ollama_model_loads_total", model=name) - loads_before)
+        load_s = metrics.get("ollama_model_load_seconds_total", model=name) - load_s_before
+        stats["model_loads"] += loads
+        stats["load_seconds"] += load_s
+        stats["phases"].append({
+            "model": name,
+            "seconds": round(time.time() - phase_start, 2),
+            "model_loads": loads,
+            "load_seconds": round(load_s, 2),
+        })
         
-        # 5. Save results
+        next_model = MODELS[idx + 1]["name"] if idx + 1 < len(MODELS) else None
+        if next_model and next_model != name:
+            unload_model(name, OLLAMA_URL)
+    
+    stats["load_seconds"] = round(stats["load_seconds"], 2)
+    return model_results, stats
+
+
+def finalize_document(file_path: Path, model_results: list, start_time: float) -> dict:
+    """Combine model outputs, save them, mirror to Supabase and file the original."""
+    logger.info(f"🔗 Combining results from all models for {file_path.name}...")
+    with tracing.span("merge", submission_id=file_path.name):
+        combined_results = combine_model_results(model_results)
+    logger.info(f"✅ Combined into {len(combined_results)} unique vulnerabilities")
+    
+    with tracing.span("persist", submission_id=file_path.name):
         results_file = save_results(combined_results, file_path, Path(PROCESSED_FOLDER))
-        
-        # 6. Update Supabase
         update_supabase(file_path, combined_results)
-        
-        # 7. Move to library
         library_path = move_to_library(file_path)
-        
-        elapsed = time.time() - start_time
-        logger.info("=" * 50)
-        logger.info(f"✅ Processing complete in {elapsed:.2f} seconds")
-        logger.info(f"📊 Found {len(combined_results)} vulnerabilities")
-        logger.info(f"💾 Results saved to: {results_file}")
-        logger.info(f"📚 Original file moved to: {library_path}")
-        logger.info("=" * 50)
-        
-        return {
-            "success": True,
-            "vulnerabilities_count": len(combined_results),
-            "results_file": str(results_file),
-            "library_path": str(library_path) if library_path else None,
-            "processing_time": elapsed
-        }
     
-    except Exception as e:
-        elapsed = time.time() - start_time
-        logger.error("=" * 50)
-        logger.error(f"❌ Processing failed after {elapsed:.2f} seconds")
-        logger.error(f"Error: {e}")
-        logger.error("=" * 50)
-        raise
+    elapsed = time.time() - start_time
+    logger.info(f"📊 {file_path.name}: {len(combined_results)} vulnerabilities, saved to {results_file}, original in {library_path}")
+    return {
+        "success": True,
+        "vulnerabilities_count": len(combined_results),
+        "results_file": str(results_file),
+        "library_path": str(library_path) if library_path else None,
+        "processing_time": elapsed
+    }
+
+
+def process_batch(file_paths: list) -> dict:
+    """
+    Process several documents with model-phase scheduling.
+    Returns {"results": [per-file result, in input order], "stats": {...}}.
+    """
+    start_time = time.time()
+    logger.info("=" * 50)
+    logger.info(f"🚀 Processing batch of {len(file_paths)} document(s)")
+    logger.info("=" * 50)
+    
+    results, prompts = {}, {}
+    for file_path in file_paths:
+        try:
+            prompts[file_path] = prepare_document(file_path)
+        except Exception as e:
+            logger.error(f"❌ {file_path.name}: {e}")
+            results[file_path] = {"success": False, "error": str(e)}
+    
+    stats = {"documents": 0, "model_loads": 0, "load_seconds": 0.0, "phases": []}
+    if prompts:
+        model_results, stats = run_model_phases(prompts)
+        for file_path in prompts:
+            try:
+                results[file_path] = finalize_document(file_path, model_results[file_path], start_time)
+            except Exception as e:
+                logger.error(f"❌ {file_path.name}: {e}")
+                results[file_path] = {"success": False, "error": str(e)}
+    
+    elapsed = time.time() - start_time
+    logger.info("=" * 50)
+    logger.info(
+        f"✅ Batch complete in {elapsed:.2f} seconds: {stats['model_loads']} model load(s), "
+        f"{stats['load_seconds']:.1f}s spent loading models for {stats['documents']} document(s), "
+        f"prompt eval {prompt_eval_per_call(EXTRACTION_ITEMS.name) * 1000:.0f} ms/call"
+    )
+    logger.info("=" * 50)
+    return {"results": [results[f] for f in file_paths], "stats": stats}
+
+
+def process_document(file_path: Path):
+    """Main document processing function."""
+    result = process_batch([file_path])["results"][0]
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def write_report(report_path: Path, outcomes: dict):
+    """
+    Write {"files": {path: outcome}} for the watcher.
+    Files without an entry were never attempted.
+    """
+    report = {"files": {str(f): outcome for f, outcome in outcomes.items()}}
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
 
 
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(description="VOFC Intelligent Extraction Pipeline")
-    parser.add_argument("--file", required=True, help="Path to PDF or DOCX file")
+    parser.add_argument("--file", required=True, action="append",
+                        help="Path to PDF or DOCX file (repeat to process a batch)")
+    parser.add_argument("--report", type=Path,
+                        help="Write a JSON outcome for each file to this path")
     args = parser.parse_args()
     
-    file_path = Path(args.file)
-    
-    if not file_path.exists():
-        logger.error(f"File not found: {file_path}")
-        return 1
+    requested = [Path(f) for f in args.file]
+    outcomes = {}
+    for f in requested:
+        if not f.exists():
+            logger.error(f"File not found: {f}")
+            outcomes[f] = {"success": False, "error": "File not found"}
+    file_paths = [f for f in requested if f not in outcomes]
     
     try:
-        result = process_document(file_path)
-        return 0 if result["success"] else 1
+        if file_paths:
+            # Continues the watcher's trace (TRACEPARENT) when started by it
+            with tracing.span("pipeline_batch", documents=len(file_paths)):
+                batch = process_batch(file_paths)
+            outcomes.update(zip(file_paths, batch["results"]))
     except Exception as e:
         logger.error(f"Fatal error: {e}")
-        return 1
+    finally:
+        if args.report:
+            write_report(args.report, outcomes)
+    return 0 if all(outcomes.get(f, {}).get("success") for f in requested) else 1
 
 
 if __name__ == "__main__":
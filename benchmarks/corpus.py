@@ -0,0 +1,125 @@
+"""
+Benchmark documents: synthetic ones generated from a seed, plus real files.
+
+Synthetic documents are assessment-style prose (findings with options for
+consideration) at three sizes, picked so the pipelines see one, a few and
+many 6000-character chunks. The same seed always gives the same text, so
+runs are comparable and their Ollama answers can be recorded once and
+replayed. Files from `--corpus-dir` (.txt, .md, .pdf, .docx) are used as
+they are; with a recorded cassette they are the "recorded documents".
+"""
+
+import os
+import random
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+
+# Approximate characters per size class
+SIZES = {"small": 3_000, "medium": 15_000, "large": 40_000}
+DOC_SUFFIXES = (".txt", ".md", ".pdf", ".docx")
+
+_ASSETS = ["perimeter fence", "loading dock", "visitor entrance", "server room", "parking structure",
+           "control room", "main lobby", "chemical storage area", "rooftop access", "emergency exits"]
+_FINDINGS = ["lacks intrusion detection", "is not covered by CCTV", "has no access control logging",
+             "relies on a single unmonitored lock", "has inadequate lighting at night",
+             "is not included in the security patrol route", "has no documented inspection schedule",
+             "permits tailgating during shift changes", "has unrestricted vehicle approach",
+             "shares credentials among contractors"]
+_OPTIONS = ["Install an intrusion detection system with central monitoring",
+            "Extend CCTV coverage and retain footage for 30 days",
+            "Deploy badge readers that log every entry",
+            "Replace the lock with a monitored electronic lock",
+            "Add motion-activated lighting along the approach",
+            "Add the area to hourly patrol rounds",
+            "Adopt a quarterly inspection checklist",
+            "Post a guard during shift changes",
+            "Install vehicle barriers rated for the threat",
+            "Issue individual credentials and review them monthly"]
+_SECTORS = ["Commercial Facilities", "Chemical", "Healthcare and Public Health", "Energy", "Water"]
+
+
+@dataclass
+class Doc:
+    doc_id: str
+    size: str
+    text: Optional[str] = None
+    path: Optional[str] = None
+
+    @property
+    def chars(self) -> int:
+        if self.text is not None:
+            return len(self.text)
+        return os.path.getsize(self.path) if self.path else 0
+
+
+def synthetic_text(target_chars: int, rng: random.Random) -> str:
+    paragraphs = [f"Site Security Assessment — {rng.choice(_SECTORS)} Sector\n"]
+    n = 0
+    while sum(len(p) for p in paragraphs) < target_chars:
+        n += 1
+        asset, finding = rng.choice(_ASSETS), rng.choice(_FINDINGS)
+        options = rng.sample(_OPTIONS, k=rng.randint(1, 3))
+        paragraphs.append(
+            f"Finding {n}: The {asset} {finding}. During the site visit assessors noted that this condition "
+            f"could allow an adversary to reach the {rng.choice(_ASSETS)} without being detected, and staff "
+            f"interviewed were not aware of a compensating measure.\n"
+            + "".join(f"Option for consideration: {o}.\n" for o in options)
+        )
+    return "\n".join(paragraphs)
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """'small=5,medium=3,large=1' -> {"small": 5, "medium": 3, "large": 1}."""
+    out: Dict[str, int] = {}
+    for part in filter(None, (p.strip() for p in mix.split(","))):
+        size, _, count = part.partition("=")
+        if size not in SIZES:
+            raise ValueError(f"unknown document size {size!r}; use {', '.join(SIZES)}")
+        out[size] = int(count or 1)
+    return out
+
+
+def synthetic_corpus(mix: Dict[str, int], seed: int = 0) -> List[Doc]:
+    rng = random.Random(seed)
+    docs = []
+    for size, count in mix.items():
+        for i in range(count):
+            docs.append(Doc(f"bench-{size}-{i:03d}", size, text=synthetic_text(SIZES[size], rng)))
+    return docs
+
+
+def file_corpus(directory: str) -> List[Doc]:
+    docs = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(DOC_SUFFIXES):
+            stem = os.path.splitext(name)[0]
+            docs.append(Doc(f"file-{stem}", "file", path=os.path.join(directory, name)))
+    return docs
+
+
+def write_docx(text: str, path: str) -> str:
+    """A minimal .docx (one paragraph per line) that python-docx can read; no dependencies needed to write it."""
+    body = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(line)}</w:t></w:r></w:p>" for line in text.splitlines())
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml",
+                   '<?xml version="1.0" encoding="UTF-8"?>'
+                   '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="xml" ContentType="application/xml"/>'
+                   '<Override PartName="/word/document.xml" '
+                   'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                   '</Types>')
+        z.writestr("_rels/.rels",
+                   '<?xml version="1.0" encoding="UTF-8"?>'
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" '
+                   'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+                   'Target="word/document.xml"/></Relationships>')
+        z.writestr("word/document.xml",
+                   '<?xml version="1.0" encoding="UTF-8"?>'
+                   '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                   f"<w:body>{body}</w:body></w:document>")
+    return path
@@ -0,0 +1,441 @@
+"""
+Open-loop HTTP load generator for the FastAPI and Flask apps.
+
+Requests arrive at a set rate (Poisson by default, or evenly spaced) whether
+or not earlier ones have finished, so queueing shows up as latency instead
+of as a slower client. Raise the rate in stages to find where it saturates:
+
+    python -m benchmarks.loadgen --target fastapi --base-url http://127.0.0.1:8000 --rate 5 --duration 60
+    python -m benchmarks.loadgen --target flask --base-url http://127.0.0.1:5000 --stages 1:30,2:30,4:30,8:30
+    python -m benchmarks.loadgen --target fastapi --mix upload=5,status=5 --doc-mix small=3,large=1
+
+Operations, picked at random by `--mix` weight:
+
+- fastapi: upload (POST /files/upload), process-one (POST /process-one on a
+  previously uploaded file), process-pending (POST /process-pending),
+  status (GET /status)
+- flask: submit (POST /api/documents/submit), process-one, process-pending
+  (POST /api/documents/...), health (GET /api/system/health)
+
+Uploaded documents come from benchmarks/corpus.py (`--doc-mix`, or files
+from `--corpus-dir`). `--api-key` (default BACKEND_API_KEY) is sent as a
+bearer token. At most `--max-in-flight` requests are outstanding; arrivals
+beyond that are counted as dropped, which is itself a saturation signal.
+
+Every `--interval` seconds the server's /metrics is scraped for its queue
+gauges (queue_submitted, queue_incoming_files, ollama_queue_depth,
+ollama_inflight_requests). The report has throughput, latency percentiles
+and error rates overall, per operation and per stage, plus a timeline of
+those and the queue depth; it is written as JSON
+(benchmarks/results/loadgen-<timestamp>.json). A stage is marked saturated
+when fewer than 90% as many requests complete in it as arrive, when it
+drops arrivals, or when more than 1% of its requests fail.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import Doc, file_corpus, parse_mix, synthetic_corpus  # noqa: E402
+from benchmarks.run import RESULTS_DIR, percentile  # noqa: E402
+
+
+TARGETS = {
+    "fastapi": ("upload", "process-one", "process-pending", "status"),
+    "flask": ("submit", "process-one", "process-pending", "health"),
+}
+DEFAULT_MIX = {
+    "fastapi": "upload=4,process-one=2,process-pending=1,status=3",
+    "flask": "submit=4,process-one=2,process-pending=1,health=3",
+}
+QUEUE_GAUGES = ("queue_submitted", "queue_incoming_files", "ollama_queue_depth", "ollama_inflight_requests")
+# Saturation thresholds for the per-stage verdict
+MIN_COMPLETION_RATIO = 0.9
+MAX_ERROR_RATE = 0.01
+
+
+def parse_weights(mix: str, allowed: Tuple[str, ...]) -> Dict[str, float]:
+    """'upload=4,status=1' -> {"upload": 4.0, "status": 1.0}."""
+    weights: Dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in mix.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in allowed:
+            raise ValueError(f"unknown operation {name!r}; use {', '.join(allowed)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("the operation mix needs at least one positive weight")
+    return weights
+
+
+def parse_stages(stages: str) -> List[Tuple[float, float]]:
+    """'1:30,2:30' -> [(1.0, 30.0), (2.0, 30.0)] as (requests/second, seconds)."""
+    out = []
+    for part in filter(None, (p.strip() for p in stages.split(","))):
+        rate, _, seconds = part.partition(":")
+        out.append((float(rate), float(seconds)))
+    if not out:
+        raise ValueError("at least one rate:seconds stage is required")
+    return out
+
+
+def parse_gauges(text: str, names=QUEUE_GAUGES) -> Dict[str, float]:
+    """Sum each named metric over its label sets in a Prometheus text exposition."""
+    totals: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        metric, _, value = line.rpartition(" ")
+        name = metric.split("{", 1)[0]
+        if name in names:
+            try:
+                totals[name] = totals.get(name, 0.0) + float(value)
+            except ValueError:
+                continue
+    return totals
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies) if latencies else None,
+    }
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        target: str,
+        base_url: str,
+        mix: Dict[str, float],
+        docs: List[Doc],
+        stages: List[Tuple[float, float]],
+        api_key: Optional[str] = None,
+        arrival: str = "poisson",
+        max_in_flight: int = 64,
+        timeout: float = 120.0,
+        interval: float = 5.0,
+        pending_limit: int = 5,
+        upload_dir: Optional[str] = None,
+        seed: int = 0,
+        verbose: bool = True,
+    ):
+        if target not in TARGETS:
+            raise ValueError(f"target must be one of {', '.join(TARGETS)}")
+        self.target = target
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.docs = docs
+        self.stages = stages
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.arrival = arrival
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.interval = interval
+        self.pending_limit = pending_limit
+        self.upload_dir = upload_dir
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        # (operation, started offset s, latency s, status code or 0, error or None, stage index)
+        self.records: List[Tuple[str, float, float, int, Optional[str], int]] = []
+        self.dropped: Counter = Counter()
+        self.sent: Counter = Counter()
+        self.samples: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        # Files the server has accepted and nothing has asked it to process yet
+        self._uploaded: Deque[str] = deque(maxlen=1000)
+        self._doc_seq = 0
+        self._t0 = 0.0
+
+    # ---- operations ----
+    def _next_doc(self) -> Tuple[str, bytes]:
+        doc = self.docs[self._doc_seq % len(self.docs)]
+        self._doc_seq += 1
+        if doc.text is not None:
+            return f"{doc.doc_id}-{self._doc_seq}.txt", doc.text.encode("utf-8")
+        with open(doc.path, "rb") as f:
+            return f"{self._doc_seq}-{os.path.basename(doc.path)}", f.read()
+
+    def _file_ref(self) -> Optional[str]:
+        # Each uploaded file is handed to process-one once, oldest first
+        return self._uploaded.popleft() if self._uploaded else None
+
+    async def _request(self, client: httpx.AsyncClient, op: str) -> httpx.Response:
+        if self.target == "fastapi":
+            if op == "upload":
+                name, data = self._next_doc()
+                resp = await client.post("/files/upload", files={"file": (name, data)})
+                if resp.status_code < 400:
+                    file_id = resp.json().get("ollama_file_id")
+                    if file_id:
+                        self._uploaded.append(os.path.join(self.upload_dir, file_id) if self.upload_dir else file_id)
+                return resp
+            if op == "process-one":
+                ref = self._file_ref()
+                body = {"file_path": ref} if ref else {"submission_id": f"loadgen-{self._doc_seq}"}
+                return await client.post("/process-one", json=body)
+            if op == "process-pending":
+                return await client.post("/process-pending", params={"limit": self.pending_limit})
+            return await client.get("/status")
+        if op == "submit":
+            name, data = self._next_doc()
+            resp = await client.post("/api/documents/submit", files={"file": (name, data)}, data={"title": name})
+            if resp.status_code < 400:
+                path = resp.json().get("path")
+                if path:
+                    self._uploaded.append(path)
+            return resp
+        if op == "process-one":
+            ref = self._file_ref()
+            return await client.post("/api/documents/process-one", json={"path": ref} if ref else {})
+        if op == "process-pending":
+            return await client.post("/api/documents/process-pending", json={"limit": self.pending_limit})
+        return await client.get("/api/system/health")
+
+    async def _fire(self, client: httpx.AsyncClient, op: str, stage: int) -> None:
+        started = time.perf_counter()
+        status, error = 0, None
+        try:
+            resp = await self._request(client, op)
+            status = resp.status_code
+            if status >= 400:
+                error = f"HTTP {status}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        except ValueError as e:  # a body that is not the JSON it should be
+            error = f"{type(e).__name__}: {e}"
+        except asyncio.CancelledError:
+            # Still running when the drain timeout ran out
+            error = "cancelled"
+            raise
+        finally:
+            self.in_flight -= 1
+            self.records.append((op, started - self._t0, time.perf_counter() - started, status, error, stage))
+
+    # ---- scheduling ----
+    def _gap(self, rate: float) -> float:
+        if rate <= 0:
+            return float("inf")
+        return self.rng.expovariate(rate) if self.arrival == "poisson" else 1.0 / rate
+
+    async def _arrivals(self, client: httpx.AsyncClient, tasks: List[asyncio.Task]) -> None:
+        ops, weights = list(self.mix), list(self.mix.values())
+        stage_start = time.perf_counter()
+        for index, (rate, seconds) in enumerate(self.stages):
+            stage_end = stage_start + seconds
+            next_at = stage_start + self._gap(rate)
+            while next_at < stage_end:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                op = self.rng.choices(ops, weights)[0]
+                if self.in_flight >= self.max_in_flight:
+                    self.dropped[index] += 1
+                else:
+                    self.in_flight += 1
+                    self.sent[index] += 1
+                    tasks.append(asyncio.create_task(self._fire(client, op, index)))
+                next_at += self._gap(rate)
+            delay = stage_end - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stage_start = stage_end
+
+    async def _sample(self, client: httpx.AsyncClient) -> None:
+        while True:
+            gauges: Dict[str, Any] = {}
+            try:
+                resp = await client.get("/metrics", timeout=min(self.timeout, 10.0))
+                if resp.status_code == 200:
+                    gauges = parse_gauges(resp.text)
+            except httpx.HTTPError as e:
+                gauges = {"error": type(e).__name__}
+            t = time.perf_counter() - self._t0
+            self.samples.append({"t": round(t, 2), "client_in_flight": self.in_flight, **gauges})
+            if self.verbose:
+                self._progress(t, gauges)
+            await asyncio.sleep(self.interval)
+
+    def _progress(self, t: float, gauges: Dict[str, Any]) -> None:
+        recent = [r for r in self.records if r[1] + r[2] >= t - self.interval]
+        latencies = [r[2] for r in recent]
+        errors = sum(1 for r in recent if r[4])
+        p95 = percentile(latencies, 0.95)
+        queue = " ".join(f"{k}={v:g}" for k, v in gauges.items() if isinstance(v, (int, float)))
+        print(f"t={t:6.1f}s done={len(recent):4d} err={errors:3d} "
+              f"p95={'-' if p95 is None else f'{p95:.3f}s'} in_flight={self.in_flight:3d} {queue}",
+              file=sys.stderr)
+
+    async def run(self) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self.headers, timeout=self.timeout,
+                                     limits=limits) as client:
+            self._t0 = time.perf_counter()
+            tasks: List[asyncio.Task] = []
+            sampler = asyncio.create_task(self._sample(client))
+            try:
+                await self._arrivals(client, tasks)
+                offered_end = time.perf_counter() - self._t0
+                if tasks:
+                    await asyncio.wait(tasks, timeout=self.timeout)
+                for task in tasks:
+                    task.cancel()
+            finally:
+                sampler.cancel()
+                try:
+                    await sampler
+                except asyncio.CancelledError:
+                    pass
+        return self.report(offered_end)
+
+    # ---- reporting ----
+    def _summary(self, records, seconds: float) -> Dict[str, Any]:
+        latencies = [r[2] for r in records if not r[4]]
+        errors = [r for r in records if r[4]]
+        return {
+            "requests": len(records),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(records), 4) if records else 0.0,
+            "throughput_rps": round(len(latencies) / seconds, 3) if seconds else 0.0,
+            "latency_s": _latency_summary(latencies),
+            "error_kinds": dict(Counter(r[4] for r in errors).most_common(5)),
+        }
+
+    def report(self, offered_seconds: float) -> Dict[str, Any]:
+        records = list(self.records)
+        wall = max([offered_seconds] + [r[1] + r[2] for r in records])
+        stages = []
+        stage_start = 0.0
+        for index, (rate, seconds) in enumerate(self.stages):
+            stage_end = stage_start + seconds
+            # Latency and errors of the requests sent in the stage; throughput of those completed in it,
+            # against what actually arrived (Poisson arrivals stray from the nominal rate)
+            summary = self._summary([r for r in records if r[5] == index], seconds)
+            completed = sum(1 for r in records if not r[4] and stage_start <= r[1] + r[2] < stage_end)
+            arrived = self.sent[index] + self.dropped[index]
+            summary["throughput_rps"] = round(completed / seconds, 3) if seconds else 0.0
+            summary.update({
+                "offered_rps": rate,
+                "arrival_rps": round(arrived / seconds, 3) if seconds else 0.0,
+                "seconds": seconds,
+                "sent": self.sent[index],
+                "dropped": self.dropped[index],
+                "saturated": bool(self.dropped[index]) or summary["error_rate"] > MAX_ERROR_RATE
+                or (arrived > 0 and completed / arrived < MIN_COMPLETION_RATIO),
+            })
+            stages.append(summary)
+            stage_start = stage_end
+
+        timeline = []
+        for sample in self.samples:
+            window = [r for r in records if sample["t"] - self.interval <= r[1] + r[2] < sample["t"]]
+            timeline.append({**sample, **{k: v for k, v in self._summary(window, self.interval).items()
+                                          if k in ("requests", "errors", "throughput_rps")},
+                             "p95_s": percentile([r[2] for r in window if not r[4]], 0.95)})
+
+        saturated = next((s["offered_rps"] for s in stages if s["saturated"]), None)
+        return {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "target": self.target,
+            "base_url": self.base_url,
+            "config": {"mix": self.mix, "arrival": self.arrival, "stages": self.stages,
+                       "max_in_flight": self.max_in_flight, "timeout": self.timeout, "documents": len(self.docs)},
+            "wall_seconds": round(wall, 2),
+            "overall": {**self._summary(records, wall), "dropped": sum(self.dropped.values())},
+            "operations": {op: self._summary([r for r in records if r[0] == op], wall)
+                           for op in sorted({r[0] for r in records})},
+            "stages": stages,
+            "saturated_at_rps": saturated,
+            "timeline": timeline,
+        }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    overall = result["overall"]
+    print(f"\n{result['target']} at {result['base_url']}: {overall['requests']} requests in {result['wall_seconds']}s, "
+          f"{overall['throughput_rps']} ok/s, {overall['error_rate']:.1%} errors, {overall['dropped']} dropped")
+    print(f"\n{'operation':<18} {'reqs':>6} {'err%':>6} {'ok/s':>7} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}")
+    for op, s in result["operations"].items():
+        lat = s["latency_s"]
+        print(f"{op:<18} {s['requests']:>6} {s['error_rate']:>6.1%} {s['throughput_rps']:>7.2f} {_fmt(lat['p50']):>8} "
+              f"{_fmt(lat['p95']):>8} {_fmt(lat['p99']):>8} {_fmt(lat['max']):>8}")
+        for kind, count in s["error_kinds"].items():
+            print(f"{'':<18} {count:>6} x {kind}")
+    print(f"\n{'stage':<14} {'offered':>8} {'arrived':>8} {'ok/s':>7} {'err%':>6} {'dropped':>8} {'p95 s':>8}")
+    for i, s in enumerate(result["stages"]):
+        flag = "  saturated" if s["saturated"] else ""
+        print(f"{i + 1:<2} {s['seconds']:>6g}s    {s['offered_rps']:>8g} {s['arrival_rps']:>8.2f} {s['throughput_rps']:>7.2f} "
+              f"{s['error_rate']:>6.1%} {s['dropped']:>8} {_fmt(s['latency_s']['p95']):>8}{flag}")
+    if result["saturated_at_rps"] is not None:
+        print(f"\nSaturated at {result['saturated_at_rps']:g} requests/second")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Open-loop load generator for the FastAPI and Flask apps.")
+    p.add_argument("--target", choices=tuple(TARGETS), default="fastapi")
+    p.add_argument("--base-url", default=None, help="Default: http://127.0.0.1:8000 (fastapi) or :5000 (flask)")
+    p.add_argument("--api-key", default=os.getenv("BACKEND_API_KEY"), help="Bearer token (default BACKEND_API_KEY)")
+    p.add_argument("--mix", default=None, help="Operation weights, e.g. " + DEFAULT_MIX["fastapi"])
+    p.add_argument("--rate", type=float, default=2.0, help="Requests per second (single stage)")
+    p.add_argument("--duration", type=float, default=30.0, help="Seconds (single stage)")
+    p.add_argument("--stages", default=None, help="Step load as rate:seconds,..., e.g. 1:30,2:30,4:30")
+    p.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    p.add_argument("--doc-mix", default="small=4,medium=2,large=1", help="Synthetic documents to upload")
+    p.add_argument("--corpus-dir", help="Upload these files too (.txt, .md, .pdf, .docx)")
+    p.add_argument("--upload-dir", default=None, help="Server upload directory, to give process-one full paths")
+    p.add_argument("--pending-limit", type=int, default=5, help="limit sent with process-pending")
+    p.add_argument("--max-in-flight", type=int, default=64)
+    p.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout, seconds")
+    p.add_argument("--interval", type=float, default=5.0, help="Seconds between /metrics samples")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--output", default=None, help="Report JSON (default: benchmarks/results/loadgen-<timestamp>.json)")
+    p.add_argument("--quiet", action="store_true", help="No progress lines")
+    args = p.parse_args()
+
+    try:
+        mix = parse_weights(args.mix or DEFAULT_MIX[args.target], TARGETS[args.target])
+        stages = parse_stages(args.stages) if args.stages else [(args.rate, args.duration)]
+        docs = synthetic_corpus(parse_mix(args.doc_mix), seed=args.seed)
+    except ValueError as e:
+        p.error(str(e))
+    if args.corpus_dir:
+        docs += file_corpus(args.corpus_dir)
+    if not docs:
+        p.error("no documents to upload; give --doc-mix or --corpus-dir")
+    base_url = args.base_url or ("http://127.0.0.1:8000" if args.target == "fastapi" else "http://127.0.0.1:5000")
+
+    gen = LoadGenerator(
+        args.target, base_url, mix, docs, stages, api_key=args.api_key, arrival=args.arrival,
+        max_in_flight=args.max_in_flight, timeout=args.timeout, interval=args.interval,
+        pending_limit=args.pending_limit, upload_dir=args.upload_dir, seed=args.seed, verbose=not args.quiet,
+    )
+    result = asyncio.run(gen.run())
+    print_report(result)
+    output = args.output or os.path.join(RESULTS_DIR, f"loadgen-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nReport written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
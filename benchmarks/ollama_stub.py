@@ -0,0 +1,481 @@
+"""
+Record/replay stand-in for the Ollama HTTP API.
+
+Lets the pipelines run, and be benchmarked, without a GPU. Serves
+/api/generate, /api/chat, /api/embed, /api/embeddings, /api/tags, /api/ps
+and /api/version:
+
+- replay: each request is looked up in a cassette (JSONL) by a hash of
+  what determines the answer (endpoint, model, prompt / messages, format;
+  embeddings per input text). Hits are returned as recorded.
+- misses: with `--on-miss synthetic` (default) a deterministic answer is
+  made up: an object that satisfies the request's `format` JSON schema,
+  text otherwise, and a unit vector seeded by the text for embeddings.
+  `--on-miss error` answers 404 instead, for strict regression runs.
+- record: with `--record --upstream URL` every request is forwarded to a
+  real Ollama and its answer appended to the cassette.
+
+Timing is synthetic: a cold load of `--load-ms` when the model is not
+resident (keep_alive is honoured, and /api/ps reflects it), `--latency-ms`
+before the first token, then the answer's eval_count tokens at
+`--tokens-per-second` (default: the recorded rate, else 40). At most
+`--parallel` generations run at once, like OLLAMA_NUM_PARALLEL; the rest
+queue. `--speedup` divides every delay. Streamed requests get NDJSON chunks
+at the token rate.
+
+    python -m benchmarks.ollama_stub --port 11434 --cassette benchmarks/cassettes/ollama.jsonl
+    python -m benchmarks.ollama_stub --record --upstream http://gpu-box:11434
+
+Benchmarks start it in-process with `OllamaStub(...).start()`.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes", "ollama.jsonl")
+EMBED_DIM = 768
+# Characters per token when a response carries no eval_count
+CHARS_PER_TOKEN = 4
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def request_key(endpoint: str, body: Dict[str, Any]) -> str:
+    """Cassette key: hash of the fields that determine the answer (not options, stream or keep_alive)."""
+    material = {
+        "endpoint": endpoint,
+        "model": body.get("model"),
+        "prompt": body.get("prompt"),
+        "system": body.get("system"),
+        "messages": body.get("messages"),
+        "format": body.get("format"),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    text = (body.get("system") or "") + (body.get("prompt") or "")
+    text += "".join(m.get("content", "") for m in body.get("messages") or [])
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(json.dumps({"endpoint": "embed", "model": model, "input": text}).encode("utf-8")).hexdigest()
+
+
+def synthetic_embedding(text: str, dim: int = EMBED_DIM) -> List[float]:
+    """A unit vector seeded by `text`: identical texts match, different texts mostly do not."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def synthetic_value(schema: Dict[str, Any], seed: str, items: int = 2, name: str = "value") -> Any:
+    """A value that satisfies `schema` (inlined JSON schema); strings carry `seed` so documents differ."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        return synthetic_value(schema["anyOf"][0], seed, items, name)
+    kind = schema.get("type")
+    if kind == "object":
+        props = schema.get("properties", {})
+        return {k: synthetic_value(v, seed, items, k) for k, v in props.items()}
+    if kind == "array":
+        return [synthetic_value(schema.get("items", {}), f"{seed}-{i}", items, name) for i in range(items)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 0.5
+    if kind == "boolean":
+        return False
+    return f"Synthetic {name.replace('_', ' ')} {seed}"
+
+
+class Cassette:
+    """Recorded answers by key; appended to as a JSONL file while recording."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def put(self, key: str, endpoint: str, request: Dict[str, Any], response: Any) -> None:
+        entry = {"key": key, "endpoint": endpoint, "model": request.get("model"), "recorded_at": _now_iso(),
+                 "response": response}
+        with self._lock:
+            self.entries[key] = entry
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def models(self) -> List[str]:
+        return sorted({e["model"] for e in self.entries.values() if e.get("model")})
+
+
+class OllamaStub:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        cassette: Optional[str] = DEFAULT_CASSETTE,
+        upstream: Optional[str] = None,
+        record: bool = False,
+        on_miss: str = "synthetic",
+        latency_ms: float = 50.0,
+        load_ms: float = 0.0,
+        tokens_per_second: Optional[float] = None,
+        parallel: int = 4,
+        speedup: float = 1.0,
+        embed_dim: int = EMBED_DIM,
+        synthetic_items: int = 2,
+        models: Optional[List[str]] = None,
+    ):
+        if record and not upstream:
+            raise ValueError("record mode needs an upstream Ollama URL")
+        self.cassette = Cassette(cassette)
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.record = record
+        self.on_miss = on_miss
+        self.latency_s = latency_ms / 1000
+        self.load_s = load_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.speedup = max(speedup, 1e-6)
+        self.embed_dim = embed_dim
+        self.synthetic_items = synthetic_items
+        self.extra_models = models or []
+        self._slots = threading.BoundedSemaphore(max(1, parallel))
+        # model -> resident-until (epoch seconds)
+        self._resident: Dict[str, float] = {}
+        self._resident_lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "recorded": 0, "loads": 0}
+        self._stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds / self.speedup)
+
+    # ---- residency ----
+    def _keep_alive_seconds(self, value: Any) -> float:
+        if value is None:
+            return 300.0
+        if isinstance(value, (int, float)):
+            return float(value) if value >= 0 else float("inf")
+        m = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", str(value).strip())
+        if not m:
+            return 300.0
+        amount = float(m.group(1))
+        return float("inf") if amount < 0 else amount * {"": 1, "s": 1, "m": 60, "h": 3600}[m.group(2)]
+
+    def _touch(self, model: str, keep_alive: Any) -> float:
+        """Mark `model` used; returns the cold-load seconds this request pays (0 when resident)."""
+        now = time.time()
+        ttl = self._keep_alive_seconds(keep_alive)
+        with self._resident_lock:
+            cold = self._resident.get(model, 0) <= now
+            if ttl == 0:
+                self._resident.pop(model, None)
+            else:
+                self._resident[model] = now + ttl
+        if cold and ttl != 0:
+            self._count("loads")
+            return self.load_s
+        return 0.0
+
+    def ps(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._resident_lock:
+            live = {m: until for m, until in self._resident.items() if until > now}
+        return {"models": [
+            {
+                "name": m,
+                "model": m,
+                "size": 4_000_000_000,
+                "size_vram": 4_000_000_000,
+                "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=min(until - now, 10 ** 8))).isoformat(),
+            }
+            for m, until in sorted(live.items())
+        ]}
+
+    # ---- generation ----
+    def _upstream(self, endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        resp = httpx.post(f"{self.upstream}{endpoint}", json={**body, "stream": False}, timeout=600.0)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _synthetic(self, endpoint: str, body: Dict[str, Any], key: str) -> Dict[str, Any]:
+        fmt = body.get("format")
+        if isinstance(fmt, dict):
+            text = json.dumps(synthetic_value(fmt, key[:8], self.synthetic_items))
+        elif fmt == "json":
+            text = "{}"
+        else:
+            text = f"Synthetic response {key[:8]}."
+        out: Dict[str, Any] = {"model": body.get("model"), "done": True, "done_reason": "stop",
+                               "eval_count": max(1, len(text) // CHARS_PER_TOKEN)}
+        if endpoint == "/api/chat":
+            out["message"] = {"role": "assistant", "content": text}
+        else:
+            out["response"] = text
+        return out
+
+    def answer(self, endpoint: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The recorded, recorded-now or synthetic answer; None on a miss with on_miss=error."""
+        key = request_key(endpoint, body)
+        entry = self.cassette.get(key)
+        if entry and not self.record:
+            self._count("hits")
+            return dict(entry["response"])
+        if self.record:
+            response = self._upstream(endpoint, body)
+            self.cassette.put(key, endpoint, body, response)
+            self._count("recorded")
+            return response
+        self._count("misses")
+        if self.on_miss == "error":
+            return None
+        return self._synthetic(endpoint, body, key)
+
+    def _rate(self, response: Dict[str, Any]) -> float:
+        if self.tokens_per_second:
+            return self.tokens_per_second
+        if response.get("eval_count") and response.get("eval_duration"):
+            return response["eval_count"] / (response["eval_duration"] / 1e9)
+        return 40.0
+
+    def _text(self, endpoint: str, response: Dict[str, Any]) -> str:
+        if endpoint == "/api/chat":
+            return (response.get("message") or {}).get("content", "")
+        return response.get("response", "")
+
+    def embed(self, model: str, texts: List[str]) -> Optional[List[List[float]]]:
+        vectors = []
+        for text in texts:
+            key = embedding_key(model, text)
+            entry = self.cassette.get(key)
+            if entry and not self.record:
+                self._count("hits")
+                vectors.append(entry["response"])
+            elif self.record:
+                vec = self._upstream("/api/embed", {"model": model, "input": text})["embeddings"][0]
+                self.cassette.put(key, "/api/embed", {"model": model}, vec)
+                self._count("recorded")
+                vectors.append(vec)
+            else:
+                self._count("misses")
+                if self.on_miss == "error":
+                    return None
+                vectors.append(synthetic_embedding(text, self.embed_dim))
+        return vectors
+
+    # ---- HTTP ----
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, obj: Any, status: int = 200) -> None:
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, obj: Dict[str, Any]) -> None:
+                data = json.dumps(obj).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                stub._count("requests")
+                if self.path == "/api/tags":
+                    names = sorted(set(stub.cassette.models()) | set(stub.extra_models))
+                    return self._json({"models": [{"name": n, "model": n, "modified_at": _now_iso(), "size": 0} for n in names]})
+                if self.path == "/api/ps":
+                    return self._json(stub.ps())
+                if self.path == "/api/version":
+                    return self._json({"version": "0.0.0-stub"})
+                if self.path in ("/", ""):
+                    return self._json({"status": "Ollama stub is running"})
+                self._json({"error": f"unknown path {self.path}"}, 404)
+
+            def do_POST(self):
+                stub._count("requests")
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._json({"error": "invalid JSON body"}, 400)
+                try:
+                    if self.path in ("/api/generate", "/api/chat"):
+                        return self._generate(body)
+                    if self.path in ("/api/embed", "/api/embeddings"):
+                        return self._embed(body)
+                except httpx.HTTPError as e:
+                    return self._json({"error": f"upstream: {e}"}, 502)
+                self._json({"error": f"unknown path {self.path}"}, 404)
+
+            def _embed(self, body: Dict[str, Any]) -> None:
+                model = body.get("model", "")
+                single = self.path == "/api/embeddings"
+                texts = [body.get("prompt", "")] if single else body.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                load = stub._touch(model, body.get("keep_alive"))
+                with stub._slots:
+                    stub._sleep(load + stub.latency_s)
+                    vectors = stub.embed(model, texts)
+                if vectors is None:
+                    return self._json({"error": "no recording for this input"}, 404)
+                if single:
+                    return self._json({"embedding": vectors[0]})
+                self._json({"model": model, "embeddings": vectors, "load_duration": int(load * 1e9)})
+
+            def _generate(self, body: Dict[str, Any]) -> None:
+                endpoint = self.path
+                model = body.get("model", "")
+                load = stub._touch(model, body.get("keep_alive"))
+                # Warmup / unload requests carry no prompt
+                if not body.get("prompt") and not body.get("messages"):
+                    stub._sleep(load)
+                    return self._json({"model": model, "created_at": _now_iso(), "response": "", "done": True,
+                                       "done_reason": "unload" if body.get("keep_alive") in (0, "0") else "load",
+                                       "load_duration": int(load * 1e9)})
+                with stub._slots:
+                    started = time.perf_counter()
+                    response = stub.answer(endpoint, body)
+                    if response is None:
+                        return self._json({"error": "no recording for this prompt"}, 404)
+                    text = stub._text(endpoint, response)
+                    tokens = response.get("eval_count") or max(1, len(text) // CHARS_PER_TOKEN)
+                    rate = stub._rate(response)
+                    stub._sleep(load + stub.latency_s)
+                    prompt_done = time.perf_counter()
+                    response.update({
+                        "model": model,
+                        "created_at": _now_iso(),
+                        "load_duration": int(load * 1e9),
+                        "prompt_eval_count": response.get("prompt_eval_count") or _prompt_tokens(body),
+                        "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                        "eval_count": tokens,
+                    })
+                    if body.get("stream", True) is False:
+                        stub._sleep(tokens / rate)
+                        response["eval_duration"] = int((time.perf_counter() - prompt_done) * 1e9)
+                        response["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                        return self._json(response)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    pieces = re.findall(r"\S+\s*|\s+", text) or [""]
+                    for piece in pieces:
+                        stub._sleep(tokens / rate / len(pieces))
+                        chunk = {"model": model, "created_at": _now_iso(), "done": False}
+                        if endpoint == "/api/chat":
+                            chunk["message"] = {"role": "assistant", "content": piece}
+                        else:
+                            chunk["response"] = piece
+                        self._chunk(chunk)
+                    final = dict(response, done=True)
+                    if endpoint == "/api/chat":
+                        final["message"] = {"role": "assistant", "content": ""}
+                    else:
+                        final["response"] = ""
+                    final["eval_duration"] = int((time.perf_counter() - prompt_done) * 1e9)
+                    final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                    self._chunk(final)
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> "OllamaStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Ollama record/replay stand-in.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=11434)
+    p.add_argument("--cassette", default=DEFAULT_CASSETTE, help="JSONL of recorded answers")
+    p.add_argument("--record", action="store_true", help="Forward to --upstream and record every answer")
+    p.add_argument("--upstream", default=os.getenv("OLLAMA_UPSTREAM"), help="Real Ollama to record from")
+    p.add_argument("--on-miss", choices=("synthetic", "error"), default="synthetic")
+    p.add_argument("--latency-ms", type=float, default=50.0, help="Delay before the first token")
+    p.add_argument("--load-ms", type=float, default=0.0, help="Cold load delay for a model that is not resident")
+    p.add_argument("--tokens-per-second", type=float, default=None, help="Generation rate (default: recorded, else 40)")
+    p.add_argument("--parallel", type=int, default=4, help="Generations served at once (OLLAMA_NUM_PARALLEL)")
+    p.add_argument("--speedup", type=float, default=1.0, help="Divide every synthetic delay by this")
+    p.add_argument("--embed-dim", type=int, default=EMBED_DIM)
+    p.add_argument("--model", action="append", default=[], help="Extra model name to list in /api/tags")
+    args = p.parse_args()
+
+    stub = OllamaStub(
+        host=args.host, port=args.port, cassette=args.cassette, upstream=args.upstream, record=args.record,
+        on_miss=args.on_miss, latency_ms=args.latency_ms, load_ms=args.load_ms,
+        tokens_per_second=args.tokens_per_second, parallel=args.parallel, speedup=args.speedup,
+        embed_dim=args.embed_dim, models=args.model,
+    )
+    mode = f"recording from {stub.upstream}" if args.record else f"replaying ({args.on_miss} on miss)"
+    print(f"Ollama stub on {stub.url}, {mode}, cassette {args.cassette} ({len(stub.cassette.entries)} entries)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(stub.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+End-to-end throughput benchmark for the three extraction pipelines.
+
+    python -m benchmarks.run                                  # all pipelines, default corpus
+    python -m benchmarks.run --pipelines heuristic --mix small=10,large=2 --speedup 10
+    python -m benchmarks.run --baseline benchmarks/baseline.json   # exit 1 on regression
+    python -m benchmarks.run --save-baseline                        # accept this run as the baseline
+
+Pipelines:
+
+- heuristic: pipeline/heuristic_pipeline.process_submission (a dry run
+  with --no-supabase);
+- parser: app/services/vofc_parser.parse_text_to_vofc;
+- automation: automation/vofc_pipeline.process_document (synthetic text is
+  written as .docx, since the automation pipeline reads PDF/DOCX only).
+
+Ollama is the record/replay stand-in (benchmarks/ollama_stub.py), started
+here with the given latency, token rate and parallelism; Supabase is the
+SQLite-backed stand-in (benchmarks/supabase_stub.py) with the given latency
+and error rate, unless --supabase-url names a real one or --no-supabase
+turns persistence off. Each pipeline runs in its own subprocess so its peak
+RSS is its own. Per-stage latencies come
+from the tracing spans (utils/tracing.py): p50/p95 over every span of the
+stage, and LLM calls per document are its "ollama" spans.
+
+Results are written as JSON (benchmarks/results/<timestamp>.json) and, with
+--baseline, compared metric by metric: throughput down, p95 latency up,
+peak RSS up or LLM calls per document up by more than --tolerance is
+reported as a regression.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import Doc, file_corpus, parse_mix, synthetic_corpus, write_docx  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+PIPELINES = ("heuristic", "parser", "automation")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# Stages faster than this (p95, seconds) are too noisy to flag
+MIN_STAGE_SECONDS = 0.01
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _dist(values: List[float]) -> Dict[str, Any]:
+    return {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+# ---- worker (one subprocess per pipeline) -------------------------------------
+
+def _runner(pipeline: str, workdir: str) -> Callable[[Doc], str]:
+    """A function that processes one document and returns the submission id its spans carry."""
+    from utils import tracing
+
+    if pipeline == "heuristic":
+        from pipeline import heuristic_pipeline as hp
+
+        def _run(doc: Doc) -> str:
+            text, pdf_path, document = doc.text, None, None
+            if text is None and doc.path.lower().endswith(".pdf"):
+                with tracing.span("extract", submission_id=doc.doc_id):
+                    pdf_path, document = doc.path, hp.Document(doc.path)
+                    text = hp.extract_pdf_pages(doc.path, document).text
+            elif text is None:
+                with tracing.span("extract", submission_id=doc.doc_id):
+                    text = Path(doc.path).read_text(encoding="utf-8", errors="ignore")
+            hp.process_submission(doc.doc_id, text, pdf_path=pdf_path, document=document,
+                                  dry_run=not hp.SUPABASE_URL)
+            return doc.doc_id
+
+        return _run
+
+    if pipeline == "parser":
+        from app.services.vofc_parser import parse_text_to_vofc, read_file_text
+
+        def _run(doc: Doc) -> str:
+            text = doc.text
+            if text is None:
+                with tracing.span("extract", submission_id=doc.doc_id):
+                    text = read_file_text(Path(doc.path))
+            parse_text_to_vofc(text, doc_id=doc.doc_id)
+            return doc.doc_id
+
+        return _run
+
+    if pipeline == "automation":
+        from automation import vofc_pipeline as vp
+
+        incoming = os.path.join(workdir, "incoming")
+        os.makedirs(incoming, exist_ok=True)
+
+        def _run(doc: Doc) -> str:
+            # The pipeline moves the file into the library, so it always gets a fresh copy
+            if doc.text is not None or not doc.path.lower().endswith((".pdf", ".docx")):
+                text = doc.text if doc.text is not None else Path(doc.path).read_text(encoding="utf-8", errors="ignore")
+                path = write_docx(text, os.path.join(incoming, f"{doc.doc_id}.docx"))
+            else:
+                path = shutil.copy(doc.path, os.path.join(incoming, f"{doc.doc_id}{Path(doc.path).suffix}"))
+            vp.process_document(Path(path))
+            # vofc_pipeline tags its spans with the file name
+            return Path(path).name
+
+        return _run
+
+    raise ValueError(f"unknown pipeline {pipeline!r}")
+
+
+def _stage_summary(trace_file: str, submission_ids: List[str]) -> Dict[str, Any]:
+    wanted = set(submission_ids)
+    stages: Dict[str, List[float]] = {}
+    llm_calls = {sid: 0 for sid in wanted}
+    if os.path.exists(trace_file):
+        with open(trace_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                sid = span.get("attrs", {}).get("submission_id")
+                if sid not in wanted or span["name"] == "document":
+                    continue
+                stages.setdefault(span["name"], []).append(span["duration_ms"] / 1000)
+                if span["name"] == "ollama":
+                    llm_calls[sid] += 1
+    return {
+        "stages": {name: _dist(values) for name, values in sorted(stages.items())},
+        "llm_calls_per_doc": round(sum(llm_calls.values()) / len(llm_calls), 2) if llm_calls else 0.0,
+    }
+
+
+def run_worker(pipeline: str, manifest: str, concurrency: int) -> Dict[str, Any]:
+    from utils import tracing
+
+    with open(manifest, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    docs = [Doc(**d) for d in spec["docs"]]
+    run = _runner(pipeline, spec["workdir"])
+    results: List[Dict[str, Any]] = []
+
+    def _one(doc: Doc) -> Dict[str, Any]:
+        started = time.perf_counter()
+        sid, error = doc.doc_id, None
+        try:
+            with tracing.span("document", submission_id=doc.doc_id, pipeline=pipeline, size=doc.size) as span:
+                sid = run(doc)
+                if span:
+                    span.set(submission_id=sid)
+        except Exception as e:  # noqa: BLE001
+            error = f"{type(e).__name__}: {e}"
+        return {"doc_id": doc.doc_id, "submission_id": sid, "size": doc.size, "chars": doc.chars,
+                "seconds": time.perf_counter() - started, "error": error}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(_one, docs))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if not r["error"]]
+    summary = {
+        "documents": len(results),
+        "errors": len(results) - len(ok),
+        "error_samples": sorted({r["error"] for r in results if r["error"]})[:5],
+        "wall_seconds": round(wall, 3),
+        "docs_per_hour": round(len(ok) / wall * 3600, 1) if wall and ok else 0.0,
+        "document_seconds": _dist([r["seconds"] for r in ok]),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    summary.update(_stage_summary(tracing.TRACE_FILE, [r["submission_id"] for r in ok]))
+    return summary
+
+
+# ---- orchestration --------------------------------------------------------------
+
+def _child_env(workdir: str, pipeline: str, ollama_url: str, supabase_url: Optional[str], args) -> Dict[str, str]:
+    env = dict(os.environ)
+    base = os.path.join(workdir, pipeline)
+    env.update({
+        "OLLAMA_URL": ollama_url,
+        "OLLAMA_HOST": ollama_url,
+        "OLLAMA_HOSTS": "",
+        "TRACING": "1",
+        "TRACE_FILE": os.path.join(base, "traces.jsonl"),
+        "LOG_DIR": os.path.join(base, "logs"),
+        "TEXT_CACHE_DIR": os.path.join(base, "text_cache"),
+        "FAILED_CHUNKS_DIR": os.path.join(base, "failed_chunks"),
+        "PROCESSED_FOLDER": os.path.join(base, "processed"),
+        "LIBRARY_FOLDER": os.path.join(base, "library"),
+        "STORAGE_ROOT": os.path.join(base, "storage"),
+        "SUPABASE_URL": supabase_url or "",
+        "SUPABASE_SERVICE_ROLE_KEY": args.supabase_key if supabase_url else "",
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+    })
+    return env
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline`."""
+    regressions = []
+
+    def _worse(label: str, now: Optional[float], then: Optional[float], higher_is_worse: bool = True) -> None:
+        if now is None or not then:
+            return
+        change = (now - then) / then
+        if (change > tolerance) if higher_is_worse else (change < -tolerance):
+            regressions.append(f"{label}: {then:g} -> {now:g} ({change:+.0%})")
+
+    for name, now in current["pipelines"].items():
+        then = baseline.get("pipelines", {}).get(name)
+        if not then:
+            continue
+        _worse(f"{name} docs/hour", now["docs_per_hour"], then["docs_per_hour"], higher_is_worse=False)
+        _worse(f"{name} document p95 s", now["document_seconds"]["p95"], then["document_seconds"]["p95"])
+        _worse(f"{name} peak RSS MB", now["peak_rss_mb"], then["peak_rss_mb"])
+        _worse(f"{name} LLM calls/doc", now["llm_calls_per_doc"], then["llm_calls_per_doc"])
+        for stage, dist in now["stages"].items():
+            old = then.get("stages", {}).get(stage)
+            if old and max(dist["p95"] or 0, old["p95"] or 0) >= MIN_STAGE_SECONDS:
+                _worse(f"{name} stage {stage} p95 s", dist["p95"], old["p95"])
+        if now["errors"] > then.get("errors", 0):
+            regressions.append(f"{name} errors: {then.get('errors', 0)} -> {now['errors']}")
+    return regressions
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    for name, p in result["pipelines"].items():
+        print(f"\n== {name}: {p['documents']} docs, {p['errors']} errors, {p['wall_seconds']:.1f}s wall, "
+              f"{p['docs_per_hour']:.1f} docs/hour, peak RSS {p['peak_rss_mb']} MB, "
+              f"{p['llm_calls_per_doc']} LLM calls/doc (stub saw {p.get('stub_requests', '-')})")
+        if p.get("supabase"):
+            sb = p["supabase"]
+            print(f"   supabase stub: {sb['requests']} requests, {sb['writes']} writes, {sb['rows_written']} rows, "
+                  f"{sb['errors_injected']} injected errors")
+        for err in p.get("error_samples", []):
+            print(f"   error: {err}")
+        print(f"   {'stage':<20} {'count':>6} {'p50 s':>9} {'p95 s':>9}")
+        print(f"   {'document':<20} {p['document_seconds']['count']:>6} {_fmt(p['document_seconds']['p50']):>9} "
+              f"{_fmt(p['document_seconds']['p95']):>9}")
+        for stage, d in p["stages"].items():
+            print(f"   {stage:<20} {d['count']:>6} {_fmt(d['p50']):>9} {_fmt(d['p95']):>9}")
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="End-to-end pipeline throughput benchmark.")
+    p.add_argument("--pipelines", default=",".join(PIPELINES), help="Comma-separated subset of " + ", ".join(PIPELINES))
+    p.add_argument("--mix", default="small=4,medium=2,large=1", help="Synthetic documents per size class")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--corpus-dir", help="Also run these files (.txt, .md, .pdf, .docx)")
+    p.add_argument("--concurrency", type=int, default=1, help="Documents processed at once per pipeline")
+    p.add_argument("--cassette", default=None, help="Ollama stub cassette (default: the stub's)")
+    p.add_argument("--on-miss", choices=("synthetic", "error"), default="synthetic")
+    p.add_argument("--latency-ms", type=float, default=200.0)
+    p.add_argument("--load-ms", type=float, default=0.0)
+    p.add_argument("--tokens-per-second", type=float, default=40.0)
+    p.add_argument("--parallel", type=int, default=4, help="Ollama stub parallel generations")
+    p.add_argument("--speedup", type=float, default=10.0, help="Divide the stub's delays by this")
+    p.add_argument("--supabase-url", default=None, help="Persist to this Supabase instead of the stand-in")
+    p.add_argument("--supabase-key", default="benchmark", help="Service key sent to Supabase")
+    p.add_argument("--no-supabase", action="store_true", help="Do not persist (heuristic runs as a dry run)")
+    p.add_argument("--supabase-latency-ms", type=float, default=20.0, help="Supabase stub delay per request")
+    p.add_argument("--supabase-row-latency-ms", type=float, default=0.0, help="Supabase stub delay per row written")
+    p.add_argument("--supabase-error-rate", type=float, default=0.0, help="Fraction of Supabase stub requests that fail")
+    p.add_argument("--output", default=None, help="Result JSON (default: benchmarks/results/<timestamp>.json)")
+    p.add_argument("--baseline", default=None, help="Compare against this result JSON")
+    p.add_argument("--save-baseline", action="store_true", help=f"Also write the result to {DEFAULT_BASELINE}")
+    p.add_argument("--tolerance", type=float, default=0.10, help="Relative change reported as a regression")
+    p.add_argument("--keep-workdir", action="store_true")
+    # internal: run one pipeline in this process
+    p.add_argument("--worker", choices=PIPELINES, help=argparse.SUPPRESS)
+    p.add_argument("--manifest", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.manifest, args.concurrency)))
+        return 0
+
+    from benchmarks.ollama_stub import DEFAULT_CASSETTE, OllamaStub
+    from benchmarks.supabase_stub import SupabaseStub
+
+    pipelines = [name.strip() for name in args.pipelines.split(",") if name.strip()]
+    unknown = set(pipelines) - set(PIPELINES)
+    if unknown:
+        p.error(f"unknown pipeline(s): {', '.join(sorted(unknown))}")
+    docs = synthetic_corpus(parse_mix(args.mix), seed=args.seed)
+    if args.corpus_dir:
+        docs += file_corpus(args.corpus_dir)
+
+    stub = OllamaStub(
+        cassette=args.cassette or DEFAULT_CASSETTE, on_miss=args.on_miss, latency_ms=args.latency_ms,
+        load_ms=args.load_ms, tokens_per_second=args.tokens_per_second, parallel=args.parallel,
+        speedup=args.speedup,
+    ).start()
+    sb_stub = None
+    if not args.supabase_url and not args.no_supabase:
+        sb_stub = SupabaseStub(
+            latency_ms=args.supabase_latency_ms, row_latency_ms=args.supabase_row_latency_ms,
+            error_rate=args.supabase_error_rate, seed=args.seed,
+        ).start()
+    supabase_url = None if args.no_supabase else args.supabase_url or sb_stub.url
+    workdir = tempfile.mkdtemp(prefix="vofc-bench-")
+    config = {k: getattr(args, k) for k in ("mix", "seed", "corpus_dir", "concurrency", "on_miss", "latency_ms",
+                                            "load_ms", "tokens_per_second", "parallel", "speedup", "supabase_url",
+                                            "no_supabase", "supabase_latency_ms", "supabase_row_latency_ms",
+                                            "supabase_error_rate")}
+    result: Dict[str, Any] = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": _git_rev(),
+        "config": config,
+        "corpus": {"documents": len(docs), "chars": sum(d.chars for d in docs)},
+        "pipelines": {},
+    }
+    try:
+        for name in pipelines:
+            os.makedirs(os.path.join(workdir, name), exist_ok=True)
+            manifest = os.path.join(workdir, name, "manifest.json")
+            with open(manifest, "w", encoding="utf-8") as f:
+                json.dump({"workdir": os.path.join(workdir, name), "docs": [vars(d) for d in docs]}, f)
+            requests_before = stub.stats["requests"]
+            sb_before = {k: v for k, v in sb_stub.stats.items() if k != "tables"} if sb_stub else {}
+            print(f"Running {name} over {len(docs)} document(s)...", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--worker", name, "--manifest", manifest,
+                 "--concurrency", str(args.concurrency)],
+                cwd=REPO_ROOT, env=_child_env(workdir, name, stub.url, supabase_url, args), capture_output=True, text=True,
+            )
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                print(f"{name} worker failed ({proc.returncode}):\n{proc.stderr[-2000:]}", file=sys.stderr)
+                continue
+            summary = json.loads(lines[-1])
+            summary["stub_requests"] = stub.stats["requests"] - requests_before
+            if sb_stub:
+                summary["supabase"] = {k: sb_stub.stats[k] - v for k, v in sb_before.items()}
+            result["pipelines"][name] = summary
+    finally:
+        stub.stop()
+        if sb_stub:
+            sb_stub.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"Work files kept in {workdir}", file=sys.stderr)
+
+    print_report(result)
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline updated: {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: baseline was run with a different configuration; comparisons may not be meaningful")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
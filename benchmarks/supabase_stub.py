@@ -0,0 +1,532 @@
+"""
+Local PostgREST-compatible stand-in for Supabase, backed by SQLite.
+
+Serves the subset of /rest/v1 the pipelines use, so persistence can be
+exercised and load-tested offline (`_sb_post` in the heuristic pipeline,
+utils/supabase_client and app/services/supabase_client through supabase-py
+or plain HTTP, automation/vofc_pipeline.update_supabase, the health probe):
+
+- GET    /rest/v1/<table>   select=, filters, order=, limit=, offset=;
+  `Prefer: count=exact` / `Range` give a Content-Range total
+- POST   /rest/v1/<table>   insert one row or a list; upsert with
+  `Prefer: resolution=merge-duplicates|ignore-duplicates` and on_conflict=
+- PATCH  /rest/v1/<table>   update the rows matching the filters
+- DELETE /rest/v1/<table>   delete the rows matching the filters
+- POST   /rest/v1/rpc/match_vulnerabilities   cosine match against the
+  `embedding` column of vulnerability_library
+- POST   /rest/v1/rpc/claim_submissions   the queue claim from
+  migrations/001_submission_claims.sql (status, claimed_by, lease and attempts in one update)
+
+Filters are PostgREST's `col=op.value` with eq, neq, lt, lte, gt, gte,
+like, ilike, is (null/true/false) and in.(a,b), optionally negated with
+`not.`. `Prefer: return=representation` returns the written rows, as
+supabase-py asks for. Tables need no schema: each row is a JSON document,
+created on first insert, with an `id` (uuid) filled in when missing.
+A PATCH is one transaction under a lock, so conditional updates such as the
+queue claim (`status=eq.submitted`) are atomic as they are in Postgres.
+
+Faults are injected per request: `--latency-ms` (plus up to `--jitter-ms`)
+before every answer, `--row-latency-ms` per row written, so batching shows
+up, and `--error-rate` of requests answered with `--error-status` (503)
+before touching the database.
+
+    python -m benchmarks.supabase_stub --port 54321 --db /tmp/supabase.sqlite --latency-ms 20
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_ROLE_KEY=local python -m pipeline.heuristic_pipeline ...
+
+Benchmarks start it in-process with `SupabaseStub(...).start()`.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+
+# Query parameters that are not column filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+_OPS = {"lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+_TABLE_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def body(self) -> Dict[str, Any]:
+        return {"code": self.code, "message": self.message, "details": None, "hint": None}
+
+
+def _column(name: str) -> str:
+    if not _TABLE_RE.match(name):
+        raise PostgrestError(400, "PGRST100", f"invalid column name {name!r}")
+    return f"json_extract(data, '$.{name}')"
+
+
+def _scalar(value: str) -> Any:
+    """A filter value as SQLite compares it with json_extract output: numbers as numbers, booleans as 1/0."""
+    if value == "true":
+        return 1
+    if value == "false":
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _split_list(value: str) -> List[str]:
+    # in.(a,b,"c,d")
+    inner = value[1:-1] if value.startswith("(") and value.endswith(")") else value
+    return [item.strip().strip('"') for item in re.findall(r'"[^"]*"|[^,]+', inner)]
+
+
+def _condition(column: str, expr: str) -> Tuple[str, List[Any]]:
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, value = expr.partition(".")
+    col = _column(column)
+    if op in ("eq", "neq"):
+        # The column may hold "42" or 42; match either
+        sql, args = f"({col} = ? OR {col} = ?)", [_scalar(value), value]
+        if op == "neq":
+            sql = f"NOT {sql}"
+    elif op in _OPS:
+        sql, args = f"{col} {_OPS[op]} ?", [_scalar(value)]
+    elif op == "like":
+        # PostgREST uses * as the wildcard; GLOB is case-sensitive like Postgres LIKE
+        sql, args = f"{col} GLOB ?", [value]
+    elif op == "ilike":
+        sql, args = f"{col} LIKE ?", [value.replace("*", "%")]
+    elif op == "is":
+        if value == "null":
+            sql, args = f"{col} IS NULL", []
+        elif value in ("true", "false"):
+            sql, args = f"{col} = ?", [_scalar(value)]
+        else:
+            raise PostgrestError(400, "PGRST100", f"is.{value} is not supported")
+    elif op == "in":
+        items = [v for raw in _split_list(value) for v in (_scalar(raw), raw)]
+        if not items:
+            sql, args = "0", []
+        else:
+            sql, args = f"{col} IN ({', '.join('?' * len(items))})", items
+    else:
+        raise PostgrestError(400, "PGRST100", f"unsupported operator {op!r}")
+    return (f"NOT ({sql})" if negate else sql), args
+
+
+def _where(filters: List[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+    clauses, args = [], []
+    for column, expr in filters:
+        sql, values = _condition(column, expr)
+        clauses.append(sql)
+        args += values
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+def _order(value: Optional[str]) -> str:
+    if not value:
+        return " ORDER BY pk"
+    terms = []
+    for term in value.split(","):
+        parts = term.strip().split(".")
+        direction = "DESC" if "desc" in parts[1:] else "ASC"
+        nulls = " NULLS LAST" if "nullslast" in parts[1:] else " NULLS FIRST" if "nullsfirst" in parts[1:] else ""
+        terms.append(f"{_column(parts[0])} {direction}{nulls}")
+    return " ORDER BY " + ", ".join(terms + ["pk"])
+
+
+def _project(row: Dict[str, Any], select: Optional[str]) -> Dict[str, Any]:
+    if not select or select.strip() == "*":
+        return row
+    out = {}
+    for field in select.split(","):
+        field = field.strip()
+        # alias:column
+        alias, _, name = field.rpartition(":")
+        out[alias or name] = row.get(name)
+    return out
+
+
+def _vector(value: Any) -> Optional[List[float]]:
+    # pgvector columns come back as "[0.1,0.2,...]"
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, list) and value else None
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+class SupabaseStub:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        db: str = ":memory:",
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        row_latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: Optional[int] = None,
+    ):
+        self.db_path = db
+        self.conn = sqlite3.connect(db, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL" if db != ":memory:" else "PRAGMA journal_mode=MEMORY")
+        self._db_lock = threading.Lock()
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.row_latency_s = row_latency_ms / 1000
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats: Dict[str, Any] = {"requests": 0, "reads": 0, "writes": 0, "rows_written": 0, "rpc": 0,
+                                      "errors_injected": 0, "tables": {}}
+        self._stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key: str, n: int = 1, table: Optional[str] = None) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+            if table:
+                per_table = self.stats["tables"].setdefault(table, {"reads": 0, "writes": 0, "rows_written": 0})
+                if key in per_table:
+                    per_table[key] += n
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    # ---- storage ----
+    def _ensure(self, table: str) -> None:
+        if not _TABLE_RE.match(table):
+            raise PostgrestError(404, "PGRST205", f"Could not find the table 'public.{table}'")
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (pk INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)')
+
+    def _exists(self, table: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
+
+    def select(self, table: str, filters: List[Tuple[str, str]], select: Optional[str] = None,
+               order: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """(rows of the requested page, total matching rows)."""
+        with self._db_lock:
+            if not self._exists(table):
+                if not _TABLE_RE.match(table):
+                    raise PostgrestError(404, "PGRST205", f"Could not find the table 'public.{table}'")
+                return [], 0
+            where, args = _where(filters)
+            total = self.conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', args).fetchone()[0]
+            page = f" LIMIT {int(limit)} OFFSET {int(offset)}" if limit is not None else f" LIMIT -1 OFFSET {int(offset)}"
+            rows = self.conn.execute(f'SELECT data FROM "{table}"{where}{_order(order)}{page}', args).fetchall()
+        return [_project(json.loads(r[0]), select) for r in rows], total
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], resolution: Optional[str] = None,
+               on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        keys = [k.strip() for k in (on_conflict or "id").split(",")]
+        out = []
+        with self._db_lock:
+            self._ensure(table)
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row in rows:
+                    existing = None
+                    if all(row.get(k) is not None for k in keys):
+                        where, args = _where([(k, f"eq.{row[k]}") for k in keys])
+                        existing = self.conn.execute(f'SELECT pk, data FROM "{table}"{where} LIMIT 1', args).fetchone()
+                    if existing and resolution == "ignore-duplicates":
+                        continue
+                    if existing and resolution == "merge-duplicates":
+                        merged = {**json.loads(existing[1]), **row}
+                        self.conn.execute(f'UPDATE "{table}" SET data = ? WHERE pk = ?', (json.dumps(merged), existing[0]))
+                        out.append(merged)
+                        continue
+                    if existing:
+                        raise PostgrestError(409, "23505", f'duplicate key value violates unique constraint "{table}_pkey"')
+                    row = {"id": str(uuid.uuid4()), **row}
+                    self.conn.execute(f'INSERT INTO "{table}" (data) VALUES (?)', (json.dumps(row),))
+                    out.append(row)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def update(self, table: str, filters: List[Tuple[str, str]], patch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        out = []
+        with self._db_lock:
+            if not self._exists(table):
+                return []
+            where, args = _where(filters)
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for pk, data in self.conn.execute(f'SELECT pk, data FROM "{table}"{where}', args).fetchall():
+                    row = {**json.loads(data), **patch}
+                    self.conn.execute(f'UPDATE "{table}" SET data = ? WHERE pk = ?', (json.dumps(row), pk))
+                    out.append(row)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def delete(self, table: str, filters: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            if not self._exists(table):
+                return []
+            where, args = _where(filters)
+            rows = self.conn.execute(f'SELECT data FROM "{table}"{where}', args).fetchall()
+            self.conn.execute(f'DELETE FROM "{table}"{where}', args)
+        return [json.loads(r[0]) for r in rows]
+
+    def match_vulnerabilities(self, query_embedding: Any, match_threshold: float = 0.0,
+                              match_count: int = 5) -> List[Dict[str, Any]]:
+        query = _vector(query_embedding)
+        if query is None:
+            raise PostgrestError(400, "22P02", "query_embedding must be a vector")
+        rows, _ = self.select("vulnerability_library", [("embedding", "not.is.null")])
+        matches = []
+        for row in rows:
+            vec = _vector(row.get("embedding"))
+            if vec is None:
+                continue
+            similarity = _cosine(query, vec)
+            if similarity >= match_threshold:
+                matches.append({"id": row.get("id"), "vulnerability": row.get("vulnerability"),
+                                "source_doc": row.get("source_doc"), "similarity": similarity})
+        matches.sort(key=lambda m: m["similarity"], reverse=True)
+        return matches[: int(match_count)]
+
+    def claim_submissions(self, p_worker_id: str, p_limit: int = 5, p_lease_seconds: int = 1800) -> List[Dict[str, Any]]:
+        expires = datetime.now(timezone.utc) + timedelta(seconds=int(p_lease_seconds))
+        out = []
+        with self._db_lock:
+            if not self._exists("submissions"):
+                return []
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                where, args = _where([("status", "eq.submitted")])
+                rows = self.conn.execute(f'SELECT pk, data FROM "submissions"{where} ORDER BY pk LIMIT ?',
+                                         [*args, int(p_limit)]).fetchall()
+                for pk, data in rows:
+                    row = json.loads(data)
+                    row.update(status="processing", claimed_by=p_worker_id, lease_expires_at=expires.isoformat(),
+                               attempts=(row.get("attempts") or 0) + 1)
+                    self.conn.execute('UPDATE "submissions" SET data = ? WHERE pk = ?', (json.dumps(row), pk))
+                    out.append(row)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def rpc(self, name: str, args: Dict[str, Any]) -> Any:
+        if name == "claim_submissions":
+            return self.claim_submissions(**{k: v for k, v in args.items()
+                                             if k in ("p_worker_id", "p_limit", "p_lease_seconds")})
+        if name == "match_vulnerabilities":
+            return self.match_vulnerabilities(**{k: v for k, v in args.items()
+                                                 if k in ("query_embedding", "match_threshold", "match_count")})
+        raise PostgrestError(404, "PGRST202", f"Could not find the function public.{name}")
+
+    # ---- HTTP ----
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, obj: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+                data = b"" if obj is None else json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                if obj is not None:
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _prefer(self) -> Dict[str, str]:
+                prefs = {}
+                for item in ",".join(self.headers.get_all("Prefer") or []).split(","):
+                    key, _, value = item.strip().partition("=")
+                    if key:
+                        prefs[key] = value
+                return prefs
+
+            def _body(self) -> Any:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    return json.loads(raw) if raw else None
+                except ValueError:
+                    raise PostgrestError(400, "PGRST102", "Empty or invalid json")
+
+            def _route(self) -> Tuple[str, Dict[str, str], List[Tuple[str, str]]]:
+                parts = urlsplit(self.path)
+                if not parts.path.startswith("/rest/v1/"):
+                    raise PostgrestError(404, "PGRST000", f"unknown path {parts.path}")
+                params: Dict[str, str] = {}
+                filters: List[Tuple[str, str]] = []
+                for key, value in parse_qsl(parts.query, keep_blank_values=True):
+                    if key in RESERVED_PARAMS:
+                        params[key] = value
+                    else:
+                        filters.append((key, value))
+                return unquote(parts.path[len("/rest/v1/"):]).strip("/"), params, filters
+
+            def _handle(self, method: str) -> None:
+                stub._count("requests")
+                delay = stub.latency_s + (stub._random() * stub.jitter_s if stub.jitter_s else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    if stub.error_rate and stub._random() < stub.error_rate:
+                        stub._count("errors_injected")
+                        # Drain the body so the connection stays usable
+                        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                        raise PostgrestError(stub.error_status, "PGRST000", "injected failure")
+                    table, params, filters = self._route()
+                    prefer = self._prefer()
+                    if table.startswith("rpc/"):
+                        stub._count("rpc")
+                        return self._json(stub.rpc(table[4:], self._body() or {}))
+                    if method == "GET":
+                        return self._select(table, params, filters, prefer)
+                    return self._write(method, table, params, filters, prefer)
+                except PostgrestError as e:
+                    self._json(e.body(), e.status)
+                except sqlite3.Error as e:
+                    self._json({"code": "XX000", "message": str(e), "details": None, "hint": None}, 500)
+
+            def _select(self, table, params, filters, prefer) -> None:
+                stub._count("reads", table=table)
+                limit = int(params["limit"]) if params.get("limit") else None
+                offset = int(params.get("offset") or 0)
+                range_header = self.headers.get("Range")
+                if range_header and re.match(r"^\d+-\d+$", range_header):
+                    first, last = (int(x) for x in range_header.split("-"))
+                    offset, limit = first, last - first + 1
+                rows, total = stub.select(table, filters, params.get("select"), params.get("order"), limit, offset)
+                end = f"{offset}-{offset + len(rows) - 1}" if rows else "*"
+                count = str(total) if prefer.get("count") in ("exact", "planned", "estimated") else "*"
+                status = 206 if range_header and rows and len(rows) < total else 200
+                self._json(rows, status, {"Content-Range": f"{end}/{count}"})
+
+            def _write(self, method, table, params, filters, prefer) -> None:
+                body = self._body()
+                if method == "POST":
+                    rows = body if isinstance(body, list) else [body or {}]
+                    if not all(isinstance(r, dict) for r in rows):
+                        raise PostgrestError(400, "PGRST102", "body must be an object or a list of objects")
+                    if stub.row_latency_s:
+                        time.sleep(stub.row_latency_s * len(rows))
+                    written = stub.insert(table, rows, prefer.get("resolution"), params.get("on_conflict"))
+                    status = 201
+                elif method == "PATCH":
+                    if not isinstance(body, dict):
+                        raise PostgrestError(400, "PGRST102", "body must be an object")
+                    written = stub.update(table, filters, body)
+                    if stub.row_latency_s:
+                        time.sleep(stub.row_latency_s * len(written))
+                    status = 200
+                else:
+                    written = stub.delete(table, filters)
+                    status = 200
+                stub._count("writes", table=table)
+                stub._count("rows_written", len(written), table=table)
+                if prefer.get("return") == "representation":
+                    return self._json([_project(r, params.get("select")) for r in written], status)
+                self._json(None, 201 if method == "POST" else 204)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        return Handler
+
+    def start(self) -> "SupabaseStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="supabase-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        with self._db_lock:
+            self.conn.close()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="PostgREST / Supabase stand-in backed by SQLite.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=54321)
+    p.add_argument("--db", default=":memory:", help="SQLite file (default: in memory)")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Delay before every answer")
+    p.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random delay, up to this")
+    p.add_argument("--row-latency-ms", type=float, default=0.0, help="Delay per row written")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    p.add_argument("--error-status", type=int, default=503)
+    p.add_argument("--seed", type=int, default=None, help="Seed for jitter and injected errors")
+    args = p.parse_args()
+
+    stub = SupabaseStub(
+        host=args.host, port=args.port, db=args.db, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        row_latency_ms=args.row_latency_ms, error_rate=args.error_rate, error_status=args.error_status,
+        seed=args.seed,
+    )
+    print(f"Supabase stub on {stub.url} (SUPABASE_URL), database {args.db}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(stub.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+-- Queue claims for /process-pending (utils/supabase_client.py).
+-- Several backends share one submissions queue: a worker claims rows with
+-- claim_submissions, renews lease_expires_at while it works, and a claim whose
+-- lease runs out goes back to 'submitted' until it has been claimed
+-- CLAIM_MAX_ATTEMPTS times.
+
+alter table submissions add column if not exists claimed_by text;
+alter table submissions add column if not exists lease_expires_at timestamptz;
+alter table submissions add column if not exists attempts int not null default 0;
+alter table submissions add column if not exists error text;
+
+create index if not exists submissions_status_lease_idx on submissions (status, lease_expires_at);
+
+-- Claim up to p_limit submitted rows for p_worker_id and count the attempt in
+-- the same statement. Rows locked by a concurrent claim are skipped, so two
+-- workers never get the same row.
+create or replace function claim_submissions(p_worker_id text, p_limit int, p_lease_seconds int)
+returns setof submissions
+language sql
+as $$
+  update submissions s
+     set status = 'processing',
+         claimed_by = p_worker_id,
+         lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+         attempts = s.attempts + 1
+   where s.id in (
+           select id
+             from submissions
+            where status = 'submitted'
+            limit p_limit
+              for update skip locked
+         )
+  returning s.*;
+$$;
@@ -1,8 +1,8 @@
 import time
 from pathlib import Path
-import requests
 from app.utils.config import HOST, PORT, INCOMING_DIR
 from app.utils.logger import get_logger
+from utils.http_client import client
 
 
 logger = get_logger("auto-processor")
@@ -15,7 +15,7 @@ def main():
     logger.info("Auto-processor watching: %s", INCOMING_DIR)
     while True:
         try:
-            r = requests.post(API, json={}, timeout=180)
+            r = client(API).post(API, json={}, timeout=180)
             if r.status_code == 200:
                 j = r.json()
                 msg = j if isinstance(j, dict) else {"raw": j}
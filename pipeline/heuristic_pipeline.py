@@ -12,7 +12,9 @@ ENV:
   SUPABASE_URL
   SUPABASE_SERVICE_ROLE_KEY
   OLLAMA_HOST             (default: http://localhost:11434)
+  OLLAMA_HOSTS            (optional comma-separated pool of Ollama base URLs; overrides OLLAMA_HOST)
   OLLAMA_EMBED_MODEL      (default: nomic-embed-text)
+  OLLAMA_MAX_INFLIGHT     (upper bound for the adaptive request limit; default: 4)
   LOG_LEVEL               (INFO|DEBUG; default: INFO)
 """
 
@@ -23,10 +25,24 @@ import uuid
 import math
 import time
 import logging
-import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import List, Dict, Any, Tuple
 from difflib import SequenceMatcher
-import requests
+import httpx
+
+# Shared Ollama client and schemas live in the repo-level utils package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from utils import metrics, profiling, tracing
+from utils.http_client import client
+from utils.chunk_retry import FailedChunkStore, reprocess_failed, run_with_retry
+from utils.ollama_client import generate_structured, prompt_eval_per_call
+from utils.ollama_pool import get_pool
+from utils.vofc_schema import VOFC_ITEMS, StructuredOutputError
 
 # Semantic similarity imports
 try:
@@ -38,27 +54,16 @@ except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
     logging.warning("sentence-transformers not installed. Semantic linking will be disabled. Install with: pip install sentence-transformers")
 
-# PDF extraction imports
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    PdfReader = None
-
-# Optional OCR imports (safe even if missing)
-try:
-    import pytesseract
-    from pdf2image import convert_from_path
-    OCR_AVAILABLE = True
-except ImportError:
-    pytesseract = None
-    convert_from_path = None
-    OCR_AVAILABLE = False
+# PDF extraction (PyPDF2 / Poppler / optional OCR, page by page)
+from utils.document import Document, extract_citation
+from utils.pdf_text import PdfText
 
 # ----------------------- Config -----------------------
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 OLLAMA_HOST  = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
 EMBED_MODEL  = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+VOFC_MODEL   = "vofc-engine:latest"
 LOG_LEVEL    = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO),
                     format="%(levelname)s %(message)s")
@@ -82,130 +87,23 @@ DISCIPLINE_KEYWORDS = {
 }
 DEFAULT_DISCIPLINE = "Physical Security"
 
-# -------------------- PDF Text Extraction (Hybrid: PyPDF2 → Poppler → OCR) -------------------------
-def extract_text_from_pdf(pdf_path: str) -> str:
+# -------------------- PDF Text Extraction (Hybrid per page: PyPDF2 → Poppler → OCR) ---------------
+def extract_pdf_pages(pdf_path: str, document: Document = None) -> PdfText:
     """
-    Attempts to extract readable text from a PDF using:
-      1. PyPDF2
-      2. Poppler (pdftotext)
-      3. OCR fallback (pdf2image + pytesseract)
-    Returns: extracted text (str)
+    Extracts text page by page: PyPDF2 first, Poppler (pdftotext) for pages
+    PyPDF2 returns empty or garbled, OCR (pdf2image + pytesseract) only for
+    pages neither can read. Keeps page offsets for citations.
+    Pass `document` to reuse an already-open Document for the same file.
     Raises: ValueError if nothing could be extracted.
     """
-    # --- 1️⃣  Try PyPDF2 ---
-    if PdfReader:
-        try:
-            reader = PdfReader(pdf_path)
-            # Check if PDF is encrypted
-            if reader.is_encrypted:
-                try:
-                    # Try to decrypt with empty password (some PDFs are encrypted but allow empty password)
-                    reader.decrypt("")
-                    logging.info("PDF was encrypted but decrypted with empty password")
-                    # Successfully decrypted, extract text
-                    text = "\n".join([page.extract_text() or "" for page in reader.pages])
-                except Exception as decrypt_error:
-                    logging.warning(f"PDF is encrypted and cannot be decrypted: {decrypt_error}. Trying Poppler...")
-                    # Don't return, fall through to Poppler which can handle encrypted PDFs better
-                    text = ""  # Set empty text to trigger fallback
-            else:
-                # Not encrypted, extract normally
-                text = "\n".join([page.extract_text() or "" for page in reader.pages])
-            
-            if len(text.strip()) > 50:
-                logging.info(f"PyPDF2 extracted {len(text)} characters from {os.path.basename(pdf_path)}")
-                return text
-            else:
-                logging.warning("PyPDF2 returned <50 chars; attempting Poppler...")
-        except Exception as e:
-            error_msg = str(e)
-            if "PyCryptodome" in error_msg or "encrypted" in error_msg.lower():
-                logging.warning(f"PyPDF2 failed (encrypted PDF): {e}. Trying Poppler...")
-            else:
-                logging.warning(f"PyPDF2 failed: {e}")
-    
-    # --- 2️⃣  Try Poppler (pdftotext) ---
-    # Configure poppler path for Windows (default location: C:\tools\poppler\Library\bin)
-    poppler_path = os.getenv('POPPLER_PATH', r'C:\tools\poppler\Library\bin')
-    pdftotext_exe = os.path.join(poppler_path, 'pdftotext.exe')
-    
-    if not os.path.exists(pdftotext_exe):
-        # Try alternative common locations
-        alt_paths = [
-            r'C:\poppler\bin',
-            r'C:\tools\poppler\bin',
-            os.path.join(os.path.expanduser('~'), 'poppler', 'bin')
-        ]
-        for alt in alt_paths:
-            alt_exe = os.path.join(alt, 'pdftotext.exe')
-            if os.path.exists(alt_exe):
-                pdftotext_exe = alt_exe
-                poppler_path = alt
-                break
-    
-    try:
-        # Use full path if found, otherwise try system PATH
-        cmd = [pdftotext_exe] if os.path.exists(pdftotext_exe) else ["pdftotext"]
-        cmd.extend(["-layout", pdf_path, "-"])
-        
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding='utf-8',
-            errors='replace',  # Replace invalid characters instead of failing
-            timeout=60
-        )
-        text = (result.stdout or "").strip()
-        if not text and result.stderr:
-            # Sometimes pdftotext outputs warnings to stderr
-            logging.debug(f"Poppler stderr: {result.stderr[:200]}")
-        if len(text) > 50:
-            logging.info(f"Poppler extracted {len(text)} characters from {os.path.basename(pdf_path)}")
-            return text
-        else:
-            logging.warning("Poppler returned <50 chars; attempting OCR...")
-    except FileNotFoundError:
-        logging.warning("pdftotext not found — install Poppler and retry.")
-    except Exception as e:
-        logging.warning(f"Poppler extraction error: {e}")
+    pdf_text = (document or Document(pdf_path)).pdf_text
+    if len(pdf_text.text.strip()) <= 50:
+        raise ValueError("Could not extract text from PDF (got 0 characters)")
+    return pdf_text
 
-    # --- 3️⃣  OCR fallback (requires pytesseract + pdf2image) ---
-    if pytesseract and convert_from_path:
-        try:
-            logging.info(f"Performing OCR fallback for {os.path.basename(pdf_path)} ...")
-            
-            # Configure poppler path for pdf2image
-            poppler_path_for_images = os.getenv('POPPLER_PATH', r'C:\tools\poppler\Library\bin')
-            if not os.path.exists(os.path.join(poppler_path_for_images, 'pdftoppm.exe')):
-                alt_paths = [
-                    r'C:\poppler\bin',
-                    r'C:\tools\poppler\bin',
-                    os.path.join(os.path.expanduser('~'), 'poppler', 'bin')
-                ]
-                for alt in alt_paths:
-                    if os.path.exists(os.path.join(alt, 'pdftoppm.exe')):
-                        poppler_path_for_images = alt
-                        break
-            
-            images = convert_from_path(pdf_path, dpi=300, poppler_path=poppler_path_for_images)
-            ocr_text = ""
-            for i, page in enumerate(images, 1):
-                page_text = pytesseract.image_to_string(page, lang="eng")
-                ocr_text += page_text
-                logging.info(f"   OCR page {i}: {len(page_text)} chars")
-            if len(ocr_text.strip()) > 50:
-                logging.info(f"OCR extracted {len(ocr_text)} characters total.")
-                return ocr_text
-            else:
-                logging.warning("OCR returned little or no text.")
-        except Exception as e:
-            logging.error(f"OCR failed: {e}")
-    else:
-        logging.warning("OCR libraries not installed (pytesseract/pdf2image). Skipping OCR fallback.")
-
-    # --- ❌ None worked ---
-    raise ValueError("Could not extract text from PDF (got 0 characters)")
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Returns the extracted text of a PDF (see extract_pdf_pages)."""
+    return extract_pdf_pages(pdf_path).text
 
 # -------------------- Helpers -------------------------
 def _uuid() -> str:
@@ -218,23 +116,16 @@ def _cos_sim(a: List[float], b: List[float]) -> float:
     return 0.0 if (da == 0 or db == 0) else num / (da * db)
 
 # -------------------- Unified VOFC Extraction with Ollama ----------------------
-def build_vofc_prompt(text: str) -> str:
-    """
-    Build an instruction prompt for the VOFC Engine Core.
-    Forces structured JSON output for vulnerability + OFC extraction.
-    Each vulnerability must include:
-    - A Question (assessment question format)
-    - What (description of the vulnerability)
-    - So What (impact/consequence)
-    - Sector and Subsector (based on context)
-    - Discipline (security domain)
-    """
-    return f"""
+# Fixed instructions for the VOFC Engine Core. Sent once per call as the chat
+# system message so Ollama can reuse the evaluated prefix across chunks.
+# Each vulnerability must include a Question, What, So What, Sector/Subsector
+# and Discipline.
+VOFC_SYSTEM_PROMPT = """
 You are the VOFC Engine Core — an AI agent specialized in
 critical-infrastructure vulnerability mapping and risk analysis.
 
 TASK:
-Analyze the text below and extract all vulnerabilities and their
+Analyze the TEXT you are given and extract all vulnerabilities and their
 corresponding Options for Consideration (OFCs).
 
 CRITICAL REQUIREMENTS:
@@ -249,7 +140,7 @@ CRITICAL REQUIREMENTS:
 Return ONLY valid JSON in this schema:
 
 [
-  {{
+  {
     "question": "Assessment question about the vulnerability (must be a question)",
     "vulnerability": "Brief vulnerability title",
     "what": "Clear description of the vulnerability in sentence format",
@@ -259,12 +150,12 @@ Return ONLY valid JSON in this schema:
     "discipline": "Security discipline (Security Management, Physical Security, Entry Controls, VSS, Security Force, Information Sharing, Resilience, Training)",
     "category": "Optional category classification",
     "options_for_consideration": [
-      {{
+      {
         "option": "Specific actionable mitigation strategy",
         "description": "Detailed description of how to implement this mitigation"
-      }}
+      }
     ]
-  }}
+  }
 ]
 
 EXAMPLES:
@@ -273,73 +164,39 @@ Good Question: "Are there adequate threat assessment programs in place to identi
 Good What: "Schools lack comprehensive multidisciplinary threat assessment programs to identify, assess, and intervene with students who may pose a risk of harm to themselves or others."
 Good So What: "Without proper threat assessment, warning signs of potential violence may go unnoticed, leading to preventable incidents of targeted school violence."
 Good Sector/Subsector: "Education" / "K-12 Schools"
+"""
+
 
-TEXT:
+def build_vofc_prompt(text: str) -> str:
+    """
+    Build the per-chunk message for the VOFC Engine Core.
+    The instructions and JSON schema live in VOFC_SYSTEM_PROMPT.
+    """
+    return f"""TEXT:
 {text}
 """
 
-def call_ollama(prompt: str, model: str = "vofc-engine:latest"):
+def call_ollama(prompt: str, model: str = VOFC_MODEL):
     """
-    Calls Ollama model (CLI or Python SDK) and returns parsed JSON list.
+    Calls Ollama with the VOFC item schema as `format` (constrained decoding)
+    and returns the validated list of vulnerability dicts.
     """
     try:
-        result = subprocess.run(
-            ["ollama", "run", model, prompt],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding='utf-8',
-            errors='replace',
-            timeout=300
-        )
-        raw = result.stdout.strip()
-        raw = raw.replace("```json", "").replace("```", "").strip()
-        
-        # Try to extract JSON from response (model might add extra text)
-        # Look for JSON array or object
-        json_start = raw.find('[')
-        json_obj_start = raw.find('{')
-        if json_start != -1 and (json_obj_start == -1 or json_start < json_obj_start):
-            raw = raw[json_start:]
-        elif json_obj_start != -1:
-            raw = raw[json_obj_start:]
-        
-        # Find the end of JSON structure
-        brace_count = 0
-        bracket_count = 0
-        json_end = len(raw)
-        for i, char in enumerate(raw):
-            if char == '[':
-                bracket_count += 1
-            elif char == ']':
-                bracket_count -= 1
-                if bracket_count == 0 and json_start != -1:
-                    json_end = i + 1
-                    break
-            elif char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0 and json_obj_start != -1 and json_start == -1:
-                    json_end = i + 1
-                    break
-        
-        raw = raw[:json_end].strip()
-        
-        try:
-            parsed = json.loads(raw)
-            if isinstance(parsed, dict):
-                parsed = [parsed]
-            return parsed
-        except json.JSONDecodeError as e:
-            logging.warning(f"JSON parse failed: {e}. Raw output preview:")
-            logging.warning(raw[:800])
-            return []
+        return generate_structured(prompt, VOFC_ITEMS, model=model, base_url=OLLAMA_HOST, timeout=300, system=VOFC_SYSTEM_PROMPT)
+    except StructuredOutputError as e:
+        logging.warning(f"Structured output rejected: {e}")
+        return []
     except Exception as e:
         logging.error(f"Ollama call failed: {e}")
-        import traceback
-        logging.error(traceback.format_exc())
         return []
 
+def _extract_chunk(chunk: str) -> List[Dict[str, Any]]:
+    """Single extraction call for one chunk; raises so the retry loop can classify failures."""
+    res = generate_structured(
+        build_vofc_prompt(chunk), VOFC_ITEMS, model=VOFC_MODEL, base_url=OLLAMA_HOST, timeout=300, system=VOFC_SYSTEM_PROMPT
+    )
+    return [r for r in res if isinstance(r, dict)]
+
 def normalize_text(text: str):
     """Simple normalization for comparison and matching."""
     return " ".join(text.lower().split())
@@ -400,7 +257,7 @@ def merge_vofc_results(results_list):
             sector = item.get("sector", "")
             subsector = item.get("subsector", "")
             discipline = item.get("discipline", "")
-            category = item.get("category", "General")
+            category = item.get("category") or "General"
 
             if not vuln_title:
                 continue
@@ -430,7 +287,8 @@ def merge_vofc_results(results_list):
                     "sector": sector.strip(),
                     "subsector": subsector.strip(),
                     "discipline": discipline.strip(),
-                    "severity": item.get("severity", "Unspecified")
+                    "severity": item.get("severity", "Unspecified"),
+                    "pages": item.get("pages")
                 })
 
             ofcs = item.get("options_for_consideration", [])
@@ -547,36 +405,86 @@ def link_vulns_to_ofcs(merged, memory_file="data/learned_links.jsonl"):
 #  MAIN PARSER ENTRYPOINT
 # ====================================================
 
-def process_text_with_vofc_engine(full_text: str, chunk_size: int = 6000):
+def process_text_with_vofc_engine(full_text: str, chunk_size: int = 6000, doc_id: str = None, pdf_text: PdfText = None):
     """
     Splits long text into manageable chunks, calls Ollama for each,
     merges + links outputs with fuzzy + semantic + learned matching.
+    Chunks are retried with backoff; those that still fail are recorded
+    under `doc_id` for reprocess_failed_chunks().
+    With `pdf_text` (the PDF that `full_text` came from), each vulnerability
+    carries the [first, last] page of the chunk it was extracted from.
     """
-    chunks = [full_text[i:i+chunk_size] for i in range(0, len(full_text), chunk_size)]
+    with tracing.span("chunk", submission_id=doc_id, chars=len(full_text)):
+        chunks = [full_text[i:i+chunk_size] for i in range(0, len(full_text), chunk_size)]
     all_results = []
+    failed_chunks = []
 
     logging.info(f"Processing {len(chunks)} chunk(s) ({len(full_text)} chars total)")
 
-    for i, chunk in enumerate(chunks, 1):
+    # Chunks are submitted together; the Ollama limiter decides how many actually run at once
+    def _run(i, chunk):
         logging.info(f"Processing chunk {i}/{len(chunks)} ({len(chunk)} chars)...")
-        prompt = build_vofc_prompt(chunk)
-        res = call_ollama(prompt)
-
-        if res:
-            valid_res = [r for r in res if isinstance(r, dict)]
-            if valid_res:
-                logging.info(f"Chunk {i}: Extracted {len(valid_res)} entries")
-                all_results.append(valid_res)
+        with tracing.span("llm_chunk", chunk=i, chars=len(chunk)):
+            return run_with_retry(chunk, _extract_chunk, label=f"chunk-{i}")
+
+    workers = max(1, min(len(chunks), get_pool(OLLAMA_HOST).capacity()))
+    with tracing.span("llm", submission_id=doc_id, chunks=len(chunks)), ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(tracing.wrap(_run), range(1, len(chunks) + 1), chunks))
+
+    for i, (results, failures) in enumerate(outcomes, 1):
+        failed_chunks.extend(failures)
+        pages = list(pdf_text.page_range((i - 1) * chunk_size, i * chunk_size)) if pdf_text else None
+
+        for res in results:
+            if pages:
+                for item in res:
+                    item.setdefault("pages", pages)
+            if res:
+                logging.info(f"Chunk {i}: Extracted {len(res)} entries")
+                all_results.append(res)
             else:
-                logging.warning(f"Chunk {i}: No valid dict entries")
-        else:
-            logging.warning(f"Chunk {i}: No data returned")
+                logging.warning(f"Chunk {i}: No data returned")
+        if failures:
+            logging.warning(f"Chunk {i}: {len(failures)} piece(s) failed after retries")
+
+    if doc_id:
+        FailedChunkStore().save(doc_id, failed_chunks, results=all_results)
+
+    with tracing.span("merge", submission_id=doc_id), metrics.timer("pipeline_cpu_seconds", cpu=True, stage="merge"):
+        merged = merge_vofc_results(all_results)
+    with tracing.span("link", submission_id=doc_id), metrics.timer("pipeline_cpu_seconds", cpu=True, stage="link"):
+        merged = link_vulns_to_ofcs(merged)
+    merged["failed_chunks"] = [f["chunk_id"] for f in failed_chunks]
+    logging.info(
+        f"Final result: {len(merged['vulnerabilities'])} vulnerabilities, "
+        f"{len(merged['ofcs'])} OFCs, {merged['links']['vuln_ofc']} linked pairs "
+        f"(parse failure rate {metrics.ratio('ollama_parse_failures_total', 'ollama_structured_calls_total', schema=VOFC_ITEMS.name):.1%}, "
+        f"prompt eval {prompt_eval_per_call(VOFC_ITEMS.name) * 1000:.0f} ms/chunk)"
+    )
+    return merged
+
+def reprocess_failed_chunks(doc_id: str):
+    """
+    Reruns only the chunks recorded as failed for `doc_id` and returns a merged
+    result holding just the items the earlier run did not already extract.
+    """
+    recovered, previous, still_failed = reprocess_failed(doc_id, _extract_chunk)
+    previous_merged = merge_vofc_results(previous)
+    merged = merge_vofc_results([r for r in recovered if r])
+
+    known_vulns = [v["question"] or v["title"] for v in previous_merged["vulnerabilities"]]
+    known_ofcs = {normalize_text(o["title"]) for o in previous_merged["ofcs"]}
+    merged["vulnerabilities"] = [
+        v for v in merged["vulnerabilities"]
+        if not is_duplicate(v["question"] or v["title"], known_vulns, threshold=0.8)[0]
+    ]
+    merged["ofcs"] = [o for o in merged["ofcs"] if normalize_text(o["title"]) not in known_ofcs]
 
-    merged = merge_vofc_results(all_results)
     merged = link_vulns_to_ofcs(merged)
+    merged["failed_chunks"] = [f["chunk_id"] for f in still_failed]
     logging.info(
-        f"Final result: {len(merged['vulnerabilities'])} vulnerabilities, "
-        f"{len(merged['ofcs'])} OFCs, {merged['links']['vuln_ofc']} linked pairs"
+        f"Reprocess {doc_id}: {len(merged['vulnerabilities'])} new vulnerabilities, "
+        f"{len(merged['ofcs'])} new OFCs, {len(still_failed)} chunk(s) still failing"
     )
     return merged
 
@@ -585,13 +493,16 @@ def _ollama_embed(texts: List[str]) -> List[List[float]]:
     """Request embeddings from Ollama; Windows-safe fallback included."""
     if not texts:
         return []
-    url = f"{OLLAMA_HOST}/api/embeddings"
     payload = {"model": EMBED_MODEL, "prompt": texts}  # Windows-safe key
 
-    try:
-        r = requests.post(url, json=payload, timeout=120)
+    def _post(base: str) -> dict:
+        r = client(base).post(f"{base}/api/embeddings", json=payload, timeout=120)
         r.raise_for_status()
-        data = r.json()
+        return r.json()
+
+    try:
+        with metrics.timer("embedding_batch_seconds", source="heuristic"):
+            data = get_pool(OLLAMA_HOST).call(EMBED_MODEL, _post)
 
         if "embeddings" in data:
             vectors = data["embeddings"]
@@ -604,12 +515,14 @@ def _ollama_embed(texts: List[str]) -> List[List[float]]:
 
         if not vectors or not any(vectors):
             logging.warning("Ollama returned empty embeddings; using fallback.")
+            metrics.inc("embedding_fallbacks_total", len(texts), source="heuristic")
             return [[len(t) % 512 / 512.0] * 10 for t in texts]
 
         return vectors
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.warning(f"Ollama embeddings request failed ({e}); using fallback.")
+        metrics.inc("embedding_fallbacks_total", len(texts), source="heuristic")
         return [[len(t) % 512 / 512.0] * 10 for t in texts]
 
 # -------------------- Cleaning & extraction -------------------------
@@ -640,153 +553,19 @@ def _extract_citation_from_text(text: str, first_n_pages: int = 3) -> Dict[str,
     """
     Extract citation information from document text, focusing on title page and first few pages.
     Looks for: title, author(s), publication date, organization, document number, etc.
+    Used for plain text; PDFs go through Document.citation(), which knows the real pages.
     """
-    citation_info = {
-        "title": None,
-        "authors": [],
-        "organization": None,
-        "publication_date": None,
-        "document_number": None,
-        "pages": None,
-        "url": None,
-        "source_text": ""
-    }
-    
     # Split text into pages (roughly by double newlines or page breaks)
     pages = re.split(r'\n\s*\n\s*\n+', text[:10000])  # First ~10k chars should cover first few pages
     title_page_text = pages[0] if pages else text[:3000]  # First page or first 3000 chars
-    
-    # Extract title - usually on first page, often centered or in large text
-    # Look for patterns like "TITLE" (all caps), or first significant line
-    title_matches = re.findall(r'(?:^|\n)\s*([A-Z][A-Za-z\s:\-]{10,200}?)(?:\n|$)', title_page_text, re.MULTILINE)
-    if title_matches:
-        # Pick the longest match that looks like a title (not all caps unless very short)
-        potential_titles = [t.strip() for t in title_matches if len(t.strip()) > 10 and len(t.strip()) < 200]
-        if potential_titles:
-            citation_info["title"] = potential_titles[0]
-    
-    # Extract author(s) - look for "Author:", "By:", "Prepared by:", "Written by:"
-    author_patterns = [
-        r'(?:Author|Authors|By|Prepared\s+by|Written\s+by)[:\s]+([^\n]{5,200})',
-        r'^([A-Z][a-z]+\s+[A-Z][a-z]+(?:\s+and\s+[A-Z][a-z]+\s+[A-Z][a-z]+)*)',
-    ]
-    for pattern in author_patterns:
-        matches = re.findall(pattern, title_page_text, re.IGNORECASE | re.MULTILINE)
-        if matches:
-            authors = [m.strip() for m in matches if len(m.strip()) > 5 and len(m.strip()) < 200]
-            if authors:
-                citation_info["authors"] = authors[:3]  # Max 3 authors
-                break
-    
-    # Extract organization - look for organization names, agencies
-    org_patterns = [
-        r'(?:Department|Agency|Organization|Institution|Office)[:\s]+([A-Z][A-Za-z\s&\-]{5,100})',
-        r'\b(CISA|DHS|FBI|NSA|NIST|CISA|DOD|DOE|HHS|DOT)\b',
-        r'([A-Z][A-Za-z\s]+(?:Department|Agency|Administration|Service|Bureau))',
-    ]
-    for pattern in org_patterns:
-        matches = re.findall(pattern, title_page_text, re.IGNORECASE | re.MULTILINE)
-        if matches:
-            orgs = [m.strip() for m in matches if len(m.strip()) > 5]
-            if orgs:
-                citation_info["organization"] = orgs[0]
-                break
-    
-    # Extract publication date - look for dates
-    date_patterns = [
-        r'(?:Date|Published|Issued|Released)[:\s]+([A-Za-z]+\s+\d{1,2},?\s+\d{4})',
-        r'\b([A-Za-z]+\s+\d{1,2},?\s+\d{4})\b',
-        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-    ]
-    for pattern in date_patterns:
-        matches = re.findall(pattern, title_page_text, re.IGNORECASE | re.MULTILINE)
-        if matches:
-            citation_info["publication_date"] = matches[0].strip()
-            break
-    
-    # Extract document number/ID
-    doc_num_patterns = [
-        r'(?:Document|Report|Publication|Number|ID)[#:\s]+([A-Z0-9\-]{3,50})',
-        r'\b([A-Z]{2,10}[-/]\d{2,6}[-/]\d{2,6})\b',  # Format like CISA-2024-001
-    ]
-    for pattern in doc_num_patterns:
-        matches = re.findall(pattern, title_page_text, re.IGNORECASE | re.MULTILINE)
-        if matches:
-            citation_info["document_number"] = matches[0].strip()
-            break
-    
-    # Extract URLs
-    url_matches = re.findall(r'https?://[^\s\)]+', text[:5000])  # First 5000 chars
-    if url_matches:
-        citation_info["url"] = url_matches[0]
-    
-    # Build source text from extracted information
-    source_parts = []
-    if citation_info["title"]:
-        source_parts.append(citation_info["title"])
-    if citation_info["authors"]:
-        source_parts.append(", ".join(citation_info["authors"]))
-    if citation_info["organization"]:
-        source_parts.append(citation_info["organization"])
-    if citation_info["publication_date"]:
-        source_parts.append(f"({citation_info['publication_date']})")
-    if citation_info["document_number"]:
-        source_parts.append(f"[{citation_info['document_number']}]")
-    
-    citation_info["source_text"] = ". ".join(source_parts) if source_parts else ""
-    
-    return citation_info
+    return extract_citation(title_page_text, text[:5000])
 
 def _extract_pdf_metadata(pdf_path: str) -> Dict[str, Any]:
     """
     Extract metadata from PDF file using PyPDF2/pypdf.
     Returns title, author, creation date, etc. from PDF metadata.
     """
-    metadata = {
-        "title": None,
-        "author": None,
-        "subject": None,
-        "creation_date": None,
-        "modification_date": None,
-        "producer": None,
-        "creator": None
-    }
-    
-    # Try PyPDF2
-    try:
-        import PyPDF2
-        with open(pdf_path, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            if reader.metadata:
-                metadata["title"] = reader.metadata.get("/Title", "").strip() or None
-                metadata["author"] = reader.metadata.get("/Author", "").strip() or None
-                metadata["subject"] = reader.metadata.get("/Subject", "").strip() or None
-                metadata["creation_date"] = str(reader.metadata.get("/CreationDate", "")).strip() or None
-                metadata["modification_date"] = str(reader.metadata.get("/ModDate", "")).strip() or None
-                metadata["producer"] = str(reader.metadata.get("/Producer", "")).strip() or None
-                metadata["creator"] = str(reader.metadata.get("/Creator", "")).strip() or None
-        return metadata
-    except Exception:
-        pass
-    
-    # Try pypdf (newer alternative)
-    try:
-        import pypdf
-        with open(pdf_path, 'rb') as f:
-            reader = pypdf.PdfReader(f)
-            if reader.metadata:
-                metadata["title"] = reader.metadata.get("/Title", "").strip() or None
-                metadata["author"] = reader.metadata.get("/Author", "").strip() or None
-                metadata["subject"] = reader.metadata.get("/Subject", "").strip() or None
-                metadata["creation_date"] = str(reader.metadata.get("/CreationDate", "")).strip() or None
-                metadata["modification_date"] = str(reader.metadata.get("/ModDate", "")).strip() or None
-                metadata["producer"] = str(reader.metadata.get("/Producer", "")).strip() or None
-                metadata["creator"] = str(reader.metadata.get("/Creator", "")).strip() or None
-        return metadata
-    except Exception:
-        pass
-    
-    return metadata
+    return Document(pdf_path).metadata
 
 # ------------------ Core Extraction -------------------
 CATEGORY_SPLIT = re.compile(r"(?:^|\n)\s*Category\s+([^\n]+?)\s+Vulnerability", re.I)
@@ -859,27 +638,41 @@ def _sb_post(table: str, rows: List[dict]) -> List[dict]:
         raise RuntimeError("Supabase credentials missing.")
     url = f"{SUPABASE_URL}/rest/v1/{table}"
     local_headers = {**HEADERS, "Prefer": "return=representation"}
-    r = requests.post(url, headers=local_headers, data=json.dumps(rows))
+    with tracing.span("persist", table=table, rows=len(rows)), metrics.timer("supabase_write_seconds", table=table):
+        r = client(url).post(url, headers=local_headers, content=json.dumps(rows))
     if r.status_code >= 400:
         raise RuntimeError(f"Supabase insert failed {r.status_code}: {r.text}")
     return r.json()
 
 # ----------------- Public Entry Point -----------------
+@tracing.traced("process_submission", pipeline="heuristic")
 def process_submission(
     submission_id: str,
     document_text: str,
     source_meta: List[Dict[str, str]] = None,
     pdf_path: str = None,
-    dry_run: bool = False
+    dry_run: bool = False,
+    merged_results: Dict[str, Any] = None,
+    document: Document = None
 ) -> Dict[str, Any]:
+    """
+    `document` is the PDF `document_text` was extracted from, if any; its
+    pages, metadata and citation fields are reused instead of reparsing.
+    """
     t0 = time.time()
     source_meta = source_meta or []
+    pdf_text = document.pdf_text if document else None
     
     # Step 1: Extract citation from PDF metadata (if PDF path provided)
     pdf_citation = {}
-    if pdf_path and os.path.exists(pdf_path):
+    meta_doc = document
+    if pdf_path and os.path.exists(pdf_path) and (
+        document is None or os.path.abspath(pdf_path) != os.path.abspath(document.path)
+    ):
+        meta_doc = Document(pdf_path)
+    if meta_doc:
         try:
-            pdf_meta = _extract_pdf_metadata(pdf_path)
+            pdf_meta = meta_doc.metadata
             if pdf_meta.get("title"):
                 pdf_citation["source_title"] = pdf_meta["title"]
             if pdf_meta.get("author"):
@@ -892,7 +685,10 @@ def process_submission(
             logging.warning(f"Failed to extract PDF metadata: {e}")
     
     # Step 2: Extract citation from document text (title page and first few pages)
-    text_citation = _extract_citation_from_text(document_text, first_n_pages=3)
+    if document:
+        text_citation = document.citation(first_n_pages=3)
+    else:
+        text_citation = _extract_citation_from_text(document_text, first_n_pages=3)
     
     # Step 3: Merge PDF metadata with text-based citation (text takes precedence)
     if not source_meta:
@@ -934,9 +730,10 @@ def process_submission(
                     "source_url": ""
                 })
 
-    # Use LLM-based extraction with vofc-engine model
-    logging.info("Using LLM-based VOFC extraction (vofc-engine model)")
-    merged_results = process_text_with_vofc_engine(document_text, chunk_size=6000)
+    # Use LLM-based extraction with vofc-engine model (unless the caller already has merged results)
+    if merged_results is None:
+        logging.info("Using LLM-based VOFC extraction (vofc-engine model)")
+        merged_results = process_text_with_vofc_engine(document_text, chunk_size=6000, doc_id=submission_id, pdf_text=pdf_text)
     
     results = {"submission_id": submission_id, "vulnerabilities": [], "ofcs": [], "links": [], "sources": []}
 
@@ -1007,10 +804,12 @@ def process_submission(
             "subsector": subsector,
             "discipline": disc,
             "category": cat,
-            "text": full_vulnerability_text
+            "text": full_vulnerability_text,
+            "pages": vuln.get("pages")
         })
 
-    # Process LLM-extracted OFCs
+    # Process LLM-extracted OFCs (CPU time of this relinking pass is exported as stage="relink")
+    relink_started, relink_wall = time.thread_time(), time.time()
     # First, build a map of vulnerability IDs by their question/title for matching
     vuln_id_map = {}
     for v in merged_results.get("vulnerabilities", []):
@@ -1154,6 +953,9 @@ def process_submission(
             "confidence": 1.0
         })
 
+    metrics.observe("pipeline_cpu_seconds", time.thread_time() - relink_started, stage="relink")
+    tracing.record("relink", relink_wall)
+
     if not dry_run:
         if vuln_rows:
             _sb_post("submission_vulnerabilities", vuln_rows)
@@ -1168,7 +970,11 @@ def process_submission(
         "vuln_ofc": len(link_rows),
         "ofc_sources": len(ofc_src_rows)
     }
+    results["failed_chunks"] = merged_results.get("failed_chunks", [])
+    if pdf_text:
+        results["extraction"] = {"pages": len(pdf_text.pages), "extractors": pdf_text.stats()}
     results["timing_sec"] = round(time.time() - t0, 3)
+    metrics.observe("submission_seconds", results["timing_sec"], pipeline="heuristic")
     return results
 
 # ----------------- CLI Runner -----------------
@@ -1176,44 +982,85 @@ if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser(description="Run VOFC heuristic pipeline on a text file.")
     p.add_argument("--submission-id", required=True, help="Submission UUID")
-    p.add_argument("--text-file", required=True, help="Path to plaintext or PDF file")
+    p.add_argument("--text-file", default="", help="Path to plaintext or PDF file")
     p.add_argument("--pdf-path", default="", help="Optional original PDF path for metadata extraction")
     p.add_argument("--source-title", default="", help="Optional source title")
     p.add_argument("--source-url", default="", help="Optional source URL")
     p.add_argument("--source-text", default="", help="Optional source text/filename")
     p.add_argument("--dry-run", action="store_true", help="Do not write to DB; print JSON summary")
+    p.add_argument("--reprocess-failed", action="store_true",
+                   help="Rerun only the chunks that failed for --submission-id and insert what they add")
+    p.add_argument("--profile", choices=profiling.MODES,
+                   help="Profile the run: cpu (pstats + collapsed stacks) or memory (top allocations per stage)")
+    p.add_argument("--profile-sample-ms", type=float, default=profiling.SAMPLE_INTERVAL * 1000,
+                   help="Stack sampling interval for the cpu flamegraph")
+    p.add_argument("--profile-top", type=int, default=profiling.TOP_N, help="Allocation sites listed per stage")
+    p.add_argument("--profile-dir", default=profiling.PROFILE_DIR, help="Where profile files are written")
     args = p.parse_args()
 
-    # Determine original PDF path for citation extraction
-    original_pdf_path = args.pdf_path
-    if not original_pdf_path:
-        # If text-file is a PDF, use it as the PDF path
-        file_ext = os.path.splitext(args.text_file)[1].lower()
-        if file_ext == '.pdf':
-            original_pdf_path = args.text_file
-
-    # Check if input is a PDF file
-    file_ext = os.path.splitext(args.text_file)[1].lower()
-    if file_ext == '.pdf':
-        logging.info(f"Detected PDF file, extracting text...")
-        doc = extract_text_from_pdf(args.text_file)
-        if not doc.strip():
-            logging.error(f"Failed to extract text from PDF: {args.text_file}")
-            exit(1)
-        logging.info(f"Extracted {len(doc)} characters from PDF")
-    else:
-        # Read as plaintext
-        with open(args.text_file, encoding="utf-8", errors="ignore") as f:
-            doc = f.read()
-
     src = []
     if args.source_title or args.source_url or args.source_text:
         src = [{"source_title": args.source_title, "source_url": args.source_url, "source_text": args.source_text}]
-    res = process_submission(
-        args.submission_id, 
-        doc, 
-        source_meta=src if src else None,
-        pdf_path=original_pdf_path if original_pdf_path else None,
-        dry_run=args.dry_run
-    )
-    print(json.dumps(res, indent=2))
+
+    profiler = nullcontext()
+    if args.profile:
+        profiler = profiling.profile(
+            args.profile, args.submission_id, out_dir=args.profile_dir,
+            sample_interval=args.profile_sample_ms / 1000, top=args.profile_top,
+        )
+
+    with profiler:
+        if args.reprocess_failed:
+            pending = FailedChunkStore().failed_ids(args.submission_id)
+            if not pending:
+                logging.info(f"No failed chunks recorded for {args.submission_id}")
+                exit(0)
+            logging.info(f"Reprocessing {len(pending)} failed chunk(s) for {args.submission_id}")
+            res = process_submission(
+                args.submission_id,
+                "",
+                source_meta=src if src else None,
+                dry_run=args.dry_run,
+                merged_results=reprocess_failed_chunks(args.submission_id)
+            )
+            print(json.dumps(res, indent=2))
+            exit(0)
+
+        if not args.text_file:
+            p.error("--text-file is required unless --reprocess-failed is given")
+
+        # Determine original PDF path for citation extraction
+        original_pdf_path = args.pdf_path
+        if not original_pdf_path:
+            # If text-file is a PDF, use it as the PDF path
+            file_ext = os.path.splitext(args.text_file)[1].lower()
+            if file_ext == '.pdf':
+                original_pdf_path = args.text_file
+
+        # Check if input is a PDF file
+        file_ext = os.path.splitext(args.text_file)[1].lower()
+        document = None
+        if file_ext == '.pdf':
+            logging.info(f"Detected PDF file, extracting text...")
+            # One handle for text, metadata and citation fields
+            with tracing.span("extract", submission_id=args.submission_id, file=os.path.basename(args.text_file)):
+                document = Document(args.text_file)
+                doc = extract_pdf_pages(args.text_file, document).text
+            if not doc.strip():
+                logging.error(f"Failed to extract text from PDF: {args.text_file}")
+                exit(1)
+            logging.info(f"Extracted {len(doc)} characters from PDF")
+        else:
+            # Read as plaintext
+            with open(args.text_file, encoding="utf-8", errors="ignore") as f:
+                doc = f.read()
+
+        res = process_submission(
+            args.submission_id, 
+            doc, 
+            source_meta=src if src else None,
+            pdf_path=original_pdf_path if original_pdf_path else None,
+            dry_run=args.dry_run,
+            document=document
+        )
+        print(json.dumps(res, indent=2))
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, File, UploadFile, Header, HTTPException
-from hashlib import sha256
+from fastapi import APIRouter, File, UploadFile, Header, HTTPException, Request
+from pydantic import BaseModel
+from typing import Optional
+import asyncio
 import os
 import time
 
+from utils.file_handler import UPLOAD_CHUNK_BYTES, StreamingUpload, UploadTooLarge
 from utils.logger import get_processing_logger
+from utils.resumable_upload import ResumableUpload, UploadError
 
 
 router = APIRouter(prefix="/files", tags=["files"])
@@ -12,32 +16,117 @@ UPLOAD_DIR = os.getenv("INCOMING_DIR", r"C:\Users\frost\AppData\Local\Ollama\dat
 API_KEY = os.getenv("BACKEND_API_KEY")
 
 
-@router.post("/upload")
-async def upload_file(file: UploadFile, authorization: str = Header(None)):
+def _authorize(authorization: Optional[str]) -> None:
     if authorization != f"Bearer {API_KEY}":
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+
+@router.post("/upload")
+async def upload_file(file: UploadFile, authorization: str = Header(None)):
+    _authorize(authorization)
+
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     start = time.time()
 
-    contents = await file.read()
-    file_hash = sha256(contents).hexdigest()
-    safe_name = f"{file_hash[:12]}_{file.filename}"
-    full_path = os.path.join(UPLOAD_DIR, safe_name)
-
-    with open(full_path, "wb") as f:
-        f.write(contents)
+    # Stream to a temp file in chunks so memory use is constant regardless of file size
+    with StreamingUpload(UPLOAD_DIR) as upload:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                upload.write(chunk)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        file_hash = upload.sha256
+        safe_name = f"{file_hash[:12]}_{os.path.basename(file.filename or 'upload.bin')}"
+        upload.commit(safe_name)
 
     elapsed = int((time.time() - start) * 1000)
     logger = get_processing_logger()
-    logger.info(f"Uploaded {file.filename} ({len(contents)} bytes) in {elapsed}ms -> {safe_name}")
+    logger.info(f"Uploaded {file.filename} ({upload.size} bytes) in {elapsed}ms -> {safe_name}")
 
     return {
         "status": "ok",
         "ollama_file_id": safe_name,
         "file_hash": file_hash,
-        "size_bytes": len(contents),
+        "size_bytes": upload.size,
         "elapsed_ms": elapsed,
     }
 
 
+# ---- Resumable uploads -------------------------------------------------------
+# POST /files/uploads {filename, size, sha256?}       -> upload_id
+# PUT  /files/uploads/{id}?offset=N  (raw body bytes)  -> received/missing ranges
+# GET  /files/uploads/{id}                             -> received/missing ranges
+# POST /files/uploads/{id}/complete {sha256?}          -> same response as /files/upload
+# After a dropped connection, GET the status and PUT only the missing ranges.
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None
+
+
+class UploadComplete(BaseModel):
+    sha256: Optional[str] = None
+
+
+def _open_upload(upload_id: str) -> ResumableUpload:
+    try:
+        return ResumableUpload(UPLOAD_DIR, upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+
+@router.post("/uploads")
+async def init_upload(body: UploadInit, authorization: str = Header(None)):
+    _authorize(authorization)
+    try:
+        upload = ResumableUpload.create(UPLOAD_DIR, body.filename, body.size, body.sha256)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    return upload.status()
+
+
+@router.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str, authorization: str = Header(None)):
+    _authorize(authorization)
+    return _open_upload(upload_id).status()
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_part(upload_id: str, offset: int, request: Request, authorization: str = Header(None)):
+    _authorize(authorization)
+    upload = _open_upload(upload_id)
+    try:
+        with upload.part_writer(offset) as part:
+            # Disk writes and the fsync on commit run in worker threads, off the event loop
+            async for chunk in request.stream():
+                await asyncio.to_thread(part.write, chunk)
+            if not part.size:
+                raise HTTPException(status_code=400, detail="Empty part")
+            return await asyncio.to_thread(upload.commit_part, part, offset)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Part extends past the declared upload size")
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, body: Optional[UploadComplete] = None, authorization: str = Header(None)):
+    _authorize(authorization)
+    upload = _open_upload(upload_id)
+    start = time.time()
+    try:
+        # Reads every part, hashes and fsyncs the result: a worker thread, so other requests keep being served
+        safe_name, file_hash, size = await asyncio.to_thread(upload.complete, body.sha256 if body else None)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+    elapsed = int((time.time() - start) * 1000)
+    get_processing_logger().info(f"Assembled resumable upload {upload_id} ({size} bytes) in {elapsed}ms -> {safe_name}")
+    return {
+        "status": "ok",
+        "ollama_file_id": safe_name,
+        "file_hash": file_hash,
+        "size_bytes": size,
+        "elapsed_ms": elapsed,
+    }
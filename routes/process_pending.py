@@ -1,96 +1,189 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import os
 import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 from utils.logger import get_processing_logger
-from utils import supabase_client
-from utils.ollama_client import run_inference
+from utils import supabase_client, tracing
+from utils.ollama_client import arun_inference
+from utils.ollama_pool import get_pool
 from utils.file_handler import get_path, get_local_path
-from utils.semantics import filter_unique
+from utils.semantics import afilter_unique, cosine_similarity
 from utils import embedding
-from numpy import dot
-from numpy.linalg import norm
 
 
 router = APIRouter(prefix="/process-pending", tags=["processing"])
 
+SIM_THRESHOLD = 0.88
+BATCH_SIZE = int(os.getenv("PENDING_BATCH_SIZE", "5"))
+# Submissions processed at once; 0 = as many as the Ollama pool can run
+CONCURRENCY = int(os.getenv("PENDING_CONCURRENCY", "0"))
 
-@router.post("")
-def process_pending():
-    logger = get_processing_logger()
-    logger.info("Batch processing started")
 
-    pending = supabase_client.pull_pending(limit=5)
-    if not pending:
-        logger.info("No pending submissions")
-        return {"status": "idle", "processed": []}
+def _concurrency() -> int:
+    return CONCURRENCY or max(1, get_pool(os.getenv("OLLAMA_URL")).capacity())
+
+
+def _resolve_path(sub: Dict[str, Any]) -> Optional[str]:
+    file_id = sub.get("ollama_file_id")
+    if file_id:
+        return get_local_path(file_id)
+    file_hash = sub.get("file_hash")
+    if not file_hash:
+        return None
+    try:
+        return get_path(file_hash)
+    except FileNotFoundError:
+        return None
+
 
-    processed: list[str] = []
-    for sub in pending:
-        sid = sub.get("id")
-        file_id = sub.get("ollama_file_id")
-        file_path = None
-        if file_id:
-            file_path = get_local_path(file_id)
-        else:
-            file_hash = sub.get("file_hash")
-            if file_hash:
-                file_path = get_path(file_hash)
-        if not file_path or not os.path.exists(file_path):
-            logger.info(f"Skipping submission {sid}: file not found")
+def _extracted_texts(output: Any) -> List[str]:
+    if not isinstance(output, dict):
+        return []
+    if isinstance(output.get("vulnerabilities"), list):
+        texts = [v.get("vulnerability") or v.get("text") for v in output["vulnerabilities"] if isinstance(v, dict)]
+        return [t for t in texts if t]
+    if isinstance(output.get("text"), str):
+        # simple fallback: split lines
+        return [t.strip() for t in output["text"].splitlines() if t.strip()]
+    return []
+
+
+def _select_new(texts: List[str], vectors: List[List[float]], matches: List[List[Dict[str, Any]]], logger) -> List[Dict[str, Any]]:
+    """Texts unlike anything in the library and unlike each other (CPU work; runs in a thread)."""
+    unique_items: List[Dict[str, Any]] = []
+    for t, vec, found in zip(texts, vectors, matches):
+        if not vec:
+            continue
+        best = max([m.get("similarity", 0.0) for m in found], default=0.0)
+        if best >= SIM_THRESHOLD:
+            logger.info(f"Skipped duplicate (similarity {best:.3f}) -> {t[:60]}…")
             continue
+        if any(cosine_similarity(vec, u["embedding"]) >= SIM_THRESHOLD for u in unique_items):
+            continue
+        unique_items.append({"text": t, "embedding": vec})
+    return unique_items
+
 
-        supabase_client.mark_status(sid, "processing")
-        logger.info(f"Processing submission {sid}")
-        start = time.time()
-        output = run_inference(file_path)
+async def _process_submission(sub: Dict[str, Any], logger) -> Dict[str, Any]:
+    sid = sub.get("id")
+    file_id = sub.get("ollama_file_id")
+    file_path = _resolve_path(sub)
+    if not file_path or not os.path.exists(file_path):
+        # Retrying cannot bring the file back; re-queueing would claim it again on every call
+        logger.warning(f"Submission {sid}: file not found")
+        await supabase_client.amark_status(sid, "error", worker_id=supabase_client.WORKER_ID, error="file not found")
+        return {"submission_id": sid, "status": "error", "error": "file not found"}
+
+    logger.info(f"Processing submission {sid} (claimed by {supabase_client.WORKER_ID})")
+    start = time.time()
+    with tracing.span("llm"):
+        output = await arun_inference(file_path)
         if isinstance(output, dict) and isinstance(output.get("vulnerabilities"), list):
-            output["vulnerabilities"] = filter_unique(output["vulnerabilities"])
-
-        # Optional: deduplicate and persist new vulnerabilities to library
-        def cosine_similarity(a, b):
-            return float(dot(a, b) / (norm(a) * norm(b))) if (norm(a) * norm(b)) else 0.0
-
-        extracted_texts = []
-        if isinstance(output, dict):
-            if isinstance(output.get("vulnerabilities"), list):
-                extracted_texts = [v.get("vulnerability") or v.get("text") for v in output["vulnerabilities"] if isinstance(v, dict)]
-            elif isinstance(output.get("text"), str):
-                # simple fallback: split lines
-                extracted_texts = [t.strip() for t in output["text"].splitlines() if t.strip()]
-
-        SIM_THRESHOLD = 0.88
-        unique_items = []
-        for t in extracted_texts:
-            vec = embedding.embed_text(t)
-            if not vec:
-                continue
-            matches = supabase_client.query_similar_vulnerabilities(vec, threshold=SIM_THRESHOLD)
-            if not matches:
-                unique_items.append({"text": t, "embedding": vec})
-                continue
-            best = max([m.get("similarity", 0.0) for m in matches]) if matches else 0.0
-            if best < SIM_THRESHOLD:
-                unique_items.append({"text": t, "embedding": vec})
-            else:
-                logger.info(f"Skipped duplicate (similarity {best:.3f}) -> {t[:60]}…")
-
-        for item in unique_items:
-            try:
-                supabase_client.insert_vulnerability(item["text"], item["embedding"], source_doc=file_id)
-            except Exception as _:
-                pass
+            output["vulnerabilities"] = await afilter_unique(output["vulnerabilities"])
+
+    # Deduplicate against the library and persist new vulnerabilities:
+    # one embedding batch, concurrent similarity lookups, one bulk insert
+    texts = _extracted_texts(output)
+    with tracing.span("embed", texts=len(texts)):
+        vectors = await embedding.aembed_texts(texts)
+    with tracing.span("dedupe"):
+        matches = await asyncio.gather(*(
+            supabase_client.aquery_similar_vulnerabilities(vec, threshold=SIM_THRESHOLD) if vec else asyncio.sleep(0, [])
+            for vec in vectors
+        ))
+        unique_items = await asyncio.to_thread(_select_new, texts, vectors, list(matches), logger)
+    with tracing.span("persist", rows=len(unique_items)):
+        try:
+            await supabase_client.ainsert_vulnerabilities(
+                [{"vulnerability": u["text"], "embedding": u["embedding"], "source_doc": file_id} for u in unique_items]
+            )
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Library insert failed for submission {sid}: {e}")
         elapsed = int((time.time() - start) * 1000)
 
-        supabase_client.push_extraction(
+        await supabase_client.apush_extraction(
             sid,
             model_version="vofc-engine:latest",
             data=output,
             confidence=output.get("confidence", 1.0),
             runtime_ms=elapsed,
         )
-        supabase_client.mark_status(sid, "completed")
-        processed.append(sid)
+        await supabase_client.amark_status(sid, "completed", worker_id=supabase_client.WORKER_ID)
+    return {"submission_id": sid, "status": "completed", "new_vulnerabilities": len(unique_items), "runtime_ms": elapsed}
 
-    logger.info("Batch processing completed")
-    return {"status": "ok", "processed": processed}
 
+async def _keep_lease(sid: str, logger) -> None:
+    """Renew the claim on `sid` every third of the lease while it is being processed."""
+    while True:
+        await asyncio.sleep(supabase_client.LEASE_SECONDS / 3)
+        try:
+            if not await supabase_client.arenew_lease(sid):
+                logger.warning(f"Lost the claim on submission {sid}; another worker may pick it up")
+                return
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Lease renewal failed for submission {sid}: {e}")
 
+
+async def _run_batch(pending: List[Dict[str, Any]], logger) -> AsyncIterator[Dict[str, Any]]:
+    """Process submissions `_concurrency()` at a time, yielding each result as it finishes."""
+    sem = asyncio.Semaphore(_concurrency())
+
+    async def _bounded(sub: Dict[str, Any]) -> Dict[str, Any]:
+        async with sem:
+            heartbeat = asyncio.create_task(_keep_lease(sub.get("id"), logger))
+            try:
+                with tracing.span("submission", submission_id=sub.get("id"), pipeline="process_pending"):
+                    return await _process_submission(sub, logger)
+            except Exception as e:  # noqa: BLE001
+                logger.exception(f"Submission {sub.get('id')} failed")
+                heartbeat.cancel()
+                # Release now rather than at lease expiry: back to the queue, or 'error' when out of attempts
+                try:
+                    await supabase_client.arelease_claim(
+                        sub.get("id"), sub.get("attempts") or 0, worker_id=supabase_client.WORKER_ID, error=str(e)
+                    )
+                except Exception as release_error:  # noqa: BLE001
+                    logger.warning(f"Could not release submission {sub.get('id')}; the reaper will: {release_error}")
+                return {"submission_id": sub.get("id"), "status": "error", "error": str(e)}
+            finally:
+                heartbeat.cancel()
+
+    for next_done in asyncio.as_completed([_bounded(sub) for sub in pending]):
+        yield await next_done
+
+
+@router.post("")
+async def process_pending(limit: int = BATCH_SIZE, stream: bool = False):
+    """
+    Claim up to `limit` submitted documents for this worker and process them
+    concurrently. With `stream=true` the response is NDJSON, one line per
+    submission as it completes.
+    """
+    logger = get_processing_logger()
+    logger.info("Batch processing started")
+
+    pending = await supabase_client.apull_pending(limit=limit)
+    if not pending:
+        logger.info("No pending submissions")
+        if stream:
+            return StreamingResponse(iter(()), media_type="application/x-ndjson")
+        return {"status": "idle", "processed": []}
+
+    if stream:
+        async def _lines() -> AsyncIterator[str]:
+            async for result in _run_batch(pending, logger):
+                yield json.dumps(result) + "\n"
+            logger.info("Batch processing completed")
+
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+    results = [result async for result in _run_batch(pending, logger)]
+    logger.info("Batch processing completed")
+    return {
+        "status": "ok",
+        "processed": [r["submission_id"] for r in results if r["status"] == "completed"],
+        "results": results,
+    }
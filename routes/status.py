@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 import os
 import time
+from utils.health import health_prober
 from utils.ollama_client import get_model_info
+from utils.warmup import model_keeper
 
 
 router = APIRouter(prefix="/status", tags=["status"])
@@ -10,16 +12,21 @@ _started_at = time.time()
 
 
 @router.get("")
-def status():
+async def status():
+    """Served from the background health snapshot; never waits on Ollama or Supabase."""
     uptime_s = int(time.time() - _started_at)
     model = os.getenv("OLLAMA_MODEL", "vofc-engine")
     info = get_model_info()
+    keeper = model_keeper()
+    prober = health_prober()
     return {
         "status": "ok",
         "model": model,
         "uptime": f"{uptime_s}s",
         "gpu_load": info.get("gpu_load"),
         "version": info.get("version"),
+        "models": keeper.status() if keeper else None,
+        "checks": prober.snapshot() if prober else None,
     }
 
 
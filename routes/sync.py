@@ -6,7 +6,7 @@ router = APIRouter(prefix="/sync", tags=["sync"])
 
 
 @router.post("")
-def sync_learning():
+async def sync_learning():
     logger = get_processing_logger()
     # Placeholder for syncing learning stats and feedback to Supabase
     logger.info("Sync invoked")
@@ -6,11 +6,11 @@ Processes documents using multiple Ollama models for better accuracy.
 """
 
 import os
+import sys
 import json
 import time
 import logging
 import argparse
-import requests
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime
@@ -18,6 +18,13 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
+# Shared HTTP clients live in the repo-level utils package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from utils.http_client import client
+
 # Configuration
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434").rstrip("/")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
@@ -161,7 +168,7 @@ def process_with_model(model_config: dict, prompt: str) -> list:
             }
         }
         
-        response = requests.post(url, json=payload, timeout=300)
+        response = client(url).post(url, json=payload, timeout=300)
         response.raise_for_status()
         
         result = response.json()
@@ -259,7 +266,7 @@ def update_supabase(file_path: Path, results: list):
         }
         
         url = f"{SUPABASE_URL}/rest/v1/submissions"
-        response = requests.post(url, headers=headers, json=submission_data, params={"select": "id"})
+        response = client(url).post(url, headers=headers, json=submission_data, params={"select": "id"})
         
         if response.status_code in [200, 201]:
             logger.info(f"✅ Updated Supabase with processing results")
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The repo is run from its root (`python -m ...`), not installed; make `utils`,
+# `routes` and `benchmarks` importable the same way under pytest.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Scripts open their log files (and the trace file) when imported; keep them out of the tree
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="vofc-test-logs-"))
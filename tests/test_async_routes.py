@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from utils import embedding, http_client, ollama_client
+
+
+def _async_client(monkeypatch, module, handle):
+    """Point `module.async_client()` at a client answering with `handle(request)`."""
+    monkeypatch.setattr(module, "async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+
+
+def test_one_client_per_event_loop():
+    async def get_twice():
+        return http_client.async_client(), http_client.async_client()
+
+    first, same = asyncio.run(get_twice())
+    second, _ = asyncio.run(get_twice())
+    assert first is same
+    assert second is not first
+    # The first loop has closed, so its client is no longer held
+    assert first not in http_client._async_clients.values()
+    asyncio.run(http_client.close_async_client())
+
+
+def test_a_second_loop_does_not_replace_a_live_loops_client():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def get():
+        return http_client.async_client()
+
+    try:
+        app_client = asyncio.run_coroutine_threadsafe(get(), loop).result()
+        other = asyncio.run(get())
+        assert other is not app_client
+        assert asyncio.run_coroutine_threadsafe(get(), loop).result() is app_client
+        assert not app_client.is_closed
+
+        asyncio.run_coroutine_threadsafe(http_client.close_async_client(), loop).result()
+        assert app_client.is_closed
+        assert loop not in http_client._async_clients
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_arun_inference_joins_the_streamed_response(monkeypatch):
+    lines = [{"response": "Unlocked "}, {"response": "gate"}, {"done": True}]
+
+    def handle(request):
+        assert json.loads(request.content)["prompt"].endswith("site.pdf")
+        body = "\n".join(json.dumps(line) for line in lines[:2]) + "\nnot json\n\n" + json.dumps(lines[2]) + "\n"
+        return httpx.Response(200, content=body.encode())
+
+    _async_client(monkeypatch, ollama_client, handle)
+    assert asyncio.run(ollama_client.arun_inference("site.pdf")) == {"text": "Unlocked gate", "confidence": 1.0}
+
+
+def test_aembed_text_fails_over_between_hosts(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://embed-down.test:11434,http://embed-up.test:11434")
+    hosts = []
+
+    def handle(request):
+        hosts.append(request.url.host)
+        if request.url.host == "embed-down.test":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"embedding": [0.1, 0.2]})
+
+    _async_client(monkeypatch, embedding, handle)
+    for ep in embedding.get_pool().endpoints:
+        ep.models_checked = float("inf")
+    assert asyncio.run(embedding.aembed_text("unlocked gate")) == [0.1, 0.2]
+    assert asyncio.run(embedding.aembed_text("unlocked gate")) == [0.1, 0.2]
+    assert hosts == ["embed-down.test", "embed-up.test", "embed-up.test"]
+
+
+def test_aembed_text_skips_short_text_and_swallows_errors(monkeypatch):
+    monkeypatch.delenv("OLLAMA_HOSTS", raising=False)
+    monkeypatch.setenv("OLLAMA_URL", "http://embed-broken.test:11434")
+    calls = []
+
+    def handle(request):
+        calls.append(request)
+        return httpx.Response(200, json={})
+
+    _async_client(monkeypatch, embedding, handle)
+    assert asyncio.run(embedding.aembed_text("  ab ")) == []
+    assert calls == []
+    assert asyncio.run(embedding.aembed_text("no embedding returned")) == []
+
+
+def test_afilter_unique_drops_items_already_in_the_library(monkeypatch):
+    pytest.importorskip("supabase")
+    from utils import semantics
+
+    vectors = {"new risk": [1.0, 0.0], "known risk": [0.0, 1.0], "embedding failed": []}
+    queried = []
+
+    async def aembed_texts(texts):
+        return [vectors[t] for t in texts]
+
+    async def aquery_embeddings(vec, match_threshold, match_count):
+        queried.append(vec)
+        return [{"embedding": [0.0, 1.0]}] if vec == [0.0, 1.0] else []
+
+    monkeypatch.setattr(semantics.emb, "aembed_texts", aembed_texts)
+    monkeypatch.setattr(semantics.sbc, "aquery_embeddings", aquery_embeddings)
+    unique = asyncio.run(semantics.afilter_unique([
+        {"vulnerability": "new risk"}, {"vulnerability": "known risk"}, {"question": "no text"},
+        {"vulnerability": "embedding failed"},
+    ]))
+    assert unique == [
+        {"vulnerability": "new risk", "embedding": [1.0, 0.0]},
+        {"vulnerability": "embedding failed", "embedding": []},
+    ]
+    # An empty vector is never sent to the library lookup
+    assert [] not in queried
+
+
+def _both_clients(monkeypatch, handle):
+    """Sync and async Ollama clients answering with `handle(request)`."""
+    transport = httpx.MockTransport(handle)
+    monkeypatch.setattr(ollama_client, "client", lambda url: httpx.Client(transport=transport))
+    _async_client(monkeypatch, ollama_client, handle)
+
+
+def test_async_document_call_sends_the_sync_request_through_the_pool(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", "http://doc-up.test:11434")
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://doc-down.test:11434,http://doc-up.test:11434")
+    pool = ollama_client.get_pool(None)
+    for ep in pool.endpoints:
+        ep.models_checked = float("inf")
+    sent = []
+
+    def handle(request):
+        if request.url.host == "doc-down.test":
+            raise httpx.ConnectError("refused", request=request)
+        busy = pool.idle_seconds() == 0.0 and ollama_client.limiter_for("http://doc-up.test:11434").in_flight == 1
+        sent.append((json.loads(request.content), request.extensions["timeout"], busy))
+        return httpx.Response(200, json={"response": "ok", "total_duration": 1e9})
+
+    _both_clients(monkeypatch, handle)
+    assert ollama_client.generate_from_document("a.pdf", {"temperature": 0})["response"] == "ok"
+    assert asyncio.run(ollama_client.agenerate_from_document("a.pdf", {"temperature": 0}))["response"] == "ok"
+
+    (sync_body, sync_timeout, _), (async_body, async_timeout, busy) = sent
+    assert async_body == sync_body
+    assert "stream" not in async_body
+    assert async_timeout == sync_timeout
+    # The async call held a pool and a limiter slot while it ran
+    assert busy
+    assert pool.idle_seconds() > 0
+
+
+def test_async_inference_matches_the_sync_request(monkeypatch):
+    monkeypatch.delenv("OLLAMA_HOSTS", raising=False)
+    monkeypatch.setenv("OLLAMA_URL", "http://infer.test:11434")
+    sent = []
+
+    def handle(request):
+        sent.append((json.loads(request.content), request.extensions["timeout"]))
+        return httpx.Response(200, content=b'{"response": "a"}\n{"response": "b", "done": true}\n')
+
+    _both_clients(monkeypatch, handle)
+    assert ollama_client.run_inference("site.pdf") == asyncio.run(ollama_client.arun_inference("site.pdf"))
+    assert sent[0] == sent[1]
@@ -0,0 +1,71 @@
+import json
+import random
+import zipfile
+
+import pytest
+
+from benchmarks import corpus, run
+
+
+def test_synthetic_corpus_is_reproducible():
+    mix = corpus.parse_mix("small=2, large=1")
+    assert mix == {"small": 2, "large": 1}
+    first, again = corpus.synthetic_corpus(mix, seed=7), corpus.synthetic_corpus(mix, seed=7)
+    assert [d.text for d in first] == [d.text for d in again]
+    assert [d.doc_id for d in first] == ["bench-small-000", "bench-small-001", "bench-large-000"]
+    assert first[0].text != first[1].text
+    assert all(d.chars >= corpus.SIZES[d.size] for d in first)
+    with pytest.raises(ValueError):
+        corpus.parse_mix("huge=1")
+
+
+def test_docx_holds_one_paragraph_per_line(tmp_path):
+    text = corpus.synthetic_text(500, random.Random(1))
+    path = corpus.write_docx(text + "\nA & <B>", str(tmp_path / "doc.docx"))
+    with zipfile.ZipFile(path) as z:
+        xml = z.read("word/document.xml").decode("utf-8")
+    assert xml.count("<w:p>") == len((text + "\nA & <B>").splitlines())
+    assert "A &amp; &lt;B&gt;" in xml
+
+
+def test_percentiles_interpolate():
+    assert run.percentile([], 0.5) is None
+    assert run.percentile([4, 1, 3, 2], 0.5) == 2.5
+    assert run.percentile([1, 2, 3, 4, 5], 0.95) == pytest.approx(4.8)
+
+
+def test_stage_summary_counts_llm_calls_per_document(tmp_path):
+    trace = tmp_path / "traces.jsonl"
+    spans = [
+        {"name": "document", "duration_ms": 900, "attrs": {"submission_id": "a"}},
+        {"name": "ollama", "duration_ms": 300, "attrs": {"submission_id": "a"}},
+        {"name": "ollama", "duration_ms": 500, "attrs": {"submission_id": "a"}},
+        {"name": "ollama", "duration_ms": 100, "attrs": {"submission_id": "b"}},
+        {"name": "ollama", "duration_ms": 100, "attrs": {"submission_id": "failed"}},
+    ]
+    trace.write_text("\n".join(json.dumps(s) for s in spans) + "\nnot json\n")
+    summary = run._stage_summary(str(trace), ["a", "b"])
+    assert summary["llm_calls_per_doc"] == 1.5
+    assert summary["stages"]["ollama"] == {"count": 3, "p50": 0.3, "p95": pytest.approx(0.48)}
+    assert "document" not in summary["stages"]
+
+
+def _pipeline(docs_per_hour, p95, errors=0, stage_p95=1.0):
+    return {"docs_per_hour": docs_per_hour, "document_seconds": {"p95": p95}, "peak_rss_mb": 100,
+            "llm_calls_per_doc": 2, "errors": errors, "stages": {"llm": {"p95": stage_p95}, "tiny": {"p95": 0.001}}}
+
+
+def test_compare_flags_changes_beyond_tolerance():
+    baseline = {"pipelines": {"parser": _pipeline(100, 10, stage_p95=1.0)}}
+    within = {"pipelines": {"parser": _pipeline(95, 10.5, stage_p95=1.05), "new": _pipeline(1, 1)}}
+    assert run.compare(within, baseline, tolerance=0.1) == []
+
+    worse = {"pipelines": {"parser": _pipeline(80, 12, errors=1, stage_p95=2.0)}}
+    worse["pipelines"]["parser"]["stages"]["tiny"]["p95"] = 0.005
+    regressions = run.compare(worse, baseline, tolerance=0.1)
+    assert regressions == [
+        "parser docs/hour: 100 -> 80 (-20%)",
+        "parser document p95 s: 10 -> 12 (+20%)",
+        "parser stage llm p95 s: 1 -> 2 (+100%)",
+        "parser errors: 0 -> 1",
+    ]
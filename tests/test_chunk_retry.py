@@ -0,0 +1,134 @@
+import json
+
+import httpx
+import pytest
+
+from utils import chunk_retry, ollama_client
+from utils.chunk_retry import FailedChunkStore, classify_error, reprocess_failed, run_with_retry
+from utils.ollama_client import ContextOverflowError, generate_structured
+from utils.vofc_schema import VOFC_ITEMS, StructuredOutputError
+
+
+def _status_error(status: int, body: str = "") -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://ollama.test/api/generate")
+    return httpx.HTTPStatusError("boom", request=request, response=httpx.Response(status, text=body, request=request))
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(chunk_retry.time, "sleep", lambda s: None)
+
+
+@pytest.mark.parametrize("exc, reason", [
+    (ContextOverflowError("truncated"), "context_overflow"),
+    (StructuredOutputError("no item matched"), "bad_json"),
+    (json.JSONDecodeError("Expecting value", "<html>", 0), "bad_json"),
+    (httpx.ReadTimeout("slow"), "timeout"),
+    (httpx.ConnectError("refused"), "connection"),
+    (_status_error(503), "server_error"),
+    (_status_error(400), "client_error"),
+    (_status_error(500, "input length exceeds the context window"), "context_overflow"),
+    (RuntimeError("?"), "error"),
+])
+def test_classify_error(exc, reason):
+    assert classify_error(exc) == reason
+
+
+def test_retryable_error_is_retried_until_it_succeeds():
+    calls = []
+
+    def call(chunk):
+        calls.append(chunk)
+        if len(calls) < chunk_retry.MAX_ATTEMPTS:
+            raise StructuredOutputError("bad")
+        return "ok"
+
+    assert run_with_retry("text", call) == (["ok"], [])
+    assert len(calls) == chunk_retry.MAX_ATTEMPTS
+
+
+def test_non_retryable_error_fails_at_once():
+    calls = []
+
+    def call(chunk):
+        calls.append(chunk)
+        raise _status_error(400)
+
+    results, failures = run_with_retry("text", call, "doc.c1")
+    assert results == [] and len(calls) == 1
+    assert failures[0]["reason"] == "client_error"
+    assert failures[0]["attempts"] == 1
+    assert failures[0]["chunk_id"].startswith("doc.c1-")
+    assert failures[0]["text"] == "text"
+
+
+def test_context_overflow_splits_the_chunk(monkeypatch):
+    monkeypatch.setattr(chunk_retry, "MIN_SPLIT_CHARS", 10)
+    chunk = "first half of the chunk\nsecond half of the chunk"
+
+    def call(piece):
+        if len(piece) > 30:
+            raise ContextOverflowError("too long")
+        return piece
+
+    results, failures = run_with_retry(chunk, call)
+    assert failures == []
+    assert "".join(results) == chunk and len(results) == 2
+
+
+def test_store_round_trip(tmp_path):
+    store = FailedChunkStore(str(tmp_path))
+    failed = [{"chunk_id": "doc.c2-abc", "reason": "timeout", "attempts": 3, "error": "", "text": "t"}]
+    store.save("docs/a b.pdf", failed, results=[{"vulnerability": "v"}])
+
+    assert len(list(tmp_path.iterdir())) == 1
+    state = store.load("docs/a b.pdf")
+    assert state["failed"] == failed
+    assert state["results"] == [{"vulnerability": "v"}]
+    assert store.failed_ids("docs/a b.pdf") == ["doc.c2-abc"]
+
+    store.save("docs/a b.pdf", [])
+    assert list(tmp_path.iterdir()) == []
+    assert store.load("docs/a b.pdf") == {"doc_id": "docs/a b.pdf", "failed": [], "results": []}
+
+
+def test_reprocess_reruns_only_failed_chunks(tmp_path):
+    store = FailedChunkStore(str(tmp_path))
+
+    def timeout(chunk):
+        raise httpx.ReadTimeout("slow")
+
+    _, failures = run_with_retry("flaky", timeout, "doc.c1")
+    store.save("doc", failures, results=["earlier"])
+
+    seen = []
+    recovered, previous, still_failed = reprocess_failed("doc", lambda c: seen.append(c) or c.upper(), store)
+    assert seen == ["flaky"]
+    assert (recovered, previous, still_failed) == (["FLAKY"], ["earlier"], [])
+    assert store.load("doc")["failed"] == []
+
+
+def _ollama(monkeypatch, body: dict) -> None:
+    monkeypatch.delenv("OLLAMA_HOSTS", raising=False)
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=body))
+    monkeypatch.setattr(ollama_client, "client", lambda base: httpx.Client(transport=transport))
+
+
+def test_truncated_output_raises_context_overflow(monkeypatch):
+    _ollama(monkeypatch, {"response": '[{"vulnerability": "cut o', "done_reason": "length"})
+    with pytest.raises(ContextOverflowError):
+        generate_structured("p", VOFC_ITEMS, model="m", base_url="http://overflow.test")
+
+
+def test_invalid_output_that_finished_is_not_an_overflow(monkeypatch):
+    _ollama(monkeypatch, {"response": '[{"question": "q"}]', "done_reason": "stop"})
+    with pytest.raises(StructuredOutputError) as info:
+        generate_structured("p", VOFC_ITEMS, model="m", base_url="http://invalid.test")
+    assert not isinstance(info.value, ContextOverflowError)
+    assert classify_error(info.value) == "bad_json"
+
+
+def test_null_total_duration_is_not_a_failure(monkeypatch):
+    _ollama(monkeypatch, {"response": '[{"vulnerability": "Unlocked gate"}]', "done_reason": "stop", "total_duration": None})
+    items = generate_structured("p", VOFC_ITEMS, model="m", base_url="http://null-duration.test")
+    assert items[0]["vulnerability"] == "Unlocked gate"
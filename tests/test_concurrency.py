@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from utils.concurrency import TIMEOUT_FLOOR, AIMDLimiter
+
+
+def _limiter(**kwargs) -> AIMDLimiter:
+    kwargs.setdefault("max_limit", 4)
+    return AIMDLimiter("test", **kwargs)
+
+
+def _ok(limiter: AIMDLimiter, server_seconds: float = 10.0) -> None:
+    with limiter.slot() as slot:
+        slot.server_seconds = server_seconds
+
+
+def test_fast_successes_at_the_limit_grow_it_additively():
+    limiter = _limiter(initial=1)
+    _ok(limiter)
+    assert limiter.limit == 2.0
+    # Below the limit there is no evidence more permits would be used
+    _ok(limiter)
+    assert limiter.limit == 2.0
+    with limiter.slot() as outer:
+        outer.server_seconds = 10.0
+        _ok(limiter)
+    assert limiter.limit == 2.5
+
+
+def test_limit_never_exceeds_max():
+    limiter = _limiter(initial=1, max_limit=2)
+    for _ in range(5):
+        _ok(limiter)
+    assert limiter.limit == 2.0
+
+
+@pytest.mark.parametrize("exc", [
+    httpx.ReadTimeout("slow"),
+    httpx.ConnectError("refused"),
+    httpx.HTTPStatusError(
+        "busy",
+        request=httpx.Request("POST", "http://x"),
+        response=httpx.Response(503, request=httpx.Request("POST", "http://x")),
+    ),
+])
+def test_overload_halves_the_limit(exc):
+    limiter = _limiter(initial=4)
+    with pytest.raises(type(exc)):
+        with limiter.slot():
+            raise exc
+    assert limiter.limit == 2.0
+    assert limiter.in_flight == 0
+
+
+def test_other_errors_leave_the_limit_alone():
+    limiter = _limiter(initial=4)
+    with pytest.raises(ValueError):
+        with limiter.slot():
+            raise ValueError("bad json")
+    assert limiter.limit == 4.0
+
+
+def test_queueing_delay_counts_as_overload():
+    limiter = _limiter(initial=4, min_queue_seconds=0.0)
+    with limiter.slot() as slot:
+        time.sleep(0.02)
+        slot.server_seconds = 0.001
+    assert limiter.limit == 2.0
+
+
+def test_one_decrease_per_round_trip():
+    limiter = _limiter(initial=4)
+    _ok(limiter)
+    limiter.latency_ewma = 60.0
+    for _ in range(2):
+        with pytest.raises(httpx.ReadTimeout):
+            with limiter.slot():
+                raise httpx.ReadTimeout("slow")
+    assert limiter.limit == 2.0
+
+
+def test_limit_never_drops_below_min():
+    limiter = _limiter(initial=1)
+    with pytest.raises(httpx.ReadTimeout):
+        with limiter.slot():
+            raise httpx.ReadTimeout("slow")
+    assert limiter.limit == 1.0
+
+
+def test_callers_wait_for_a_free_permit():
+    limiter = _limiter(initial=1, max_limit=1)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with limiter.slot():
+            entered.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    entered.wait(5)
+    waiter = threading.Thread(target=_ok, args=(limiter,))
+    waiter.start()
+    time.sleep(0.05)
+    assert limiter.in_flight == 1 and limiter.waiting == 1
+
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+
+
+def test_timeout_scales_with_observed_latency():
+    limiter = _limiter()
+    assert limiter.timeout(300.0) == 300.0
+    limiter.latency_ewma = 50.0
+    assert limiter.timeout(300.0) == 200.0
+    assert limiter.timeout(100.0) == 100.0
+    limiter.latency_ewma = 1.0
+    assert limiter.timeout(300.0) == TIMEOUT_FLOOR
+
+
+def test_coroutines_share_the_permits_without_blocking_the_loop():
+    limiter = _limiter(initial=1, max_limit=1)
+    order = []
+
+    async def call(name):
+        async with limiter.aslot():
+            order.append(f"{name} in")
+            await asyncio.sleep(0.02)
+            order.append(f"{name} out")
+
+    async def run():
+        ticks = 0
+        worker = asyncio.gather(call("a"), call("b"))
+        while not worker.done():
+            await asyncio.sleep(0.005)
+            ticks += 1
+        await worker
+        return ticks
+
+    assert asyncio.run(run()) >= 5
+    assert order == ["a in", "a out", "b in", "b out"]
+    assert (limiter.in_flight, limiter.waiting) == (0, 0)
+
+
+def test_cancelled_waiter_leaves_no_permit_behind():
+    limiter = _limiter(initial=1, max_limit=1)
+
+    async def run():
+        with limiter.slot():
+            waiter = asyncio.ensure_future(limiter.aslot().__aenter__())
+            await asyncio.sleep(0.01)
+            assert limiter.waiting == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+    asyncio.run(run())
+    assert (limiter.in_flight, limiter.waiting) == (0, 0)
+    _ok(limiter)
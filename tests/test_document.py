@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import document, pdf_text, text_cache
+from utils.document import Document, extract_citation
+
+TITLE_PAGE = """Physical Security Assessment Guide
+Prepared by: Jane Smith
+Cybersecurity and Infrastructure Security Agency
+Published: March 5, 2024
+Document #CISA-2024-001
+"""
+BODY = "The perimeter fence has gaps near the loading dock and is not monitored. See https://www.cisa.gov/guide"
+
+
+class _Reader:
+    is_encrypted = False
+
+    def __init__(self, pages):
+        self.pages = [SimpleNamespace(extract_text=lambda text=text: text) for text in pages]
+        self.metadata = {"/Title": "Assessment Guide", "/Author": " ", "/Producer": "Word"}
+
+
+@pytest.fixture
+def opens(tmp_path, monkeypatch):
+    """Counts PdfReader opens; the text cache lives in tmp_path."""
+    monkeypatch.setenv("TEXT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(text_cache, "ENABLED", True)
+    monkeypatch.setattr(pdf_text, "_poppler_pages", lambda path: pytest.fail("Poppler should not run"))
+    calls = []
+
+    def open_pdf_reader(path):
+        calls.append(path)
+        return _Reader([TITLE_PAGE, BODY])
+
+    monkeypatch.setattr(document, "open_pdf_reader", open_pdf_reader)
+    return calls
+
+
+def _pdf(tmp_path, content=b"%PDF-1.7 guide"):
+    path = tmp_path / "guide.pdf"
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_text_metadata_and_citation_share_one_open(opens, tmp_path):
+    doc = Document(_pdf(tmp_path))
+    assert doc.pages == [TITLE_PAGE, BODY]
+    assert doc.metadata["title"] == "Assessment Guide"
+    assert doc.metadata["author"] is None
+    citation = doc.citation()
+    assert citation["document_number"] == "CISA-2024-001"
+    assert citation["url"] == "https://www.cisa.gov/guide"
+    assert doc.citation() is citation
+    assert len(opens) == 1
+
+
+def test_cached_document_is_not_opened(opens, tmp_path):
+    path = _pdf(tmp_path)
+    first = Document(path)
+    first.pages, first.metadata
+    again = Document(path)
+    assert again.text == first.text
+    assert again.metadata == first.metadata
+    assert len(opens) == 1
+
+
+def test_known_hash_is_not_recomputed(opens, tmp_path, monkeypatch):
+    monkeypatch.setattr(document, "file_sha256", lambda path: pytest.fail("sha256 was given"))
+    doc = Document(_pdf(tmp_path), sha256="ab" * 32)
+    assert doc.pages[1] == BODY
+
+
+def test_citation_uses_the_title_page_only():
+    citation = extract_citation(TITLE_PAGE, TITLE_PAGE + BODY)
+    assert citation["title"] == "Physical Security Assessment Guide"
+    assert citation["authors"] == ["Jane Smith"]
+    assert citation["publication_date"] == "March 5, 2024"
+    assert citation["source_text"].startswith("Physical Security Assessment Guide. Jane Smith. ")
+    assert extract_citation("", "")["source_text"] == ""
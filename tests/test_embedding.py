@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import httpx
+
+from utils import embedding, metrics
+
+
+def _serve(monkeypatch, handle):
+    monkeypatch.delenv("OLLAMA_HOSTS", raising=False)
+    monkeypatch.setenv("OLLAMA_URL", "http://embed.test:11434")
+    monkeypatch.setattr(embedding, "async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    for ep in embedding.get_pool().endpoints:
+        ep.models_checked = float("inf")
+
+
+def test_one_batch_call_keeps_order_and_skips_short_texts(monkeypatch):
+    calls = []
+
+    def handle(request):
+        calls.append(request.url.path)
+        inputs = json.loads(request.content)["input"]
+        return httpx.Response(200, json={"embeddings": [[float(len(t))] for t in inputs]})
+
+    _serve(monkeypatch, handle)
+    vectors = asyncio.run(embedding.aembed_texts(["gate open", "", "ab", "fence down"]))
+    assert vectors == [[9.0], [], [], [10.0]]
+    assert calls == ["/api/embed"]
+
+
+def test_counts_a_batch_only_when_the_batch_call_works(monkeypatch):
+    def handle(request):
+        if request.url.path == "/api/embed":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"embedding": [1.0]})
+
+    _serve(monkeypatch, handle)
+    batches = metrics.get("embedding_batches_total", source="api")
+    fallbacks = metrics.get("embedding_batch_fallbacks_total", source="api")
+    asyncio.run(embedding.aembed_texts(["gate open", "fence down"]))
+    assert metrics.get("embedding_batches_total", source="api") == batches
+    assert metrics.get("embedding_batch_fallbacks_total", source="api") - fallbacks == 1
+
+    monkeypatch.setattr(
+        embedding, "async_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda r: httpx.Response(200, json={"embeddings": [[1.0], [2.0]]}))),
+    )
+    asyncio.run(embedding.aembed_texts(["gate open", "fence down"]))
+    assert metrics.get("embedding_batches_total", source="api") - batches == 1
+    assert metrics.get("embedding_batch_fallbacks_total", source="api") - fallbacks == 1
+
+
+def test_falls_back_to_one_call_per_text(monkeypatch):
+    calls = []
+
+    def handle(request):
+        calls.append(request.url.path)
+        if request.url.path == "/api/embed":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"embedding": [float(len(json.loads(request.content)["input"]))]})
+
+    _serve(monkeypatch, handle)
+    before = metrics.get("embedding_fallbacks_total", source="api")
+    assert asyncio.run(embedding.aembed_texts(["gate open", "fence down"])) == [[9.0], [10.0]]
+    assert calls.count("/api/embeddings") == 2
+    assert metrics.get("embedding_fallbacks_total", source="api") - before == 2
+
+
+def test_short_batch_answer_falls_back(monkeypatch):
+    def handle(request):
+        if request.url.path == "/api/embed":
+            return httpx.Response(200, json={"embeddings": [[1.0]]})
+        return httpx.Response(200, json={"embedding": [2.0]})
+
+    _serve(monkeypatch, handle)
+    assert asyncio.run(embedding.aembed_texts(["gate open", "fence down"])) == [[2.0], [2.0]]
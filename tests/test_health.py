@@ -0,0 +1,63 @@
+import httpx
+import pytest
+
+from utils import health, ollama_client
+
+
+def _handle(request: httpx.Request) -> httpx.Response:
+    if request.url.host == "down.test":
+        raise httpx.ConnectError("refused", request=request)
+    if request.url.path == "/api/version":
+        return httpx.Response(200, json={"version": "0.5.1"})
+    if request.url.path == "/api/ps":
+        return httpx.Response(200, json={"models": [{"name": "vofc-engine:latest", "size": 4000, "size_vram": 3000, "expires_at": "soon"}]})
+    if request.url.path == "/rest/v1/submissions":
+        total = {"eq.submitted": "7", "eq.processing": "2"}[request.url.params["status"]]
+        return httpx.Response(200, json=[], headers={"content-range": f"0-0/{total}"})
+    return httpx.Response(404)
+
+
+@pytest.fixture
+def prober(monkeypatch, tmp_path):
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://up.test:11434,http://down.test:11434")
+    monkeypatch.setattr(health, "client", lambda base: httpx.Client(transport=httpx.MockTransport(_handle)))
+    (tmp_path / "a.pdf").write_bytes(b"%PDF")
+    (tmp_path / "notes.md").write_text("ignored")
+    (tmp_path / ".partial.pdf").write_bytes(b"")
+    (tmp_path / ".uploads" / "u1").mkdir(parents=True)
+    return health.HealthProber(supabase_url="http://supabase.test/", supabase_key="k", incoming_dir=tmp_path)
+
+
+def test_snapshot_covers_every_component(prober):
+    assert prober.snapshot()["ollama"] == {"status": "starting"}
+    snap = prober.refresh()
+
+    ollama = snap["ollama"]
+    assert (ollama["status"], ollama["degraded"]) == ("ok", True)
+    up, down = ollama["hosts"]
+    assert up["version"] == "0.5.1"
+    assert up["models"] == [{"name": "vofc-engine:latest", "vram_share": 0.75, "expires_at": "soon"}]
+    assert down["status"] == "down"
+
+    assert (snap["supabase"]["submitted"], snap["supabase"]["processing"]) == (7, 2)
+    assert (snap["queue"]["incoming_files"], snap["queue"]["uploads_in_progress"]) == (1, 1)
+    assert all(part["checked_at"] and part["last_success_at"] for part in snap.values())
+    assert prober.snapshot() is snap
+
+
+def test_failure_keeps_the_last_success_time(prober, monkeypatch):
+    first = prober.refresh()["ollama"]["last_success_at"]
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://down.test:11434")
+    ollama = prober.refresh()["ollama"]
+    assert ollama["status"] == "down"
+    assert "refused" in ollama["error"]
+    assert ollama["last_success_at"] == first
+
+
+def test_model_info_reads_the_snapshot(prober, monkeypatch):
+    prober.refresh()
+    monkeypatch.setattr(ollama_client, "health_prober", lambda: prober)
+    assert ollama_client.get_model_info("vofc-engine") == {
+        "version": "0.5.1", "gpu_load": 0.75, "host": "http://up.test:11434", "expires_at": "soon",
+    }
+    assert ollama_client.get_model_info("other") == {"version": "0.5.1", "gpu_load": None}
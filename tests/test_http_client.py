@@ -0,0 +1,57 @@
+import httpx
+
+from utils import http_client, metrics
+
+
+def test_one_client_per_origin():
+    first = http_client.client("http://pool-a.test:11434/api/generate")
+    assert http_client.client("http://pool-a.test:11434/api/tags") is first
+    assert http_client.client("http://pool-b.test:11434/api/generate") is not first
+
+    first.close()
+    assert http_client.client("http://pool-a.test:11434") is not first
+
+
+def test_origin_keeps_scheme_and_port():
+    assert http_client._origin("https://tunnel.test/api/chat") == "https://tunnel.test"
+    assert http_client._origin("http://ollama.test:11434/api/chat?x=1") == "http://ollama.test:11434"
+    assert http_client._origin(None) == "default"
+
+
+def test_pooling_off_keeps_no_idle_connections(monkeypatch):
+    monkeypatch.setattr(http_client, "POOLING", False)
+    assert http_client._limits(5).max_keepalive_connections == 0
+    monkeypatch.setattr(http_client, "POOLING", True)
+    assert http_client._limits(5).max_keepalive_connections == 5
+
+
+def test_requests_are_timed_per_target():
+    target = "http://timed.test:8000"
+    before = metrics.get("http_requests_total", target=target)
+    with httpx.Client(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+        event_hooks={"request": [http_client._on_request], "response": [http_client._on_response]},
+    ) as c:
+        c.get(f"{target}/health")
+        c.get(f"{target}/health")
+    assert metrics.get("http_requests_total", target=target) - before == 2
+    assert http_client.mean_latency(f"{target}/other") >= 0.0
+
+
+def test_legacy_pipeline_script_uses_the_pooled_clients(monkeypatch, tmp_path):
+    from scripts import vofc_pipeline as legacy
+
+    seen = []
+
+    def handle(request):
+        seen.append(request.url.path)
+        return httpx.Response(200, json={"response": '[{"vulnerability": "gate open"}]'})
+
+    transport = httpx.MockTransport(handle)
+    monkeypatch.setattr(legacy, "client", lambda url: httpx.Client(transport=transport))
+    monkeypatch.setattr(legacy, "SUPABASE_URL", "http://supabase.test")
+    monkeypatch.setattr(legacy, "SUPABASE_KEY", "key")
+
+    assert legacy.process_with_model(legacy.MODELS[0], "prompt") == [{"vulnerability": "gate open"}]
+    legacy.update_supabase(tmp_path / "a.pdf", [])
+    assert seen == ["/api/generate", "/rest/v1/submissions"]
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks import loadgen
+from benchmarks.corpus import Doc
+
+
+def test_parsers():
+    assert loadgen.parse_weights("upload=4, status", loadgen.TARGETS["fastapi"]) == {"upload": 4.0, "status": 1.0}
+    with pytest.raises(ValueError):
+        loadgen.parse_weights("submit=1", loadgen.TARGETS["fastapi"])
+    with pytest.raises(ValueError):
+        loadgen.parse_weights("status=0", loadgen.TARGETS["fastapi"])
+    assert loadgen.parse_stages("1:30, 2.5:10") == [(1.0, 30.0), (2.5, 10.0)]
+    text = (
+        "# TYPE ollama_inflight_requests gauge\n"
+        'ollama_inflight_requests{host="a"} 2\n'
+        'ollama_inflight_requests{host="b"} 3\n'
+        "queue_submitted 7\n"
+        "http_requests_total 99\n"
+    )
+    assert loadgen.parse_gauges(text) == {"ollama_inflight_requests": 5.0, "queue_submitted": 7.0}
+
+
+def _generator(**kwargs):
+    return loadgen.LoadGenerator(
+        target="fastapi", base_url="http://api.test", mix={"upload": 1, "process-one": 1, "status": 1},
+        docs=[Doc("d1", "small", text="Finding 1: the gate is unlocked.")], arrival="uniform",
+        interval=0.1, verbose=False, **kwargs,
+    )
+
+
+def test_run_chains_uploads_into_process_one(monkeypatch):
+    seen = []
+
+    def handle(request):
+        seen.append((request.method, request.url.path, request.content))
+        if request.url.path == "/files/upload":
+            return httpx.Response(200, json={"ollama_file_id": f"f{len(seen)}.txt"})
+        if request.url.path == "/metrics":
+            return httpx.Response(200, text="queue_incoming_files 3\n")
+        if request.url.path == "/process-one" and b"file_path" not in request.content:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"status": "ok"})
+
+    real = httpx.AsyncClient
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kw: real(transport=httpx.MockTransport(handle), **kw))
+    gen = _generator(stages=[(40, 0.5)], upload_dir="/srv/incoming")
+    result = asyncio.run(gen.run())
+
+    assert result["overall"]["requests"] == gen.sent[0] == 20
+    referenced = [body for method, path, body in seen if path == "/process-one" and b"file_path" in body]
+    assert all(b"/srv/incoming/f" in body for body in referenced)
+    assert result["overall"]["errors"] == result["operations"].get("process-one", {}).get("errors", 0)
+    assert result["timeline"] and result["timeline"][0]["queue_incoming_files"] == 3
+    assert result["stages"][0]["offered_rps"] == 40
+
+
+def test_stage_is_saturated_when_requests_are_dropped_or_fail():
+    gen = _generator(stages=[(1, 10), (5, 10)])
+    gen.records = [("status", 1.0, 0.1, 200, None, 0)] * 10 + [("status", 11.0, 0.1, 503, "HTTP 503", 1)] * 10
+    gen.sent.update({0: 10, 1: 10})
+    gen.dropped.update({1: 5})
+    report = gen.report(20.0)
+    first, second = report["stages"]
+    assert (first["saturated"], second["saturated"]) == (False, True)
+    assert (second["error_rate"], second["dropped"], second["arrival_rps"]) == (1.0, 5, 1.5)
+    assert report["saturated_at_rps"] == 5
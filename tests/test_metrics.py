@@ -0,0 +1,48 @@
+import pytest
+
+from utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+
+
+def test_counters_and_gauges_render_with_labels():
+    metrics.inc("text_cache_hits_total", kind="pdf")
+    metrics.inc("text_cache_hits_total", 2, kind="pdf")
+    metrics.inc("text_cache_hits_total", kind="docx")
+    metrics.set_gauge("queue_incoming_files", 4)
+    metrics.set_gauge("ollama_tokens_per_second", 12.5, schema='say "hi"\n')
+    assert metrics.render_prometheus().splitlines() == [
+        "# TYPE text_cache_hits_total counter",
+        'text_cache_hits_total{kind="docx"} 1',
+        'text_cache_hits_total{kind="pdf"} 3',
+        "# TYPE ollama_tokens_per_second gauge",
+        'ollama_tokens_per_second{schema="say \\"hi\\"\\n"} 12.5',
+        "# TYPE queue_incoming_files gauge",
+        "queue_incoming_files 4",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.2, 0.7, 3, 5000):
+        metrics.observe("submission_seconds", value, buckets=(0.5, 1, 10), pipeline="auto")
+    assert metrics.render_prometheus().splitlines() == [
+        "# TYPE submission_seconds histogram",
+        'submission_seconds_bucket{pipeline="auto",le="0.5"} 1',
+        'submission_seconds_bucket{pipeline="auto",le="1"} 2',
+        'submission_seconds_bucket{pipeline="auto",le="10"} 3',
+        'submission_seconds_bucket{pipeline="auto",le="+Inf"} 4',
+        'submission_seconds_sum{pipeline="auto"} 5003.9',
+        'submission_seconds_count{pipeline="auto"} 4',
+    ]
+
+
+def test_timer_observes_even_when_the_block_raises():
+    with pytest.raises(ValueError):
+        with metrics.timer("supabase_write_seconds", table="submissions"):
+            raise ValueError("write failed")
+    assert 'supabase_write_seconds_count{table="submissions"} 1' in metrics.render_prometheus()
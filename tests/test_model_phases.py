@@ -0,0 +1,140 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from automation import vofc_pipeline as vp
+from utils import ollama_client
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Fake model calls: records (model, prompt, keep_alive) and unloads; the first document of a phase pays a load."""
+    calls, unloads = [], []
+
+    def process_with_model(model_config, prompt, keep_alive=None):
+        calls.append((model_config["name"], prompt, keep_alive))
+        ollama_client.record_load(model_config["name"], {"load_duration": 2e9 if prompt == "a" else 1e6})
+        return [{"vulnerability": f"{model_config['role']} finding in {prompt}"}]
+
+    monkeypatch.setattr(vp, "process_with_model", process_with_model)
+    monkeypatch.setattr(vp, "unload_model", lambda model, base_url=None: unloads.append(model))
+    return calls, unloads
+
+
+def test_batch_runs_one_model_at_a_time(models):
+    calls, unloads = models
+    docs = {Path(f"{name}.pdf"): name for name in "abc"}
+    results, stats = vp.run_model_phases(docs)
+
+    names = [m["name"] for m in vp.MODELS]
+    assert [name for name, _, _ in calls] == [name for name in names for _ in range(3)]
+    assert {keep_alive for _, _, keep_alive in calls} == {vp.PHASE_KEEP_ALIVE}
+    # Each model is released before the next one loads; the last one stays for the next batch
+    assert unloads == names[:-1]
+
+    assert [r["model"] for r in results[Path("b.pdf")]] == names
+    assert results[Path("b.pdf")][0]["data"] == [{"vulnerability": "primary finding in b"}]
+    assert stats["documents"] == 3
+    assert stats["model_loads"] == len(names)
+    assert [p["model_loads"] for p in stats["phases"]] == [1] * len(names)
+    assert stats["load_seconds"] == pytest.approx(len(names) * (2.0 + 2e-3), abs=0.01)
+
+
+def test_process_batch_reports_each_file(models, monkeypatch, tmp_path):
+    monkeypatch.setattr(vp, "PROCESSED_FOLDER", str(tmp_path / "processed"))
+    monkeypatch.setattr(vp, "LIBRARY_FOLDER", str(tmp_path / "library"))
+    monkeypatch.setattr(vp, "SUPABASE_URL", "")
+    files = []
+    for name in ("a.pdf", "scan.pdf", "c.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF")
+        files.append(tmp_path / name)
+
+    def prepare_document(file_path):
+        if file_path.name == "scan.pdf":
+            raise ValueError("Extracted text too short (may be image-only PDF)")
+        return file_path.stem
+
+    monkeypatch.setattr(vp, "prepare_document", prepare_document)
+    batch = vp.process_batch(files)
+
+    assert [r["success"] for r in batch["results"]] == [True, False, True]
+    assert "image-only" in batch["results"][1]["error"]
+    assert batch["stats"]["documents"] == 2
+    assert sorted(p.name for p in (tmp_path / "library").iterdir()) == ["a.pdf", "c.pdf"]
+    assert sorted(p.name for p in (tmp_path / "processed").iterdir()) == ["a.json", "c.json"]
+    assert (tmp_path / "scan.pdf").exists()
+
+
+def test_pipeline_writes_an_outcome_for_each_file(models, monkeypatch, tmp_path):
+    monkeypatch.setattr(vp, "PROCESSED_FOLDER", str(tmp_path / "processed"))
+    monkeypatch.setattr(vp, "LIBRARY_FOLDER", str(tmp_path / "library"))
+    monkeypatch.setattr(vp, "SUPABASE_URL", "")
+    monkeypatch.setattr(vp, "prepare_document", lambda file_path: file_path.stem)
+    good, gone = tmp_path / "a.pdf", tmp_path / "gone.pdf"
+    good.write_bytes(b"%PDF")
+    report = tmp_path / "report.json"
+    monkeypatch.setattr(sys, "argv", ["vofc_pipeline.py", "--report", str(report), "--file", str(good), "--file", str(gone)])
+
+    assert vp.main() == 1
+    files = json.loads(report.read_text())["files"]
+    assert files[str(good)]["success"] is True
+    assert files[str(gone)] == {"success": False, "error": "File not found"}
+
+
+def test_watcher_files_documents_by_the_pipeline_report(monkeypatch, tmp_path):
+    pytest.importorskip("watchdog")
+    from automation import ollama_auto_processor as watcher
+
+    incoming = tmp_path / "incoming"
+    incoming.mkdir()
+    names = ("archived.pdf", "saved.pdf", "failed.pdf", "skipped.pdf")
+    files = [incoming / name for name in names]
+    for f in files:
+        f.write_bytes(b"%PDF")
+        watcher.processing_files.add(f)
+    archived, saved, failed, skipped = files
+
+    def run(cmd, **kwargs):
+        assert cmd[cmd.index("--file") + 1] == str(archived)
+        archived.rename(tmp_path / archived.name)
+        report = {"files": {
+            str(archived): {"success": True, "library_path": str(tmp_path / archived.name)},
+            str(saved): {"success": True, "library_path": None},
+            str(failed): {"success": False, "error": "no text"},
+        }}
+        Path(cmd[cmd.index("--report") + 1]).write_text(json.dumps(report))
+        return subprocess.CompletedProcess(cmd, 1, "", "failed.pdf: no text")
+
+    monkeypatch.setattr(watcher.subprocess, "run", run)
+    monkeypatch.setattr(watcher, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(watcher, "PROCESSED_FOLDER", str(tmp_path / "processed"))
+    monkeypatch.setattr(watcher, "ERROR_FOLDER", str(tmp_path / "errors"))
+    watcher.process_batch(files)
+
+    assert [p.name for p in (tmp_path / "processed").iterdir()] == ["saved.pdf"]
+    assert [p.name for p in (tmp_path / "errors").iterdir()] == ["failed.pdf"]
+    assert [p.name for p in incoming.iterdir()] == ["skipped.pdf"]
+    assert not list(tmp_path.glob("batch_*.json"))
+    assert not watcher.processing_files
+
+
+def test_watcher_leaves_files_in_place_without_a_report(monkeypatch, tmp_path):
+    pytest.importorskip("watchdog")
+    from automation import ollama_auto_processor as watcher
+
+    pending = tmp_path / "pending.pdf"
+    pending.write_bytes(b"%PDF")
+
+    def run(cmd, **kwargs):
+        raise subprocess.TimeoutExpired(cmd, 1)
+
+    monkeypatch.setattr(watcher.subprocess, "run", run)
+    monkeypatch.setattr(watcher, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(watcher, "ERROR_FOLDER", str(tmp_path / "errors"))
+    watcher.process_batch([pending])
+
+    assert pending.exists()
+    assert not (tmp_path / "errors").exists()
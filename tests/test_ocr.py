@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import ocr
+
+
+class _Image:
+    def __init__(self, page: int, dpi: int):
+        self.page, self.dpi, self.closed = page, dpi, False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Fake pdf2image: records (first, last, dpi) per render and returns one _Image per page."""
+    calls = []
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page, poppler_path=None, thread_count=1):
+        calls.append((first_page, last_page, dpi))
+        return [_Image(p, dpi) for p in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(ocr, "convert_from_path", convert_from_path)
+    return calls
+
+
+def test_ranges_group_consecutive_pages():
+    assert ocr._ranges([1, 2, 3, 4, 5, 6], 4) == [(1, 4), (5, 6)]
+    assert ocr._ranges([2, 3, 7, 9, 10], 4) == [(2, 3), (7, 7), (9, 10)]
+    assert ocr._ranges([], 4) == []
+
+
+def test_read_joins_words_by_line_and_skips_noise(monkeypatch):
+    data = {
+        "text": ["Gate", "is", "", "unlocked", "~"],
+        "conf": ["90", "80", "-1", "70", "-1"],
+        "block_num": [1, 1, 1, 1, 1],
+        "par_num": [1, 1, 1, 1, 1],
+        "line_num": [1, 1, 1, 2, 2],
+        "height": [20, 10, 0, 30, 5],
+    }
+    fake = SimpleNamespace(image_to_data=lambda image, lang, output_type: data, Output=SimpleNamespace(DICT="dict"))
+    monkeypatch.setattr(ocr, "pytesseract", fake)
+    assert ocr._read(object(), "eng") == ("Gate is\nunlocked", 20.0, 80.0)
+
+
+def test_small_print_is_rerendered_at_a_higher_dpi(renders, monkeypatch):
+    # Page 2 has 12 px words: re-rendered so they reach OCR_TARGET_PX, capped at OCR_MAX_DPI
+    monkeypatch.setattr(ocr, "_read", lambda image, lang: (
+        f"p{image.page}@{image.dpi}", 12.0 if image.page == 2 and image.dpi == ocr.OCR_DPI else 30.0, 90.0
+    ))
+    out = ocr._ocr_range("doc.pdf", 1, 3, None, "eng")
+
+    hi_dpi = min(ocr.OCR_MAX_DPI, int(ocr.OCR_DPI * ocr.OCR_TARGET_PX / 12.0))
+    assert out == [(1, f"p1@{ocr.OCR_DPI}", ocr.OCR_DPI), (2, f"p2@{hi_dpi}", hi_dpi), (3, f"p3@{ocr.OCR_DPI}", ocr.OCR_DPI)]
+    assert renders == [(1, 3, ocr.OCR_DPI), (2, 2, hi_dpi)]
+
+
+def test_ocr_pdf_returns_requested_pages_by_number(monkeypatch):
+    tasks = []
+
+    def ocr_range(pdf_path, first, last, poppler_path, lang):
+        tasks.append((first, last))
+        return [(p, f"page {p}", ocr.OCR_DPI) for p in range(first, last + 1)]
+
+    monkeypatch.setattr(ocr, "OCR_AVAILABLE", True)
+    monkeypatch.setattr(ocr, "OCR_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(ocr, "_ocr_range", ocr_range)
+    monkeypatch.setattr(ocr, "page_count", lambda pdf_path, poppler_path=None: 5)
+
+    assert ocr.ocr_pdf("doc.pdf", pages=[5, 2, 3, 3], workers=1) == {2: "page 2", 3: "page 3", 5: "page 5"}
+    assert tasks == [(2, 3), (5, 5)]
+    tasks.clear()
+    assert sorted(ocr.ocr_pdf("doc.pdf", workers=1)) == [1, 2, 3, 4, 5]
+    assert ocr.ocr_pdf("doc.pdf", pages=[], workers=1) == {}
+
+
+def test_ocr_pdf_without_ocr_libraries(monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_AVAILABLE", False)
+    with pytest.raises(RuntimeError):
+        ocr.ocr_pdf("doc.pdf")
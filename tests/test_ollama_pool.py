@@ -0,0 +1,122 @@
+import asyncio
+import itertools
+import time
+
+import httpx
+import pytest
+
+from utils.ollama_pool import OllamaPool, configured_hosts
+
+_ids = itertools.count()
+
+
+def _pool(n: int = 2) -> OllamaPool:
+    # Hosts are unique per test: limiters are shared per URL
+    run = next(_ids)
+    pool = OllamaPool([f"http://ollama-{run}-{i}.test:11434/" for i in range(n)])
+    for ep in pool.endpoints:
+        ep.models_checked = time.monotonic()
+    return pool
+
+
+def _status_error(status: int, body: str = "") -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://x/api/generate")
+    return httpx.HTTPStatusError("boom", request=request, response=httpx.Response(status, text=body, request=request))
+
+
+def _failing_on(bad: str, exc: Exception):
+    calls = []
+
+    def fn(url):
+        calls.append(url)
+        if url == bad:
+            raise exc
+        return url
+
+    return fn, calls
+
+
+@pytest.mark.parametrize("exc", [httpx.ConnectError("refused"), _status_error(502)])
+def test_host_failure_fails_over_and_marks_the_host_down(exc):
+    pool = _pool()
+    first, second = pool.urls
+    fn, calls = _failing_on(first, exc)
+
+    assert pool.call("m", fn) == second
+    assert calls == [first, second]
+    assert not pool.endpoints[0].healthy and pool.endpoints[0].failures == 1
+    assert pool.endpoints[1].healthy and "m" in pool.endpoints[1].models
+    assert [ep.in_flight for ep in pool.endpoints] == [0, 0]
+
+    # The host cooling down is skipped while another one is healthy
+    calls.clear()
+    pool.call("m", fn)
+    assert calls == [second]
+
+
+def test_recovered_host_resets_its_failures():
+    pool = _pool(1)
+    ep = pool.endpoints[0]
+    ep.mark_failure()
+    ep.mark_failure()
+    assert ep.failures == 2 and not ep.healthy
+    # With every host cooling down the one that comes back first is still tried
+    assert pool.call(None, lambda url: "ok") == "ok"
+    assert ep.failures == 0 and ep.healthy
+
+
+@pytest.mark.parametrize("exc", [_status_error(500, "input exceeds the context length"), _status_error(400), ValueError("bad")])
+def test_request_errors_are_not_failed_over(exc):
+    pool = _pool()
+    fn, calls = _failing_on(pool.urls[0], exc)
+    with pytest.raises(type(exc)):
+        pool.call("m", fn)
+    assert calls == [pool.urls[0]]
+    assert all(ep.healthy for ep in pool.endpoints)
+
+
+def test_all_hosts_failing_raises_the_last_error():
+    pool = _pool()
+
+    def fn(url):
+        raise httpx.ConnectError(url)
+
+    with pytest.raises(httpx.ConnectError) as info:
+        pool.call("m", fn)
+    assert str(info.value) == pool.urls[1]
+    assert not any(ep.healthy for ep in pool.endpoints)
+
+
+def test_prefers_the_host_with_the_model_resident():
+    pool = _pool()
+    pool.endpoints[1].models = {"vofc-engine:latest"}
+    assert pool.pick("vofc-engine") is pool.endpoints[1]
+    assert pool.pick("other") is pool.endpoints[0]
+
+
+def test_leaves_a_full_resident_host_for_an_idle_one():
+    pool = _pool()
+    busy, idle = pool.endpoints
+    busy.models = {"m:latest"}
+    busy.in_flight = 100
+    assert pool.pick("m") is idle
+
+
+def test_acall_fails_over():
+    pool = _pool()
+    first, second = pool.urls
+
+    async def fn(url):
+        if url == first:
+            raise httpx.ConnectError("refused")
+        return url
+
+    assert asyncio.run(pool.acall("m", fn)) == second
+    assert not pool.endpoints[0].healthy
+
+
+def test_configured_hosts(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://a:11434/, http://b:11434,")
+    assert configured_hosts("http://ignored") == ["http://a:11434", "http://b:11434"]
+    monkeypatch.delenv("OLLAMA_HOSTS")
+    assert configured_hosts("http://one:11434/") == ["http://one:11434"]
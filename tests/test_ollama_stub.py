@@ -0,0 +1,102 @@
+import json
+
+import httpx
+import pytest
+
+from benchmarks.ollama_stub import OllamaStub, request_key, synthetic_embedding, synthetic_value
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {"type": "array", "items": {"type": "object", "properties": {
+            "vulnerability": {"type": "string"}, "severity": {"enum": ["low", "high"]}, "score": {"type": "number"},
+        }}},
+    },
+}
+FAST = {"latency_ms": 0, "speedup": 1000}
+
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def start(**kwargs):
+        stub = OllamaStub(**{**FAST, **kwargs}).start()
+        started.append(stub)
+        return stub
+
+    yield start
+    for stub in started:
+        stub.stop()
+
+
+def _generate(stub, prompt, **extra):
+    body = {"model": "vofc-engine", "prompt": prompt, "format": SCHEMA, "stream": False, **extra}
+    return httpx.post(f"{stub.url}/api/generate", json=body)
+
+
+def test_record_then_replay_strictly(stubs, tmp_path):
+    cassette = str(tmp_path / "ollama.jsonl")
+    upstream = stubs(cassette=None)
+    recorder = stubs(cassette=cassette, record=True, upstream=upstream.url)
+    recorded = _generate(recorder, "chunk one").json()
+    assert recorder.stats["recorded"] == 1
+
+    replay = stubs(cassette=cassette, on_miss="error")
+    # Options and keep_alive do not change the answer, so they are not part of the key
+    again = _generate(replay, "chunk one", options={"temperature": 0.2}, keep_alive="5m").json()
+    assert again["response"] == recorded["response"]
+    assert _generate(replay, "chunk two").status_code == 404
+    assert (replay.stats["hits"], replay.stats["misses"]) == (1, 1)
+    assert replay.cassette.models() == ["vofc-engine"]
+    assert [m["name"] for m in httpx.get(f"{replay.url}/api/tags").json()["models"]] == ["vofc-engine"]
+
+
+def test_synthetic_answers_follow_the_schema(stubs):
+    stub = stubs(cassette=None)
+    data = json.loads(_generate(stub, "chunk").json()["response"])
+    assert len(data["items"]) == 2
+    assert data["items"][0]["severity"] == "low"
+    assert isinstance(data["items"][0]["score"], float)
+    assert data["items"][0]["vulnerability"] != data["items"][1]["vulnerability"]
+    assert synthetic_value({"type": "string"}, "x") == "Synthetic value x"
+
+
+def test_streamed_chunks_join_to_the_full_answer(stubs):
+    stub = stubs(cassette=None)
+    whole = _generate(stub, "chunk").json()["response"]
+    lines = httpx.post(f"{stub.url}/api/generate", json={"model": "vofc-engine", "prompt": "chunk", "format": SCHEMA}).text
+    chunks = [json.loads(line) for line in lines.splitlines() if line]
+    assert "".join(c["response"] for c in chunks) == whole
+    assert chunks[-1]["done"] and not chunks[0]["done"]
+
+
+def test_residency_follows_keep_alive(stubs):
+    stub = stubs(cassette=None, load_ms=1000)
+
+    def resident():
+        return [m["name"] for m in httpx.get(f"{stub.url}/api/ps").json()["models"]]
+
+    first = _generate(stub, "a", keep_alive="10m").json()
+    second = _generate(stub, "b").json()
+    assert first["load_duration"] > 0 and second["load_duration"] == 0
+    assert resident() == ["vofc-engine"]
+    unload = httpx.post(f"{stub.url}/api/generate", json={"model": "vofc-engine", "keep_alive": 0}).json()
+    assert unload["done_reason"] == "unload"
+    assert resident() == []
+    assert stub.stats["loads"] == 1
+
+
+def test_embeddings_are_deterministic_unit_vectors(stubs):
+    stub = stubs(cassette=None, embed_dim=8)
+    body = {"model": "nomic-embed-text", "input": ["gate open", "fence down", "gate open"]}
+    a, b, c = httpx.post(f"{stub.url}/api/embed", json=body).json()["embeddings"]
+    assert a == c != b
+    assert a == synthetic_embedding("gate open", 8)
+    assert sum(v * v for v in a) == pytest.approx(1.0)
+
+
+def test_key_ignores_stream_and_options():
+    body = {"model": "m", "prompt": "p"}
+    assert request_key("/api/generate", body) == request_key("/api/generate", {**body, "stream": False, "options": {"x": 1}})
+    assert request_key("/api/generate", body) != request_key("/api/chat", body)
@@ -0,0 +1,92 @@
+import pytest
+
+from utils import pdf_text, text_cache
+from utils.pdf_text import PdfText, extract_pdf_text, page_is_usable
+
+GOOD = "The perimeter fence has gaps near the loading dock and is not monitored."
+CID = "(cid:12)(cid:34)(cid:56) (cid:78)(cid:90)(cid:11)(cid:22)"
+
+
+@pytest.mark.parametrize("text, usable", [
+    (GOOD, True),
+    ("", False),
+    ("   short   ", False),
+    (CID, False),
+    ("#### %%%% @@@@ **** #### %%%% @@@@", False),
+    ("12 34 56 78 90 12 34 56 78 90 12 34", False),
+])
+def test_page_is_usable(text, usable):
+    assert page_is_usable(text) is usable
+
+
+def test_offsets_map_back_to_pages():
+    doc = PdfText(["abc", "", "defg"], ["pypdf2", "empty", "pypdf2"])
+    assert doc.text == "abc\n\ndefg"
+    assert doc.offsets == [0, 4, 5]
+    assert [doc.page_at(i) for i in (0, 3, 4, 5, 8)] == [1, 1, 2, 3, 3]
+    assert doc.page_range(1, 7) == (1, 3)
+    assert doc.stats() == {"pypdf2": 2, "empty": 1}
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Per-extractor page lists the test fills in; records which pages were OCR'd."""
+    state = {"pypdf": None, "poppler": None, "ocr": {}, "ocr_calls": []}
+
+    def ocr_pdf(pdf_path, pages=None):
+        state["ocr_calls"].append(pages)
+        return {n: t for n, t in state["ocr"].items() if pages is None or n in pages}
+
+    monkeypatch.setattr(pdf_text, "_pypdf_pages", lambda path, reader_factory=None: (
+        None if state["pypdf"] is None else list(state["pypdf"])
+    ))
+    monkeypatch.setattr(pdf_text, "_poppler_pages", lambda path: None if state["poppler"] is None else list(state["poppler"]))
+    monkeypatch.setattr(pdf_text, "ocr_pdf", ocr_pdf)
+    monkeypatch.setattr(pdf_text, "OCR_AVAILABLE", True)
+    monkeypatch.setattr(text_cache, "ENABLED", False)
+    return state
+
+
+def test_each_page_falls_back_on_its_own(sources):
+    sources["pypdf"] = [GOOD, CID, "", GOOD]
+    sources["poppler"] = [GOOD, GOOD + " (poppler)", "", GOOD]
+    sources["ocr"] = {3: "Scanned page about the badge readers"}
+
+    doc = extract_pdf_text("doc.pdf")
+    assert doc.extractors == ["pypdf2", "poppler", "ocr", "pypdf2"]
+    assert doc.pages[1] == GOOD + " (poppler)"
+    assert doc.pages[2] == "Scanned page about the badge readers"
+    assert sources["ocr_calls"] == [[3]]
+
+
+def test_readable_pdf_never_runs_poppler_or_ocr(sources, monkeypatch):
+    sources["pypdf"] = [GOOD, GOOD]
+    monkeypatch.setattr(pdf_text, "_poppler_pages", lambda path: pytest.fail("Poppler should not run"))
+    assert extract_pdf_text("doc.pdf").extractors == ["pypdf2", "pypdf2"]
+    assert sources["ocr_calls"] == []
+
+
+def test_different_pagination_takes_poppler_as_a_whole(sources):
+    sources["pypdf"] = [CID]
+    sources["poppler"] = [GOOD, GOOD]
+    doc = extract_pdf_text("doc.pdf")
+    assert doc.extractors == ["poppler", "poppler"]
+    assert sources["ocr_calls"] == []
+
+
+def test_unreadable_everywhere_falls_back_to_ocr_of_the_whole_file(sources):
+    sources["ocr"] = {1: "first", 2: "", 3: "third"}
+    doc = extract_pdf_text("doc.pdf")
+    assert sources["ocr_calls"] == [None]
+    assert doc.pages == ["first", "", "third"]
+    assert doc.extractors == ["ocr", "empty", "ocr"]
+
+
+def test_pages_that_stay_unusable_are_marked_empty(sources):
+    sources["pypdf"] = [GOOD, CID]
+    sources["poppler"] = [GOOD, CID]
+    doc = extract_pdf_text("doc.pdf")
+    assert doc.extractors == ["pypdf2", "empty"]
+    assert doc.pages == [GOOD, ""]
+    assert CID not in doc.text
+    assert sources["ocr_calls"] == [[2]]
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from routes import process_pending as pp  # noqa: E402
+
+logger = logging.getLogger("test-process-pending")
+
+
+def test_select_new_drops_library_and_in_batch_duplicates():
+    texts = ["unlocked gate", "gate left unlocked", "known issue", "no vector"]
+    vectors = [[1.0, 0.0], [0.99, 0.05], [0.0, 1.0], []]
+    matches = [[], [], [{"similarity": 0.95}], []]
+    assert pp._select_new(texts, vectors, matches, logger) == [{"text": "unlocked gate", "embedding": [1.0, 0.0]}]
+
+
+def test_run_batch_is_bounded_and_reports_failures(monkeypatch):
+    monkeypatch.setattr(pp, "CONCURRENCY", 2)
+    running = peak = 0
+
+    async def process(sub, logger):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if sub["id"] == 3:
+            raise RuntimeError("model crashed")
+        return {"submission_id": sub["id"], "status": "completed"}
+
+    monkeypatch.setattr(pp, "_process_submission", process)
+    released = []
+
+    async def arelease_claim(sid, attempts, worker_id=None, error=None):
+        released.append((sid, attempts, worker_id, error))
+        return True
+
+    monkeypatch.setattr(pp.supabase_client, "arelease_claim", arelease_claim)
+
+    async def collect():
+        return [r async for r in pp._run_batch([{"id": i, "attempts": 1} for i in range(5)], logger)]
+
+    results = asyncio.run(collect())
+    assert peak == 2
+    assert sorted(r["submission_id"] for r in results) == [0, 1, 2, 3, 4]
+    assert [r for r in results if r["status"] == "error"] == [
+        {"submission_id": 3, "status": "error", "error": "model crashed"}
+    ]
+    # The failed claim is handed back straight away instead of waiting out its lease
+    assert released == [(3, 1, pp.supabase_client.WORKER_ID, "model crashed")]
+
+
+def test_missing_file_is_an_error_not_requeued(monkeypatch):
+    marked = []
+
+    async def amark_status(sid, status, worker_id=None, error=None):
+        marked.append((sid, status, worker_id, error))
+
+    monkeypatch.setattr(pp.supabase_client, "amark_status", amark_status)
+    result = asyncio.run(pp._process_submission({"id": "s1", "file_hash": None}, logger))
+    assert result == {"submission_id": "s1", "status": "error", "error": "file not found"}
+    assert marked == [("s1", "error", pp.supabase_client.WORKER_ID, "file not found")]
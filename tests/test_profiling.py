@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+
+import pytest
+
+from utils import profiling, tracing
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_cpu_profile_samples_worker_threads(tmp_path):
+    worker = threading.Thread(target=_busy, args=(0.1,), name="chunk-worker")
+    with profiling.profile("cpu", "doc 1/a.pdf", out_dir=str(tmp_path), sample_interval=0.002) as prof:
+        worker.start()
+        worker.join()
+
+    pstats, collapsed = prof.outputs
+    assert pstats.endswith(".pstats") and collapsed.endswith(".collapsed")
+    assert prof.prefix.startswith(str(tmp_path / "doc_1_a.pdf-"))
+    stacks = open(collapsed, encoding="utf-8").read().splitlines()
+    assert any(line.startswith("chunk-worker;") and "_busy" in line for line in stacks)
+
+
+def test_memory_profile_reports_allocations_per_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    with profiling.profile("memory", "doc", out_dir=str(tmp_path)) as prof:
+        with tracing.span("merge"):
+            held = [bytes(1024) for _ in range(200)]
+    report = open(prof.outputs[0], encoding="utf-8").read()
+    assert "Top 25 allocation sites" in report
+    assert "Stage merge:" in report
+    assert "test_profiling.py" in report
+    del held
+
+
+def test_one_profile_at_a_time(tmp_path):
+    with profiling.profile("memory", "first", out_dir=str(tmp_path)):
+        with pytest.raises(profiling.ProfileBusy):
+            with profiling.profile("memory", "second", out_dir=str(tmp_path)):
+                pass
+    with pytest.raises(ValueError):
+        profiling.Profile("gpu", "x")
+
+
+def test_header_only_counts_when_enabled(monkeypatch):
+    assert profiling.requested_mode("cpu") is None
+    monkeypatch.setattr(profiling, "HEADER_ENABLED", True)
+    assert profiling.requested_mode(" Memory ") == "memory"
+    assert profiling.requested_mode("gpu") is None
+
+
+def test_wsgi_request_names_its_profile(monkeypatch):
+    monkeypatch.setattr(profiling, "HEADER_ENABLED", True)
+    headers = {}
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    traced = profiling.wsgi_middleware(app)
+    body = traced({"REQUEST_METHOD": "GET", "PATH_INFO": "/x", "HTTP_X_DEBUG_PROFILE": "cpu"},
+                  lambda status, h, exc_info=None: headers.update(h))
+    assert body == [b"ok"]
+    assert os.path.basename(headers["X-Profile-Output"]).startswith("GET-_x-")
@@ -0,0 +1,62 @@
+import json
+
+import httpx
+import pytest
+
+from utils import metrics, ollama_client
+from utils.ollama_client import generate_structured, prompt_eval_per_call
+from utils.vofc_schema import VOFC_ITEMS
+
+ITEMS = '[{"vulnerability": "Unlocked gate"}]'
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Requests made to Ollama as (path, json body); answers like a chat or generate endpoint would."""
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append((request.url.path, body))
+        timings = {"prompt_eval_duration": 2e8, "prompt_eval_count": 40}
+        if request.url.path == "/api/chat":
+            return httpx.Response(200, json={"message": {"role": "assistant", "content": ITEMS}, **timings})
+        return httpx.Response(200, json={"response": ITEMS, **timings})
+
+    transport = httpx.MockTransport(handle)
+    monkeypatch.setattr(ollama_client, "client", lambda base: httpx.Client(transport=transport))
+    return requests
+
+
+def test_instructions_go_in_an_identical_system_message(sent, monkeypatch):
+    monkeypatch.setattr(ollama_client, "USE_CHAT", True)
+    for chunk in ("chunk one", "chunk two"):
+        assert generate_structured(chunk, VOFC_ITEMS, model="m", base_url="http://chat.test", system="RULES")[0][
+            "vulnerability"
+        ] == "Unlocked gate"
+
+    assert [path for path, _ in sent] == ["/api/chat", "/api/chat"]
+    first, second = (body["messages"] for _, body in sent)
+    assert first[0] == second[0] == {"role": "system", "content": "RULES"}
+    assert [first[1]["content"], second[1]["content"]] == ["chunk one", "chunk two"]
+    assert "prompt" not in sent[0][1]
+
+
+def test_chat_can_be_turned_off(sent, monkeypatch):
+    monkeypatch.setattr(ollama_client, "USE_CHAT", False)
+    generate_structured("chunk", VOFC_ITEMS, model="m", base_url="http://flat.test", system="RULES")
+    path, body = sent[0]
+    assert path == "/api/generate"
+    assert body["prompt"] == "RULES\n\nchunk"
+    assert "messages" not in body
+
+
+def test_prompt_eval_is_recorded_per_api(sent, monkeypatch):
+    monkeypatch.setattr(ollama_client, "USE_CHAT", True)
+    calls = metrics.get("ollama_prompt_eval_calls_total", schema=VOFC_ITEMS.name, api="chat")
+    tokens = metrics.get("ollama_prompt_eval_tokens_total", schema=VOFC_ITEMS.name, api="chat")
+    generate_structured("chunk", VOFC_ITEMS, model="m", base_url="http://eval.test", system="RULES")
+
+    assert metrics.get("ollama_prompt_eval_calls_total", schema=VOFC_ITEMS.name, api="chat") == calls + 1
+    assert metrics.get("ollama_prompt_eval_tokens_total", schema=VOFC_ITEMS.name, api="chat") == tokens + 40
+    assert prompt_eval_per_call(VOFC_ITEMS.name) == pytest.approx(0.2)
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import files_upload
+from utils import resumable_upload
+from utils.file_handler import StreamingUpload
+from utils.resumable_upload import ResumableUpload, UploadError
+
+DATA = bytes(range(256)) * 40
+
+
+def _put(upload: ResumableUpload, offset: int, data: bytes) -> dict:
+    writer = upload.part_writer(offset)
+    writer.write(data)
+    return upload.commit_part(writer, offset)
+
+
+def _incoming(tmp_path) -> list:
+    return sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith("."))
+
+
+def test_parts_out_of_order_assemble_into_the_file(tmp_path):
+    upload = ResumableUpload.create(str(tmp_path), "../report.pdf", len(DATA), hashlib.sha256(DATA).hexdigest().upper())
+    _put(upload, 6000, DATA[6000:])
+    status = _put(upload, 0, DATA[:3000])
+    assert status["received"] == [[0, 3000], [6000, len(DATA)]]
+    assert status["missing"] == [[3000, 6000]]
+    assert status["received_bytes"] == len(DATA) - 3000
+
+    with pytest.raises(UploadError) as info:
+        upload.complete()
+    assert info.value.status == 409
+
+    _put(upload, 3000, DATA[3000:6000])
+    name, sha, size = upload.complete()
+    assert (sha, size) == (hashlib.sha256(DATA).hexdigest(), len(DATA))
+    assert name == f"{sha[:12]}_report.pdf"
+    assert _incoming(tmp_path) == [name]
+    assert (tmp_path / name).read_bytes() == DATA
+    assert not os.path.exists(upload.dir)
+
+
+def test_overlapping_and_resent_parts(tmp_path):
+    upload = ResumableUpload.create(str(tmp_path), "a.bin", len(DATA))
+    _put(upload, 0, b"\0" * 5000)
+    # Re-sending at the same offset replaces the part
+    _put(upload, 0, DATA[:5000])
+    _put(upload, 4000, DATA[4000:])
+    name, _, _ = upload.complete()
+    assert (tmp_path / name).read_bytes() == DATA
+
+
+def test_upload_can_be_reopened_by_id(tmp_path):
+    upload = ResumableUpload.create(str(tmp_path), "a.bin", len(DATA))
+    _put(upload, 0, DATA[:100])
+    again = ResumableUpload(str(tmp_path), upload.upload_id)
+    assert again.status()["received"] == [[0, 100]]
+
+
+def test_hash_mismatch_discards_the_upload(tmp_path):
+    upload = ResumableUpload.create(str(tmp_path), "a.bin", len(DATA), sha256="0" * 64)
+    _put(upload, 0, DATA)
+    with pytest.raises(UploadError) as info:
+        upload.complete()
+    assert info.value.status == 422
+    assert _incoming(tmp_path) == []
+    assert not os.path.exists(upload.dir)
+
+
+def test_hash_given_at_completion_overrides_the_declared_one(tmp_path):
+    upload = ResumableUpload.create(str(tmp_path), "a.bin", len(DATA), sha256="0" * 64)
+    _put(upload, 0, DATA)
+    _, sha, _ = upload.complete(hashlib.sha256(DATA).hexdigest())
+    assert sha == hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.mark.parametrize("upload_id", ["", "../../etc", "nothere"])
+def test_unknown_upload_is_404(tmp_path, upload_id):
+    with pytest.raises(UploadError) as info:
+        ResumableUpload(str(tmp_path), upload_id)
+    assert info.value.status == 404
+
+
+def test_bad_sizes_and_offsets(tmp_path, monkeypatch):
+    with pytest.raises(UploadError) as info:
+        ResumableUpload.create(str(tmp_path), "a.bin", 0)
+    assert info.value.status == 400
+
+    monkeypatch.setattr(resumable_upload, "MAX_UPLOAD_BYTES", 10)
+    with pytest.raises(UploadError) as info:
+        ResumableUpload.create(str(tmp_path), "a.bin", 11)
+    assert info.value.status == 413
+
+    upload = ResumableUpload.create(str(tmp_path), "a.bin", 10)
+    for offset in (-1, 10):
+        with pytest.raises(UploadError) as info:
+            upload.part_writer(offset)
+        assert info.value.status == 416
+
+
+def test_expire_removes_stale_uploads(tmp_path):
+    stale = ResumableUpload.create(str(tmp_path), "a.bin", 10)
+    fresh = ResumableUpload.create(str(tmp_path), "b.bin", 10)
+    old = os.path.getmtime(stale.dir) - resumable_upload.UPLOAD_TTL_SECONDS - 60
+    os.utime(stale.dir, (old, old))
+    assert ResumableUpload.expire(str(tmp_path)) == 1
+    assert not os.path.exists(stale.dir) and os.path.exists(fresh.dir)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    for var in ("INCOMING_DIR", "PROCESSED_DIR", "ERROR_DIR"):
+        monkeypatch.setenv(var, str(tmp_path / var.lower()))
+    monkeypatch.setattr(files_upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(files_upload, "API_KEY", "secret")
+    app = FastAPI()
+    app.include_router(files_upload.router)
+    return TestClient(app, headers={"Authorization": "Bearer secret"})
+
+
+def test_resume_protocol_over_http(client, tmp_path):
+    sha = hashlib.sha256(DATA).hexdigest()
+    upload_id = client.post("/files/uploads", json={"filename": "plan.pdf", "size": len(DATA), "sha256": sha}).json()["upload_id"]
+
+    assert client.put(f"/files/uploads/{upload_id}", params={"offset": 4000}, content=DATA[4000:]).status_code == 200
+    # The connection dropped before the first part arrived: ask what is missing and send only that
+    status = client.get(f"/files/uploads/{upload_id}").json()
+    assert status["missing"] == [[0, 4000]]
+    [[start, end]] = status["missing"]
+    client.put(f"/files/uploads/{upload_id}", params={"offset": start}, content=DATA[start:end])
+
+    resp = client.post(f"/files/uploads/{upload_id}/complete", json={})
+    assert resp.status_code == 200
+    assert resp.json()["file_hash"] == sha
+    assert (tmp_path / resp.json()["ollama_file_id"]).read_bytes() == DATA
+
+
+def test_http_errors(client):
+    upload_id = client.post("/files/uploads", json={"filename": "a.bin", "size": 10}).json()["upload_id"]
+    assert client.put(f"/files/uploads/{upload_id}", params={"offset": 5}, content=b"0123456789").status_code == 413
+    assert client.put(f"/files/uploads/{upload_id}", params={"offset": 0}, content=b"").status_code == 400
+    assert client.post(f"/files/uploads/{upload_id}/complete").status_code == 409
+    assert client.get("/files/uploads/0123abcd").status_code == 404
+
+
+def _ticks_during(coro) -> tuple:
+    """Run `coro` next to a 5 ms ticker; returns (its result, ticks counted while it ran)."""
+    async def run():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        try:
+            return await coro, ticks
+        finally:
+            done.set()
+            await task
+
+    return asyncio.run(run())
+
+
+def _slow(monkeypatch, cls, name, seconds=0.1):
+    original = getattr(cls, name)
+
+    def slow(*args, **kwargs):
+        time.sleep(seconds)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(cls, name, slow)
+
+
+def test_complete_does_not_block_the_event_loop(client, tmp_path, monkeypatch):
+    upload = ResumableUpload.create(str(tmp_path), "plan.pdf", len(DATA))
+    _put(upload, 0, DATA)
+    _slow(monkeypatch, ResumableUpload, "complete")
+    result, ticks = _ticks_during(files_upload.complete_upload(upload.upload_id, None, authorization="Bearer secret"))
+    assert result["file_hash"] == hashlib.sha256(DATA).hexdigest()
+    assert ticks >= 5
+
+
+def test_part_writes_do_not_block_the_event_loop(client, tmp_path, monkeypatch):
+    upload = ResumableUpload.create(str(tmp_path), "plan.pdf", len(DATA))
+
+    class Body:
+        async def stream(self):
+            yield DATA[:5000]
+            yield DATA[5000:]
+
+    _slow(monkeypatch, StreamingUpload, "write", seconds=0.05)
+    status, ticks = _ticks_during(files_upload.upload_part(upload.upload_id, 0, Body(), authorization="Bearer secret"))
+    assert status["missing"] == []
+    assert ticks >= 5
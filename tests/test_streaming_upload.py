@@ -0,0 +1,77 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import files_upload
+from utils import file_handler
+from utils.file_handler import StreamingUpload, UploadTooLarge
+
+DATA = os.urandom(3000)
+
+
+def _files(folder) -> list:
+    return sorted(os.listdir(folder))
+
+
+def test_streams_to_a_hidden_temp_file_then_renames(tmp_path):
+    with StreamingUpload(str(tmp_path)) as upload:
+        for i in range(0, len(DATA), 1000):
+            upload.write(DATA[i:i + 1000])
+        [temp] = _files(tmp_path)
+        assert temp.startswith(".") and temp.endswith(".part")
+        final = upload.commit("../report.pdf")
+
+    assert final == str(tmp_path / "report.pdf")
+    assert _files(tmp_path) == ["report.pdf"]
+    assert (tmp_path / "report.pdf").read_bytes() == DATA
+    assert (upload.sha256, upload.size) == (hashlib.sha256(DATA).hexdigest(), len(DATA))
+
+
+def test_size_limit_is_enforced_while_streaming(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        with StreamingUpload(str(tmp_path), max_bytes=1500) as upload:
+            upload.write(DATA[:1000])
+            upload.write(DATA[1000:2000])
+    assert _files(tmp_path) == []
+
+
+def test_uncommitted_upload_leaves_nothing_behind(tmp_path):
+    with StreamingUpload(str(tmp_path)) as upload:
+        upload.write(DATA)
+    assert _files(tmp_path) == []
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    for var in ("INCOMING_DIR", "PROCESSED_DIR", "ERROR_DIR"):
+        monkeypatch.setenv(var, str(tmp_path / var.lower()))
+    monkeypatch.setattr(files_upload, "UPLOAD_DIR", str(tmp_path / "incoming_dir"))
+    monkeypatch.setattr(files_upload, "API_KEY", "secret")
+    app = FastAPI()
+    app.include_router(files_upload.router)
+    return TestClient(app, headers={"Authorization": "Bearer secret"})
+
+
+def test_upload_endpoint_hashes_while_streaming(client, tmp_path):
+    resp = client.post("/files/upload", files={"file": ("../../site plan.pdf", DATA, "application/pdf")})
+    assert resp.status_code == 200
+    body = resp.json()
+    digest = hashlib.sha256(DATA).hexdigest()
+    assert (body["file_hash"], body["size_bytes"]) == (digest, len(DATA))
+    assert body["ollama_file_id"] == f"{digest[:12]}_site plan.pdf"
+    assert _files(tmp_path / "incoming_dir") == [body["ollama_file_id"]]
+
+
+def test_upload_endpoint_rejects_oversized_files(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(file_handler, "MAX_UPLOAD_BYTES", 1000)
+    resp = client.post("/files/upload", files={"file": ("big.pdf", DATA, "application/pdf")})
+    assert resp.status_code == 413
+    assert _files(tmp_path / "incoming_dir") == []
+
+
+def test_upload_endpoint_requires_the_api_key(client):
+    resp = client.post("/files/upload", files={"file": ("a.pdf", DATA)}, headers={"Authorization": "Bearer wrong"})
+    assert resp.status_code == 401
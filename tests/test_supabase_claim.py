@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+pytest.importorskip("supabase")
+
+from benchmarks.supabase_stub import SupabaseStub  # noqa: E402
+from utils import supabase_client as sc  # noqa: E402
+
+
+@pytest.fixture
+def rest(monkeypatch):
+    """PostgREST stand-in with five submitted rows; yields its /rest/v1 base URL."""
+    stub = SupabaseStub().start()
+    monkeypatch.setenv("SUPABASE_URL", stub.url)
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    base = f"{stub.url}/rest/v1"
+    httpx.post(f"{base}/submissions", json=[{"id": f"s{i}", "status": "submitted"} for i in range(5)]).raise_for_status()
+    yield base
+    stub.stop()
+
+
+def _row(base: str, sid: str) -> dict:
+    return httpx.get(f"{base}/submissions", params={"id": f"eq.{sid}"}).json()[0]
+
+
+def test_concurrent_workers_never_claim_the_same_row(rest):
+    async def claim():
+        return await asyncio.gather(*(sc.apull_pending(limit=5, worker_id=f"w{i}") for i in range(3)))
+
+    claims = asyncio.run(claim())
+    ids = [row["id"] for rows in claims for row in rows]
+    assert sorted(ids) == [f"s{i}" for i in range(5)]
+    for worker, rows in enumerate(claims):
+        for row in rows:
+            stored = _row(rest, row["id"])
+            assert (stored["status"], stored["claimed_by"], stored["attempts"]) == ("processing", f"w{worker}", 1)
+            assert row["attempts"] == 1
+
+
+def test_only_the_claimant_renews_or_finishes(rest):
+    async def run():
+        [row] = await sc.apull_pending(limit=1, worker_id="w1")
+        renewed = await sc.arenew_lease(row["id"], worker_id="w1")
+        stolen = await sc.arenew_lease(row["id"], worker_id="w2")
+        await sc.amark_status(row["id"], "done", worker_id="w2")
+        return row["id"], renewed, stolen
+
+    sid, renewed, stolen = asyncio.run(run())
+    assert renewed and not stolen
+    assert _row(rest, sid)["status"] == "processing"
+
+    asyncio.run(sc.amark_status(sid, "error", worker_id="w1", error="x" * 600))
+    row = _row(rest, sid)
+    assert (row["status"], row["claimed_by"], row["lease_expires_at"]) == ("error", None, None)
+    assert len(row["error"]) == 500
+
+
+def test_reaper_requeues_expired_claims_then_gives_up(rest):
+    async def claim_and_abandon():
+        # A negative lease has expired by the next poll, like a worker that died
+        return await sc.apull_pending(limit=1, worker_id="w1", lease_seconds=-1)
+
+    for attempt in range(1, sc.MAX_ATTEMPTS + 1):
+        [row] = asyncio.run(claim_and_abandon())
+        assert (row["id"], row["attempts"]) == ("s0", attempt)
+        assert _row(rest, "s0")["status"] == "processing"
+
+    requeued = asyncio.run(sc.areap_expired_leases())
+    assert requeued == []
+    row = _row(rest, "s0")
+    assert (row["status"], row["claimed_by"]) == ("error", None)
+    assert row["error"] == f"gave up after {sc.MAX_ATTEMPTS} attempts"
+
+    [row] = asyncio.run(claim_and_abandon())
+    assert row["id"] == "s1"
+
+
+def test_live_leases_are_not_reaped(rest):
+    asyncio.run(sc.apull_pending(limit=1, worker_id="w1"))
+    assert asyncio.run(sc.areap_expired_leases()) == []
+    assert _row(rest, "s0")["claimed_by"] == "w1"
+
+
+def test_a_failed_claim_is_released_at_once(rest):
+    async def claim_and_fail(worker="w1"):
+        [row] = await sc.apull_pending(limit=1, worker_id=worker)
+        released = await sc.arelease_claim(row["id"], row["attempts"], worker_id=worker, error="model crashed")
+        return row, released
+
+    for attempt in range(1, sc.MAX_ATTEMPTS):
+        row, released = asyncio.run(claim_and_fail())
+        assert released and (row["id"], row["attempts"]) == ("s0", attempt)
+        stored = _row(rest, "s0")
+        assert (stored["status"], stored["claimed_by"], stored["lease_expires_at"]) == ("submitted", None, None)
+        assert stored["error"] == "model crashed"
+
+    asyncio.run(claim_and_fail())
+    stored = _row(rest, "s0")
+    assert (stored["status"], stored["claimed_by"]) == ("error", None)
+    assert stored["error"] == f"gave up after {sc.MAX_ATTEMPTS} attempts: model crashed"
+
+
+def test_only_the_claimant_releases(rest):
+    [row] = asyncio.run(sc.apull_pending(limit=1, worker_id="w1"))
+    assert not asyncio.run(sc.arelease_claim(row["id"], row["attempts"], worker_id="w2", error="x"))
+    assert _row(rest, row["id"])["claimed_by"] == "w1"
@@ -0,0 +1,78 @@
+import httpx
+import pytest
+
+from benchmarks.supabase_stub import SupabaseStub
+
+
+@pytest.fixture
+def rest():
+    stub = SupabaseStub(seed=1).start()
+    yield stub, httpx.Client(base_url=f"{stub.url}/rest/v1")
+    stub.stop()
+
+
+def test_filters_order_and_exact_count(rest):
+    _, http = rest
+    rows = [{"id": f"s{i}", "status": "submitted" if i % 2 else "processing", "attempts": i, "error": None}
+            for i in range(6)]
+    assert http.post("/submissions", json=rows).status_code == 201
+
+    resp = http.get("/submissions", params={"select": "id,attempts", "status": "eq.submitted", "order": "attempts.desc"})
+    assert resp.json() == [{"id": "s5", "attempts": 5}, {"id": "s3", "attempts": 3}, {"id": "s1", "attempts": 1}]
+
+    assert [r["id"] for r in http.get("/submissions", params={"attempts": "gte.4"}).json()] == ["s4", "s5"]
+    assert [r["id"] for r in http.get("/submissions", params={"id": "in.(s0,s2)"}).json()] == ["s0", "s2"]
+    assert len(http.get("/submissions", params={"error": "is.null"}).json()) == 6
+    assert len(http.get("/submissions", params={"status": "not.eq.submitted"}).json()) == 3
+
+    counted = http.get("/submissions", params={"select": "id"}, headers={"Prefer": "count=exact", "Range": "0-0"})
+    assert counted.headers["content-range"] == "0-0/6"
+
+
+def test_conditional_patch_only_touches_matching_rows(rest):
+    _, http = rest
+    http.post("/submissions", json=[{"id": "s0", "status": "submitted"}, {"id": "s1", "status": "processing"}])
+    claim = {"status": "processing", "claimed_by": "w1"}
+    headers = {"Prefer": "return=representation"}
+    won = http.patch("/submissions", params={"status": "eq.submitted"}, json=claim, headers=headers).json()
+    assert [r["id"] for r in won] == ["s0"]
+    assert http.patch("/submissions", params={"status": "eq.submitted"}, json=claim, headers=headers).json() == []
+
+
+def test_upserts_and_duplicates(rest):
+    _, http = rest
+    http.post("/docs", json={"id": "d1", "title": "old", "pages": 3})
+    assert http.post("/docs", json={"id": "d1", "title": "dup"}).status_code == 409
+    merged = http.post("/docs", json={"id": "d1", "title": "new"},
+                       headers={"Prefer": "resolution=merge-duplicates,return=representation"}).json()
+    assert merged == [{"id": "d1", "title": "new", "pages": 3}]
+    ignored = http.post("/docs", json={"id": "d1", "title": "ignored"},
+                        headers={"Prefer": "resolution=ignore-duplicates,return=representation"}).json()
+    assert ignored == []
+    created = http.post("/docs", json={"title": "no id"}, headers={"Prefer": "return=representation"}).json()
+    assert created[0]["id"]
+
+
+def test_match_vulnerabilities_ranks_by_cosine(rest):
+    _, http = rest
+    http.post("/vulnerability_library", json=[
+        {"vulnerability": "same", "embedding": [1.0, 0.0]},
+        {"vulnerability": "close", "embedding": [0.9, 0.1]},
+        {"vulnerability": "far", "embedding": "[0.0, 1.0]"},
+    ])
+    matches = http.post("/rpc/match_vulnerabilities",
+                        json={"query_embedding": [1.0, 0.0], "match_threshold": 0.5, "match_count": 5}).json()
+    assert [m["vulnerability"] for m in matches] == ["same", "close"]
+    assert matches[0]["similarity"] == pytest.approx(1.0)
+    assert http.post("/rpc/unknown", json={}).status_code == 404
+
+
+def test_injected_errors_leave_the_data_alone():
+    stub = SupabaseStub(error_rate=1.0, error_status=503).start()
+    try:
+        resp = httpx.post(f"{stub.url}/rest/v1/submissions", json={"id": "s0"})
+        assert (resp.status_code, resp.json()["message"]) == (503, "injected failure")
+        assert stub.select("submissions", [])[1] == 0
+        assert stub.stats["errors_injected"] == 1
+    finally:
+        stub.stop()
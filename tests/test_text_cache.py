@@ -0,0 +1,97 @@
+import gzip
+
+import pytest
+
+from utils import metrics, pdf_text, text_cache
+from utils.text_cache import TextCache, cached_extraction, file_sha256
+
+
+@pytest.fixture
+def doc(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEXT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(text_cache, "ENABLED", True)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.7 fake")
+    return path
+
+
+def _counting(result):
+    runs = []
+
+    def extract():
+        runs.append(1)
+        return dict(result)
+
+    return extract, runs
+
+
+def test_second_extraction_is_served_from_the_cache(doc):
+    extract, runs = _counting({"text": "hello"})
+    hits = metrics.get("text_cache_hits_total", extractor="test")
+    assert cached_extraction(str(doc), "test", "1", extract) == {"text": "hello"}
+    assert cached_extraction(str(doc), "test", "1", extract) == {"text": "hello"}
+    assert len(runs) == 1
+    assert metrics.get("text_cache_hits_total", extractor="test") == hits + 1
+
+
+def test_key_is_content_extractor_and_version(doc, tmp_path):
+    extract, runs = _counting({"text": "hello"})
+    cached_extraction(str(doc), "test", "1", extract)
+    # Same bytes under another name: hit
+    copy = tmp_path / "renamed.pdf"
+    copy.write_bytes(doc.read_bytes())
+    cached_extraction(str(copy), "test", "1", extract)
+    assert len(runs) == 1
+    # New extractor version or another extractor: miss
+    cached_extraction(str(doc), "test", "2", extract)
+    cached_extraction(str(doc), "other", "1", extract)
+    assert len(runs) == 3
+    # Changed content: miss
+    doc.write_bytes(b"%PDF-1.7 edited")
+    cached_extraction(str(doc), "test", "1", extract)
+    assert len(runs) == 4
+
+
+def test_results_not_worth_keeping_are_not_cached(doc):
+    extract, runs = _counting({"text": ""})
+    for _ in range(2):
+        cached_extraction(str(doc), "test", "1", extract, keep=lambda e: bool(e["text"]))
+    assert len(runs) == 2
+
+
+def test_unreadable_entry_is_a_miss(doc):
+    cache = TextCache()
+    digest = file_sha256(str(doc))
+    cache.put(digest, "test", "1", {"text": "hello"})
+    with open(cache._path(digest, "test", "1"), "wb") as f:
+        f.write(b"not gzip")
+    assert cache.get(digest, "test", "1") is None
+    extract, runs = _counting({"text": "again"})
+    assert cached_extraction(str(doc), "test", "1", extract) == {"text": "again"}
+    with gzip.open(cache._path(digest, "test", "1"), "rt", encoding="utf-8") as f:
+        assert "again" in f.read()
+
+
+def test_disabled_cache_always_extracts(doc, monkeypatch):
+    monkeypatch.setattr(text_cache, "ENABLED", False)
+    extract, runs = _counting({"text": "hello"})
+    cached_extraction(str(doc), "test", "1", extract)
+    cached_extraction(str(doc), "test", "1", extract)
+    assert len(runs) == 2
+
+
+def test_pdf_pages_are_extracted_again_once_ocr_is_available(doc, monkeypatch):
+    runs = []
+
+    def extract(path, reader_factory=None):
+        runs.append(pdf_text.OCR_AVAILABLE)
+        return pdf_text.PdfText(["page one text"], ["pypdf2"])
+
+    monkeypatch.setattr(pdf_text, "_extract", extract)
+    monkeypatch.setattr(pdf_text, "OCR_AVAILABLE", False)
+    assert pdf_text.extract_pdf_text(str(doc)).pages == ["page one text"]
+    pdf_text.extract_pdf_text(str(doc))
+    monkeypatch.setattr(pdf_text, "OCR_AVAILABLE", True)
+    doc_text = pdf_text.extract_pdf_text(str(doc))
+    assert runs == [False, True]
+    assert doc_text.extractors == ["pypdf2"]
@@ -0,0 +1,140 @@
+import json
+import time
+
+import pytest
+
+from utils import tracing
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    monkeypatch.delenv(tracing.TRACEPARENT_ENV, raising=False)
+    return path
+
+
+def _spans(path) -> dict:
+    return {rec["name"]: rec for rec in map(json.loads, path.read_text().splitlines())}
+
+
+def _span(span_id, parent_id, start, end, **attrs) -> dict:
+    return {"span_id": span_id, "parent_id": parent_id, "name": span_id, "start": start,
+            "duration_ms": (end - start) * 1000, "attrs": attrs}
+
+
+def test_nested_spans_share_the_trace_and_inherit_the_submission(trace_file):
+    with tracing.span("request") as outer:
+        with tracing.span("submission", submission_id=42):
+            with tracing.span("ollama") as inner:
+                assert tracing.headers() == {"traceparent": inner.traceparent}
+    assert tracing.current_span() is None and tracing.headers() == {}
+
+    spans = _spans(trace_file)
+    assert {s["trace_id"] for s in spans.values()} == {outer.trace_id}
+    assert spans["request"]["parent_id"] is None
+    assert spans["submission"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["ollama"]["parent_id"] == spans["submission"]["span_id"]
+    assert spans["ollama"]["attrs"] == {"submission_id": 42}
+    assert "submission_id" not in spans["request"]["attrs"]
+
+
+def test_span_continues_a_remote_parent(trace_file, monkeypatch):
+    remote = f"00-{'a' * 32}-{'b' * 16}-01"
+    with tracing.span("handler", traceparent=remote):
+        pass
+    monkeypatch.setenv(tracing.TRACEPARENT_ENV, remote)
+    with tracing.span("child_process"):
+        pass
+    with tracing.span("malformed", traceparent="00-x-y-01"):
+        pass
+
+    spans = _spans(trace_file)
+    for name in ("handler", "child_process"):
+        assert (spans[name]["trace_id"], spans[name]["parent_id"]) == ("a" * 32, "b" * 16)
+    assert spans["malformed"]["parent_id"] == "b" * 16
+
+
+def test_error_is_recorded_and_raised(trace_file):
+    with pytest.raises(KeyError):
+        with tracing.span("fails"):
+            raise KeyError("missing")
+    assert _spans(trace_file)["fails"]["error"] == "KeyError: 'missing'"
+
+
+def test_deferred_span_is_written_by_end(trace_file):
+    with tracing.span("request") as s:
+        tracing.defer(s)
+    assert not trace_file.exists()
+    time.sleep(0.05)
+    tracing.end(s)
+    assert _spans(trace_file)["request"]["duration_ms"] >= 50
+
+
+def test_deferred_span_is_still_written_on_error(trace_file):
+    with pytest.raises(RuntimeError):
+        with tracing.span("request") as s:
+            tracing.defer(s)
+            raise RuntimeError("boom")
+    assert _spans(trace_file)["request"]["error"] == "RuntimeError: boom"
+
+
+def test_wsgi_span_covers_the_streamed_body(trace_file):
+    closed = []
+
+    class Body:
+        def __iter__(self):
+            for part in (b"a", b"b"):
+                time.sleep(0.03)
+                yield part
+
+        def close(self):
+            closed.append(True)
+
+    def app(environ, start_response):
+        start_response("200 OK", [])
+        return Body()
+
+    traced = tracing.wsgi_middleware(app)
+    body = traced({"REQUEST_METHOD": "GET", "PATH_INFO": "/stream"}, lambda status, headers: None)
+    assert not trace_file.exists()
+    assert b"".join(body) == b"ab"
+    assert closed == [True]
+    assert _spans(trace_file)["GET /stream"]["duration_ms"] >= 60
+
+
+def test_disabled_tracing_writes_nothing(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    with tracing.span("request") as s:
+        assert s is None
+    assert not trace_file.exists()
+
+
+def test_critical_path_follows_the_children_that_finished_last():
+    spans = [
+        _span("root", None, 0, 10),
+        _span("early", "root", 0, 4),   # overlaps `late`, so it did not hold the parent up
+        _span("first", "root", 1, 2),
+        _span("late", "root", 3, 9),
+        _span("inner", "late", 5, 9),
+        _span("other_root", "not-loaded", 20, 21),
+    ]
+    path = [(depth, s["name"]) for depth, s in tracing.critical_path(spans)]
+    assert path == [(0, "root"), (1, "first"), (1, "late"), (2, "inner"), (0, "other_root")]
+
+
+def test_load_spans_keeps_the_submission_and_its_ancestors(trace_file):
+    with tracing.span("batch"):
+        with tracing.span("submission", submission_id="s1"):
+            with tracing.span("ollama"):
+                pass
+        with tracing.span("submission", submission_id="s2"):
+            pass
+
+    names = sorted(s["name"] for s in tracing.load_spans("s1", str(trace_file)))
+    assert names == ["batch", "ollama", "submission"]
+    summary = tracing.summarize("s1", str(trace_file))
+    assert summary.startswith("Submission s1: 3 span(s)")
+    assert "Critical path:" in summary
+    assert tracing.summarize("missing", str(trace_file)).startswith("No spans found")
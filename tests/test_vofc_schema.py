@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from utils.vofc_schema import VOFC_DOCUMENT, VOFC_ITEMS, StructuredOutputError
+
+
+def test_valid_items_come_back_as_dicts_with_defaults():
+    raw = json.dumps([{"vulnerability": "Unlocked gate", "options_for_consideration": [{"option": "Add a lock"}]}])
+    items = VOFC_ITEMS.parse(raw)
+    assert items[0]["vulnerability"] == "Unlocked gate"
+    assert items[0]["sector"] == ""
+    assert items[0]["options_for_consideration"] == [{"option": "Add a lock", "description": ""}]
+
+
+def test_invalid_items_are_dropped_and_valid_ones_kept():
+    raw = json.dumps([{"vulnerability": "No CCTV"}, {"question": "missing the vulnerability"}, "junk"])
+    assert [i["vulnerability"] for i in VOFC_ITEMS.parse(raw)] == ["No CCTV"]
+
+
+def test_single_object_is_accepted_for_a_list_schema():
+    assert [i["vulnerability"] for i in VOFC_ITEMS.parse('{"vulnerability": "No CCTV"}')] == ["No CCTV"]
+
+
+@pytest.mark.parametrize("raw", ["not json", '[{"question": "q"}]', "[]x"])
+def test_unusable_output_raises(raw):
+    with pytest.raises(StructuredOutputError):
+        VOFC_ITEMS.parse(raw)
+
+
+def test_document_schema_does_not_salvage():
+    with pytest.raises(StructuredOutputError):
+        VOFC_DOCUMENT.parse('{"vulnerabilities": "not a list"}')
+
+
+def test_json_schema_is_self_contained():
+    schema = VOFC_ITEMS.json_schema()
+    assert schema["type"] == "array"
+    assert "$defs" not in json.dumps(schema) and "$ref" not in json.dumps(schema)
+    assert "vulnerability" in schema["items"]["required"]
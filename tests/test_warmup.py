@@ -0,0 +1,183 @@
+import itertools
+import json
+import time
+
+import httpx
+import pytest
+
+from utils import metrics, ollama_client, warmup
+from utils.ollama_pool import OllamaPool
+from utils.warmup import ModelKeeper
+
+_ids = itertools.count()
+
+
+class _Ollama:
+    """Records load/renew/unload calls the keeper makes instead of sending them."""
+
+    def __init__(self, monkeypatch):
+        self.loads, self.renewals, self.unloads = [], [], []
+        self.fail = set()
+        self.resident = set()
+        monkeypatch.setattr(warmup, "load_model", self.load_model)
+        monkeypatch.setattr(warmup, "renew_model", self.renew_model)
+        monkeypatch.setattr(warmup, "unload_model", self.unload_model)
+
+    def load_model(self, model, base_url, keep_alive, embed=False):
+        if base_url in self.fail:
+            raise ConnectionError(base_url)
+        self.loads.append((model, base_url, keep_alive, embed))
+        self.resident.add((model, base_url))
+        return 0.5
+
+    def renew_model(self, model, base_url, keep_alive, embed=False):
+        if (model, base_url) not in self.resident:
+            return False
+        self.renewals.append((model, base_url, keep_alive, embed))
+        return True
+
+    def unload_model(self, model, base_url=None):
+        self.unloads.append(model)
+        self.resident = {(m, url) for m, url in self.resident if m != model}
+        return 1
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    return _Ollama(monkeypatch)
+
+
+def _keeper(state: dict, hosts: int = 1, **kwargs) -> ModelKeeper:
+    run = next(_ids)
+    keeper = ModelKeeper(
+        models=[("gen", False), ("embed", True)],
+        base_url=f"http://keeper-{run}.test:11434",
+        busy=lambda: state["busy"],
+        idle=lambda: state["idle"],
+        keep_alive="15m",
+        **kwargs,
+    )
+    keeper.pool = OllamaPool([f"http://keeper-{run}-{i}.test:11434" for i in range(hosts)])
+    return keeper
+
+
+def test_warmup_loads_every_model_on_every_host(ollama):
+    keeper = _keeper({"busy": False, "idle": True}, hosts=2)
+    ollama.fail.add(keeper.pool.urls[1])
+
+    assert keeper.warmup() == {"gen": 0.5, "embed": 0.5}
+    assert ollama.loads == [
+        ("gen", keeper.pool.urls[0], "15m", False),
+        ("embed", keeper.pool.urls[0], "15m", True),
+    ]
+    assert keeper.resident
+    assert keeper.status()["warmup_seconds"] == {"gen": 0.5, "embed": 0.5}
+
+
+def test_failed_warmup_everywhere_is_not_resident(ollama):
+    keeper = _keeper({"busy": False, "idle": True})
+    ollama.fail.update(keeper.pool.urls)
+    keeper.warmup()
+    assert not keeper.resident
+
+
+def test_busy_tick_renews_only_where_the_model_is_loaded(ollama):
+    state = {"busy": True, "idle": False}
+    keeper = _keeper(state, hosts=2)
+    keeper.warmup()
+    ollama.loads.clear()
+    # The second host dropped the generation model since the warmup
+    ollama.resident.discard(("gen", keeper.pool.urls[1]))
+
+    keeper.tick()
+    keeper.tick()
+    assert ollama.loads == []
+    assert [(m, url) for m, url, *_ in ollama.renewals] == [
+        ("gen", keeper.pool.urls[0]),
+        ("embed", keeper.pool.urls[0]),
+        ("embed", keeper.pool.urls[1]),
+    ] * 2
+    assert {keep_alive for _, _, keep_alive, _ in ollama.renewals} == {"15m"}
+    assert ollama.unloads == []
+
+
+def test_release_after_idle_period(ollama):
+    state = {"busy": False, "idle": True}
+    keeper = _keeper(state, idle_release=0.05)
+    keeper.warmup()
+
+    keeper.tick()
+    assert ollama.unloads == []
+    time.sleep(0.06)
+    keeper.tick()
+    assert ollama.unloads == ["gen", "embed"]
+    assert not keeper.resident
+
+    # Released models are not released again, and new work loads them back
+    keeper.tick()
+    assert ollama.unloads == ["gen", "embed"]
+    state.update(busy=True, idle=False)
+    keeper.tick()
+    assert keeper.resident
+    assert [m for m, *_ in ollama.loads] == ["gen", "embed"] * 2
+
+
+def test_work_in_between_restarts_the_idle_period(ollama):
+    state = {"busy": False, "idle": True}
+    keeper = _keeper(state, idle_release=0.05)
+    keeper.warmup()
+    keeper.tick()
+    time.sleep(0.06)
+    # Neither busy nor idle (e.g. a batch that manages residency itself)
+    state["idle"] = False
+    keeper.tick()
+    state["idle"] = True
+    keeper.tick()
+    assert ollama.unloads == []
+
+
+def test_pool_idle_seconds():
+    pool = OllamaPool([f"http://idle-{next(_ids)}.test:11434"])
+    assert pool.idle_seconds() == float("inf")
+    seen = []
+    pool.endpoints[0].models_checked = time.monotonic()
+    pool.call(None, lambda url: seen.append(pool.idle_seconds()))
+    assert seen == [0.0]
+    assert 0.0 <= pool.idle_seconds() < 1.0
+
+
+def _ollama_host(monkeypatch, loaded):
+    """A real ollama_client talking to a fake host whose /api/ps lists `loaded`."""
+    posts = []
+
+    def handle(request):
+        if request.url.path == "/api/ps":
+            return httpx.Response(200, json={"models": [{"name": m} for m in loaded]})
+        posts.append((request.url.path, json.loads(request.content)))
+        loaded.add(json.loads(request.content)["model"])
+        return httpx.Response(200, json={})
+
+    transport = httpx.MockTransport(handle)
+    monkeypatch.setattr(ollama_client, "client", lambda url: httpx.Client(transport=transport))
+    return posts
+
+
+def test_load_counts_a_cold_load_only_when_the_model_was_absent(monkeypatch):
+    base = f"http://load-{next(_ids)}.test:11434"
+    model = f"cold-{next(_ids)}"
+    _ollama_host(monkeypatch, set())
+
+    ollama_client.load_model(model, base, "15m")
+    assert metrics.get("ollama_model_loads_total", model=model) == 1
+    # Already loaded: a slow answer is not a cold load
+    ollama_client.load_model(f"{model}:latest", base, "15m")
+    assert metrics.get("ollama_model_loads_total", model=f"{model}:latest") == 0
+
+
+def test_renew_sends_keep_alive_only_to_a_host_with_the_model(monkeypatch):
+    base = f"http://renew-{next(_ids)}.test:11434"
+    posts = _ollama_host(monkeypatch, {"gen:latest"})
+
+    assert ollama_client.renew_model("gen", base, "15m")
+    assert not ollama_client.renew_model("other", base, "15m")
+    assert posts == [("/api/generate", {"model": "gen", "keep_alive": "15m"})]
@@ -0,0 +1,172 @@
+"""
+Per-chunk retry for the LLM extraction loops.
+
+A chunk that times out, comes back as unusable JSON or hits a 5xx is retried
+with exponential backoff. A chunk that overflows the model's context is split
+in half and each half retried on its own. Whatever still fails is persisted by
+document id, so `reprocess_failed` can rerun only those chunks later instead
+of the whole document.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from . import metrics
+from .ollama_client import ContextOverflowError
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv("CHUNK_MAX_ATTEMPTS", "3"))
+BASE_DELAY = float(os.getenv("CHUNK_RETRY_BASE_DELAY", "2.0"))
+MAX_DELAY = float(os.getenv("CHUNK_RETRY_MAX_DELAY", "30.0"))
+MIN_SPLIT_CHARS = int(os.getenv("CHUNK_MIN_SPLIT_CHARS", "800"))
+
+RETRYABLE = {"timeout", "bad_json", "server_error", "connection"}
+
+
+def classify_error(exc: BaseException) -> str:
+    if isinstance(exc, ContextOverflowError):
+        return "context_overflow"
+    # StructuredOutputError, or json.JSONDecodeError from resp.json() on a body that is not JSON
+    if isinstance(exc, ValueError):
+        return "bad_json"
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.HTTPStatusError):
+        body = exc.response.text.lower()
+        if "context" in body and ("length" in body or "exceed" in body):
+            return "context_overflow"
+        return "server_error" if exc.response.status_code >= 500 else "client_error"
+    if isinstance(exc, httpx.TransportError):
+        return "connection"
+    return "error"
+
+
+def chunk_id(label: str, text: str) -> str:
+    return f"{label}-{hashlib.sha1(text.encode('utf-8', 'ignore')).hexdigest()[:10]}"
+
+
+def split_chunk(text: str) -> List[str]:
+    """Halve a chunk, preferring a line break (then a space) near the middle."""
+    mid = len(text) // 2
+    cut = text.rfind("\n", 0, mid)
+    if cut < len(text) // 4:
+        cut = text.rfind(" ", 0, mid)
+    if cut <= 0:
+        cut = mid
+    return [text[:cut], text[cut:]]
+
+
+def run_with_retry(chunk: str, call: Callable[[str], Any], label: str = "chunk") -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    Run `call(chunk)` with backoff. Returns (results, failures): one result per
+    piece that succeeded (several if the chunk had to be re-split) and one
+    failure record per piece that gave up.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return [call(chunk)], []
+        except Exception as e:  # noqa: BLE001
+            reason = classify_error(e)
+            metrics.inc("chunk_errors_total", reason=reason)
+
+            if reason == "context_overflow" and len(chunk) >= 2 * MIN_SPLIT_CHARS:
+                logger.warning(f"{label}: context overflow at {len(chunk)} chars; re-splitting")
+                metrics.inc("chunk_resplits_total")
+                results, failures = [], []
+                for i, piece in enumerate(split_chunk(chunk), 1):
+                    r, f = run_with_retry(piece, call, f"{label}.{i}")
+                    results.extend(r)
+                    failures.extend(f)
+                return results, failures
+
+            if reason not in RETRYABLE or attempt == MAX_ATTEMPTS:
+                logger.error(f"{label}: giving up after {attempt} attempt(s) ({reason}: {e})")
+                metrics.inc("chunk_failures_total", reason=reason)
+                return [], [{
+                    "chunk_id": chunk_id(label, chunk),
+                    "reason": reason,
+                    "attempts": attempt,
+                    "error": str(e)[:500],
+                    "text": chunk,
+                }]
+
+            delay = min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.warning(f"{label}: {reason} on attempt {attempt}/{MAX_ATTEMPTS}; retrying in {delay:.1f}s")
+            metrics.inc("chunk_retries_total", reason=reason)
+            time.sleep(delay)
+    return [], []
+
+
+class FailedChunkStore:
+    """One JSON file per document holding its failed chunks (and optionally the chunk results that succeeded)."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("FAILED_CHUNKS_DIR", os.path.join(os.getcwd(), "data", "failed_chunks"))
+
+    def _path(self, doc_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", doc_id)
+        return os.path.join(self.root, f"{safe}.json")
+
+    def load(self, doc_id: str) -> Dict[str, Any]:
+        path = self._path(doc_id)
+        if not os.path.exists(path):
+            return {"doc_id": doc_id, "failed": [], "results": []}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, doc_id: str, failed: List[Dict[str, Any]], results: Optional[List[Any]] = None) -> None:
+        """Persist the failure list; an empty list clears the record."""
+        path = self._path(doc_id)
+        if not failed:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(self.root, exist_ok=True)
+        state = {
+            "doc_id": doc_id,
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+            "failed": failed,
+            "results": results or [],
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def failed_ids(self, doc_id: str) -> List[str]:
+        return [f["chunk_id"] for f in self.load(doc_id)["failed"]]
+
+
+def reprocess_failed(
+    doc_id: str,
+    call: Callable[[str], Any],
+    store: Optional[FailedChunkStore] = None,
+) -> Tuple[List[Any], List[Any], List[Dict[str, Any]]]:
+    """
+    Rerun only the chunks recorded as failed for `doc_id`.
+    Returns (recovered results, previously stored results, chunks still failing)
+    and updates the store so recovered chunks are not run again.
+    """
+    store = store or FailedChunkStore()
+    state = store.load(doc_id)
+    recovered: List[Any] = []
+    still_failed: List[Dict[str, Any]] = []
+    for failed in state["failed"]:
+        label = failed["chunk_id"].rsplit("-", 1)[0]
+        results, failures = run_with_retry(failed["text"], call, label)
+        recovered.extend(results)
+        still_failed.extend(failures)
+    logger.info(f"{doc_id}: reran {len(state['failed'])} failed chunk(s); {len(still_failed)} still failing")
+    store.save(doc_id, still_failed, state.get("results", []) + recovered)
+    return recovered, state.get("results", []), still_failed
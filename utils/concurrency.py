@@ -0,0 +1,170 @@
+"""
+AIMD concurrency limiter for Ollama calls.
+
+Ollama queues requests it cannot run (OLLAMA_NUM_PARALLEL / OLLAMA_MAX_QUEUE),
+so the useful signal is queueing delay: wall-clock latency minus the
+`total_duration` the server reports for the request itself. While that stays
+small the limit grows additively; when requests start queueing, time out or
+hit 5xx/429 it is cut multiplicatively. Callers block in `slot()` until a
+permit is free (coroutines wait in `aslot()` without blocking the event
+loop), and the limit, in-flight count and queue depth are published as
+gauges.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+import httpx
+
+from . import metrics
+
+
+MIN_LIMIT = int(os.getenv("OLLAMA_MIN_INFLIGHT", "1"))
+MAX_LIMIT = int(os.getenv("OLLAMA_MAX_INFLIGHT", "4"))
+TIMEOUT_FLOOR = float(os.getenv("OLLAMA_TIMEOUT_FLOOR", "60"))
+# How often a coroutine waiting in aslot() checks for a free permit
+ASYNC_POLL_SECONDS = 0.05
+
+
+def _is_overload(exc: BaseException) -> bool:
+    if isinstance(exc, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return False
+
+
+class Slot:
+    """Handed out by AIMDLimiter.slot(); set `server_seconds` from the response timings."""
+
+    def __init__(self):
+        self.server_seconds: Optional[float] = None
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial: int = MIN_LIMIT,
+        min_limit: int = MIN_LIMIT,
+        max_limit: int = MAX_LIMIT,
+        backoff: float = 0.5,
+        queue_tolerance: float = 0.25,
+        min_queue_seconds: float = 1.0,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        # Queueing is tolerated up to this fraction of the server-side time
+        self.queue_tolerance = queue_tolerance
+        self.min_queue_seconds = min_queue_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("ollama_concurrency_limit", int(self.limit), target=self.name)
+        metrics.set_gauge("ollama_inflight_requests", self.in_flight, target=self.name)
+        metrics.set_gauge("ollama_queue_depth", self.waiting, target=self.name)
+
+    def timeout(self, ceiling: float) -> float:
+        """Request timeout scaled to observed latency, never above the caller's ceiling."""
+        if self.latency_ewma is None:
+            return ceiling
+        return min(ceiling, max(TIMEOUT_FLOOR, 4 * self.latency_ewma))
+
+    def _admit(self) -> None:
+        # Called with self._cond held
+        self.waiting -= 1
+        self.in_flight += 1
+        self._publish()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            self.waiting += 1
+            self._publish()
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self._admit()
+        with self._held() as slot:
+            yield slot
+
+    @asynccontextmanager
+    async def aslot(self):
+        """`slot` for coroutines: shares the permits, but waits with asyncio.sleep instead of blocking."""
+        with self._cond:
+            self.waiting += 1
+            self._publish()
+        try:
+            while True:
+                with self._cond:
+                    if self.in_flight < int(self.limit):
+                        self._admit()
+                        break
+                await asyncio.sleep(ASYNC_POLL_SECONDS)
+        except BaseException:
+            # Cancelled while waiting: never admitted, so only the queue depth changes
+            with self._cond:
+                self.waiting -= 1
+                self._publish()
+            raise
+        with self._held() as slot:
+            yield slot
+
+    @contextmanager
+    def _held(self):
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except BaseException as e:
+            self._release(time.monotonic() - start, None, overloaded=_is_overload(e))
+            raise
+        self._release(time.monotonic() - start, slot.server_seconds, overloaded=False)
+
+    def _release(self, latency: float, server_seconds: Optional[float], overloaded: bool) -> None:
+        with self._cond:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if not overloaded:
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                if server_seconds is not None:
+                    queued = max(0.0, latency - server_seconds)
+                    overloaded = queued > max(self.min_queue_seconds, self.queue_tolerance * server_seconds)
+
+            now = time.monotonic()
+            if overloaded:
+                # Requests already in flight share the same congestion; cut at most once per round trip
+                if now - self._last_decrease >= (self.latency_ewma or 0.0):
+                    self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                    self._last_decrease = now
+                    metrics.inc("ollama_concurrency_decreases_total", target=self.name)
+            elif saturated:
+                # Additive increase of one permit per "window" of completions at the limit
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._publish()
+            self._cond.notify_all()
+
+
+_limiters: Dict[str, AIMDLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def limiter_for(target: str) -> AIMDLimiter:
+    """One shared limiter per Ollama base URL."""
+    target = target.rstrip("/")
+    with _registry_lock:
+        lim = _limiters.get(target)
+        if lim is None:
+            lim = _limiters[target] = AIMDLimiter(target)
+        return lim
@@ -0,0 +1,195 @@
+"""
+One handle per source document.
+
+`Document` opens a PDF at most once and lazily derives everything the
+pipelines ask of it: per-page text (utils.pdf_text), PDF metadata and the
+citation fields found on the first pages. Each is computed on first access
+and memoized. Text and metadata also go through the file-hash cache, so a
+document seen before is not parsed at all.
+"""
+
+import logging
+import os
+import re
+from functools import cached_property
+from typing import Any, Dict, List, Optional
+
+from .pdf_text import PdfText, extract_pdf_text
+from .text_cache import cached_extraction, file_sha256
+
+
+logger = logging.getLogger(__name__)
+
+METADATA_VERSION = "1"
+
+_METADATA_FIELDS = {
+    "title": "/Title",
+    "author": "/Author",
+    "subject": "/Subject",
+    "creation_date": "/CreationDate",
+    "modification_date": "/ModDate",
+    "producer": "/Producer",
+    "creator": "/Creator",
+}
+
+
+def open_pdf_reader(path: str):
+    """PdfReader from PyPDF2, else pypdf; None if neither is installed or the file will not parse."""
+    for module in ("PyPDF2", "pypdf"):
+        try:
+            reader_cls = __import__(module).PdfReader
+        except ImportError:
+            continue
+        try:
+            return reader_cls(path)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"{module} could not open {os.path.basename(path)}: {e}")
+    return None
+
+
+def read_metadata(reader) -> Dict[str, Optional[str]]:
+    metadata: Dict[str, Optional[str]] = {key: None for key in _METADATA_FIELDS}
+    try:
+        info = reader.metadata if reader is not None else None
+    except Exception:  # noqa: BLE001
+        info = None
+    if info:
+        for key, pdf_key in _METADATA_FIELDS.items():
+            metadata[key] = str(info.get(pdf_key, "") or "").strip() or None
+    return metadata
+
+
+# ---- Citation fields (title page and first few pages) ------------------------
+_TITLE_RE = re.compile(r'(?:^|\n)\s*([A-Z][A-Za-z\s:\-]{10,200}?)(?:\n|$)', re.MULTILINE)
+_AUTHOR_RES = [
+    re.compile(r'(?:Author|Authors|By|Prepared\s+by|Written\s+by)[:\s]+([^\n]{5,200})', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^([A-Z][a-z]+\s+[A-Z][a-z]+(?:\s+and\s+[A-Z][a-z]+\s+[A-Z][a-z]+)*)', re.IGNORECASE | re.MULTILINE),
+]
+_ORG_RES = [
+    re.compile(r'(?:Department|Agency|Organization|Institution|Office)[:\s]+([A-Z][A-Za-z\s&\-]{5,100})', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'\b(CISA|DHS|FBI|NSA|NIST|CISA|DOD|DOE|HHS|DOT)\b', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'([A-Z][A-Za-z\s]+(?:Department|Agency|Administration|Service|Bureau))', re.IGNORECASE | re.MULTILINE),
+]
+_DATE_RES = [
+    re.compile(r'(?:Date|Published|Issued|Released)[:\s]+([A-Za-z]+\s+\d{1,2},?\s+\d{4})', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'\b([A-Za-z]+\s+\d{1,2},?\s+\d{4})\b', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE | re.MULTILINE),
+]
+_DOC_NUM_RES = [
+    re.compile(r'(?:Document|Report|Publication|Number|ID)[#:\s]+([A-Z0-9\-]{3,50})', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'\b([A-Z]{2,10}[-/]\d{2,6}[-/]\d{2,6})\b', re.IGNORECASE | re.MULTILINE),  # e.g. CISA-2024-001
+]
+_URL_RE = re.compile(r'https?://[^\s\)]+')
+
+
+def extract_citation(title_page: str, head: str) -> Dict[str, Any]:
+    """
+    Citation fields from the title page text; the URL is taken from `head`
+    (the opening pages). Patterns are compiled once at import.
+    """
+    citation_info: Dict[str, Any] = {
+        "title": None,
+        "authors": [],
+        "organization": None,
+        "publication_date": None,
+        "document_number": None,
+        "pages": None,
+        "url": None,
+        "source_text": ""
+    }
+
+    # Title: first significant line that looks like one
+    potential_titles = [t.strip() for t in _TITLE_RE.findall(title_page) if 10 < len(t.strip()) < 200]
+    if potential_titles:
+        citation_info["title"] = potential_titles[0]
+
+    for pattern in _AUTHOR_RES:
+        authors = [m.strip() for m in pattern.findall(title_page) if 5 < len(m.strip()) < 200]
+        if authors:
+            citation_info["authors"] = authors[:3]  # Max 3 authors
+            break
+
+    for pattern in _ORG_RES:
+        orgs = [m.strip() for m in pattern.findall(title_page) if len(m.strip()) > 5]
+        if orgs:
+            citation_info["organization"] = orgs[0]
+            break
+
+    for pattern in _DATE_RES:
+        match = pattern.search(title_page)
+        if match:
+            citation_info["publication_date"] = match.group(1).strip()
+            break
+
+    for pattern in _DOC_NUM_RES:
+        match = pattern.search(title_page)
+        if match:
+            citation_info["document_number"] = match.group(1).strip()
+            break
+
+    url = _URL_RE.search(head)
+    if url:
+        citation_info["url"] = url.group(0)
+
+    source_parts = []
+    if citation_info["title"]:
+        source_parts.append(citation_info["title"])
+    if citation_info["authors"]:
+        source_parts.append(", ".join(citation_info["authors"]))
+    if citation_info["organization"]:
+        source_parts.append(citation_info["organization"])
+    if citation_info["publication_date"]:
+        source_parts.append(f"({citation_info['publication_date']})")
+    if citation_info["document_number"]:
+        source_parts.append(f"[{citation_info['document_number']}]")
+    citation_info["source_text"] = ". ".join(source_parts) if source_parts else ""
+    return citation_info
+
+
+class Document:
+    """A PDF opened at most once, with memoized text, metadata and citation fields."""
+
+    def __init__(self, path: str, sha256: Optional[str] = None):
+        self.path = str(path)
+        if sha256:
+            self.__dict__["sha256"] = sha256
+
+    @cached_property
+    def sha256(self) -> str:
+        return file_sha256(self.path)
+
+    @cached_property
+    def reader(self):
+        """The single PdfReader for this file (only created on a cache miss)."""
+        return open_pdf_reader(self.path)
+
+    @cached_property
+    def pdf_text(self) -> PdfText:
+        return extract_pdf_text(self.path, reader_factory=lambda: self.reader, sha256=self.sha256)
+
+    @property
+    def pages(self) -> List[str]:
+        return self.pdf_text.pages
+
+    @property
+    def text(self) -> str:
+        return self.pdf_text.text
+
+    @cached_property
+    def metadata(self) -> Dict[str, Optional[str]]:
+        return cached_extraction(
+            self.path, "pdf_metadata", METADATA_VERSION,
+            lambda: read_metadata(self.reader),
+            keep=lambda meta: any(meta.values()),
+            sha256=self.sha256,
+        )
+
+    def first_pages(self, n: int) -> str:
+        return "\n".join(self.pages[:n])
+
+    def citation(self, first_n_pages: int = 3) -> Dict[str, Any]:
+        key = f"_citation_{first_n_pages}"
+        if key not in self.__dict__:
+            title_page = self.pages[0] if self.pages else ""
+            self.__dict__[key] = extract_citation(title_page, self.first_pages(first_n_pages)[:5000])
+        return self.__dict__[key]
@@ -1,5 +1,8 @@
-import os, requests
-from . import logger
+import asyncio
+import os
+from . import logger, metrics
+from .http_client import async_client, client
+from .ollama_pool import get_pool
 
 
 def embed_text(text: str) -> list[float]:
@@ -8,10 +11,15 @@ def embed_text(text: str) -> list[float]:
     if not text or len(text.strip()) < 5:
         return []
     payload = {"model": model, "input": text}
-    try:
-        resp = requests.post(f"{url}/api/embeddings", json=payload, timeout=30)
+
+    def _post(base: str) -> dict:
+        resp = client(base).post(f"{base}/api/embeddings", json=payload, timeout=30)
         resp.raise_for_status()
-        data = resp.json()
+        return resp.json()
+
+    try:
+        with metrics.timer("embedding_batch_seconds", source="api"):
+            data = get_pool(url).call(model, _post)
         emb = data.get("embedding")
         if not emb:
             raise ValueError("No embedding returned")
@@ -21,3 +29,62 @@ def embed_text(text: str) -> list[float]:
         return []
 
 
+async def aembed_text(text: str) -> list[float]:
+    """`embed_text` on the shared AsyncClient, for the FastAPI routes."""
+    url = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text:latest")
+    if not text or len(text.strip()) < 5:
+        return []
+    payload = {"model": model, "input": text}
+
+    async def _post(base: str) -> dict:
+        resp = await async_client().post(f"{base}/api/embeddings", json=payload, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    try:
+        data = await get_pool(url).acall(model, _post)
+        emb = data.get("embedding")
+        if not emb:
+            raise ValueError("No embedding returned")
+        return emb
+    except Exception as e:  # noqa: BLE001
+        logger.log(f"aembed_text failed: {e}")
+        return []
+
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    Embeddings for many texts in one `/api/embed` call (same order; [] for
+    texts too short to embed). Falls back to one `/api/embeddings` call per
+    text on servers without the batch endpoint.
+    """
+    url = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text:latest")
+    wanted = [i for i, t in enumerate(texts) if t and len(t.strip()) >= 5]
+    out: list[list[float]] = [[] for _ in texts]
+    if not wanted:
+        return out
+    payload = {"model": model, "input": [texts[i] for i in wanted]}
+
+    async def _post(base: str) -> dict:
+        resp = await async_client().post(f"{base}/api/embed", json=payload, timeout=120)
+        resp.raise_for_status()
+        return resp.json()
+
+    try:
+        with metrics.timer("embedding_batch_seconds", source="api"):
+            vectors = (await get_pool(url).acall(model, _post)).get("embeddings") or []
+        if len(vectors) != len(wanted):
+            raise ValueError(f"expected {len(wanted)} embeddings, got {len(vectors)}")
+    except Exception as e:  # noqa: BLE001
+        logger.log(f"aembed_texts batch failed, embedding one by one: {e}")
+        # Batches that fell back, and the texts they covered; embedding_batches_total counts working batches only
+        metrics.inc("embedding_batch_fallbacks_total", source="api")
+        metrics.inc("embedding_fallbacks_total", len(wanted), source="api")
+        vectors = await asyncio.gather(*(aembed_text(texts[i]) for i in wanted))
+    else:
+        metrics.inc("embedding_batches_total", source="api")
+    for i, vec in zip(wanted, vectors):
+        out[i] = vec
+    return out
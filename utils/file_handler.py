@@ -1,8 +1,71 @@
 import os
+import hashlib
+import tempfile
 from typing import List, Optional
 import glob
 
 
+# Uploads are streamed in chunks of this size; memory use does not depend on file size
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit / (1024 * 1024):g} MB limit")
+        self.limit = limit
+
+
+class StreamingUpload:
+    """
+    Writes an upload chunk by chunk to a hidden temp file next to its final
+    location, hashing as it goes, then renames it into place atomically.
+    Watchers never see a half-written file: the temp name ends in `.part`.
+    """
+
+    def __init__(self, dest_dir: str, max_bytes: Optional[int] = None):
+        self.dest_dir = dest_dir
+        self.max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+        os.makedirs(dest_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=dest_dir)
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def commit(self, name: str) -> str:
+        """Flush to disk and atomically move into `dest_dir/name`; returns the final path."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        final_path = os.path.join(self.dest_dir, os.path.basename(name))
+        os.replace(self.tmp_path, final_path)
+        return final_path
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self) -> "StreamingUpload":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None or not self._file.closed:
+            self.abort()
+
+
 def normalize_path(path: str | None) -> str | None:
     if path is None:
         return None
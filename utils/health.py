@@ -0,0 +1,186 @@
+"""
+Background health prober shared by the Flask and FastAPI apps.
+
+Probing Ollama and Supabase inline made every load-balancer poll wait on
+them, so a busy Ollama stalled the web workers. Instead a daemon thread
+refreshes one snapshot every HEALTH_PROBE_INTERVAL seconds:
+
+- ollama: per pool host, reachability and version (`/api/version`) and
+  the resident models from `/api/ps` (VRAM share, expiry);
+- supabase: reachability, plus queue depth, i.e. submissions in the
+  `submitted` and `processing` states (exact counts from PostgREST);
+- queue: documents waiting in INCOMING_DIR and unfinished resumable uploads.
+
+Each component records when it was last checked and last succeeded. The
+health and status routes only read the snapshot, so they answer in
+microseconds and never block on a downstream service.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+from .http_client import client
+from .ollama_pool import get_pool
+
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+QUEUE_SUFFIXES = (".pdf", ".docx", ".txt")
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+class HealthProber:
+    def __init__(
+        self,
+        ollama_url: Optional[str] = None,
+        supabase_url: Optional[str] = None,
+        supabase_key: Optional[str] = None,
+        incoming_dir: Optional[str] = None,
+        interval: float = PROBE_INTERVAL,
+    ):
+        self.ollama_url = ollama_url or os.getenv("OLLAMA_URL", "http://localhost:11434")
+        self.supabase_url = (supabase_url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        self.supabase_key = supabase_key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        self.incoming_dir = str(incoming_dir or os.getenv("INCOMING_DIR", os.path.join(os.getcwd(), "data", "incoming")))
+        self.interval = interval
+        self.probes: Dict[str, Callable[[], Dict[str, Any]]] = {
+            "ollama": self.probe_ollama,
+            "supabase": self.probe_supabase,
+            "queue": self.probe_queue,
+        }
+        self._last_success: Dict[str, float] = {}
+        # Replaced wholesale on each refresh; readers never see a half-built snapshot
+        self._snapshot: Dict[str, Any] = {name: {"status": "starting"} for name in self.probes}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- probes (run on the prober thread only) ----
+    def probe_ollama(self) -> Dict[str, Any]:
+        hosts: List[Dict[str, Any]] = []
+        for base in get_pool(self.ollama_url).urls:
+            host: Dict[str, Any] = {"url": base, "status": "down"}
+            try:
+                http = client(base)
+                host["version"] = http.get(f"{base}/api/version", timeout=PROBE_TIMEOUT).json().get("version")
+                ps = http.get(f"{base}/api/ps", timeout=PROBE_TIMEOUT).json().get("models", [])
+                host["models"] = [
+                    {
+                        "name": m.get("name") or m.get("model"),
+                        "vram_share": round(m["size_vram"] / m["size"], 3) if m.get("size") and "size_vram" in m else None,
+                        "expires_at": m.get("expires_at"),
+                    }
+                    for m in ps
+                ]
+                host["status"] = "ok"
+            except Exception as e:  # noqa: BLE001
+                host["error"] = str(e)
+            hosts.append(host)
+        up = [h for h in hosts if h["status"] == "ok"]
+        if not up:
+            raise RuntimeError("; ".join(f"{h['url']}: {h.get('error')}" for h in hosts))
+        return {"hosts": hosts, "degraded": len(up) < len(hosts)}
+
+    def _count(self, status: str) -> Optional[int]:
+        resp = client(self.supabase_url).get(
+            f"{self.supabase_url}/rest/v1/submissions",
+            params={"select": "id", "status": f"eq.{status}"},
+            headers={
+                "apikey": self.supabase_key,
+                "Authorization": f"Bearer {self.supabase_key}",
+                "Prefer": "count=exact",
+                "Range": "0-0",
+            },
+            timeout=PROBE_TIMEOUT,
+        )
+        resp.raise_for_status()
+        total = resp.headers.get("content-range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+
+    def probe_supabase(self) -> Dict[str, Any]:
+        if not self.supabase_url or not self.supabase_key:
+            return {"status": "not_configured"}
+        return {"submitted": self._count("submitted"), "processing": self._count("processing")}
+
+    def probe_queue(self) -> Dict[str, Any]:
+        try:
+            names = os.listdir(self.incoming_dir)
+        except FileNotFoundError:
+            names = []
+        uploads = os.path.join(self.incoming_dir, ".uploads")
+        return {
+            "incoming_files": sum(1 for n in names if n.lower().endswith(QUEUE_SUFFIXES) and not n.startswith(".")),
+            "uploads_in_progress": len(os.listdir(uploads)) if os.path.isdir(uploads) else 0,
+        }
+
+    # ---- refresh loop ----
+    def refresh(self) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = {}
+        for name, probe in self.probes.items():
+            start = time.monotonic()
+            try:
+                result = probe()
+                result.setdefault("status", "ok")
+            except Exception as e:  # noqa: BLE001
+                result = {"status": "down", "error": str(e)}
+            now = time.time()
+            if result["status"] == "ok":
+                self._last_success[name] = now
+            result["latency_ms"] = int((time.monotonic() - start) * 1000)
+            result["checked_at"] = _iso(now)
+            result["last_success_at"] = _iso(self._last_success.get(name))
+            metrics.set_gauge("health_component_up", result["status"] == "ok", component=name)
+            snapshot[name] = result
+        queue = snapshot.get("queue", {})
+        metrics.set_gauge("queue_incoming_files", queue.get("incoming_files") or 0)
+        metrics.set_gauge("queue_submitted", snapshot.get("supabase", {}).get("submitted") or 0)
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest probe results; never blocks."""
+        return self._snapshot
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Health probe failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> "HealthProber":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_prober: Optional[HealthProber] = None
+_prober_lock = threading.Lock()
+
+
+def start_health_prober(**kwargs) -> HealthProber:
+    """Start the process-wide prober once (later calls return the running one)."""
+    global _prober
+    with _prober_lock:
+        if _prober is None:
+            _prober = HealthProber(**kwargs).start()
+        return _prober
+
+
+def health_prober() -> Optional[HealthProber]:
+    return _prober
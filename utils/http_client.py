@@ -0,0 +1,149 @@
+"""
+Shared HTTP clients for outbound calls.
+
+Every Ollama, Supabase and internal API call goes through a pooled client
+from this registry instead of opening a connection per request, which
+matters when OLLAMA_URL is a remote https tunnel (TCP + TLS setup on every
+call otherwise). There is one `httpx.Client` per target origin
+(scheme://host:port), so each target gets its own connection limit, and one
+`httpx.AsyncClient` per event loop for the FastAPI routes. Timeouts default
+to HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT and can still be overridden per
+call. HTTP_HTTP2=1 enables HTTP/2 when the `h2` package is installed.
+
+Each request is timed to response headers (`http_request_seconds_total` /
+`http_requests_total` per target origin). HTTP_POOLING=0 turns keep-alive
+off, so every call opens a new connection as before; comparing the two gives
+the per-call overhead. Requests made inside a trace span carry it as a
+`traceparent` header (see utils.tracing).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics, tracing
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+# Connections kept open per target (sync clients)
+MAX_PER_TARGET = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_TARGET", "20"))
+POOLING = os.getenv("HTTP_POOLING", "1").lower() not in ("0", "false", "no", "off")
+HTTP2 = os.getenv("HTTP_HTTP2", "0").lower() in ("1", "true", "yes", "on")
+
+DEFAULT_TIMEOUT = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+if HTTP2 and not HTTP2_AVAILABLE:
+    logger.warning("HTTP_HTTP2=1 but the h2 package is not installed; using HTTP/1.1 (pip install 'httpx[http2]')")
+
+
+def _origin(url: Optional[str]) -> str:
+    if not url:
+        return "default"
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}" if parts.netloc else url.rstrip("/")
+
+
+def _limits(max_connections: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections if POOLING else 0)
+
+
+def _on_request(request: httpx.Request) -> None:
+    request.extensions["started"] = time.monotonic()
+    # Carry the current trace to whoever handles the call
+    request.headers.update(tracing.headers())
+
+
+def _on_response(response: httpx.Response) -> None:
+    started = response.request.extensions.get("started")
+    if started is not None:
+        target = _origin(str(response.request.url))
+        metrics.inc("http_requests_total", target=target)
+        metrics.inc("http_request_seconds_total", time.monotonic() - started, target=target)
+
+
+async def _aon_request(request: httpx.Request) -> None:
+    _on_request(request)
+
+
+async def _aon_response(response: httpx.Response) -> None:
+    _on_response(response)
+
+
+_clients: Dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def client(url: Optional[str] = None) -> httpx.Client:
+    """The pooled client for `url`'s origin (created on first use); safe to share across threads."""
+    target = _origin(url)
+    with _clients_lock:
+        c = _clients.get(target)
+        if c is None or c.is_closed:
+            c = _clients[target] = httpx.Client(
+                timeout=DEFAULT_TIMEOUT,
+                limits=_limits(MAX_PER_TARGET),
+                http2=HTTP2 and HTTP2_AVAILABLE,
+                event_hooks={"request": [_on_request], "response": [_on_response]},
+            )
+        return c
+
+
+def close_clients() -> None:
+    with _clients_lock:
+        for c in _clients.values():
+            c.close()
+        _clients.clear()
+
+
+# A client is bound to the loop it was created on, and several loops can be
+# alive at once (the app loop, asyncio.run in worker threads, test clients)
+_async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_async_lock = threading.Lock()
+
+
+def async_client() -> httpx.AsyncClient:
+    """The AsyncClient for the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    with _async_lock:
+        # Clients of loops that have closed can no longer be closed themselves;
+        # dropping them releases their connections with the loop
+        for old in [old for old in _async_clients if old.is_closed()]:
+            del _async_clients[old]
+        c = _async_clients.get(loop)
+        if c is None or c.is_closed:
+            c = _async_clients[loop] = httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                limits=_limits(MAX_CONNECTIONS),
+                http2=HTTP2 and HTTP2_AVAILABLE,
+                event_hooks={"request": [_aon_request], "response": [_aon_response]},
+            )
+        return c
+
+
+async def close_async_client() -> None:
+    """Close the running loop's client (call before the loop shuts down)."""
+    with _async_lock:
+        c = _async_clients.pop(asyncio.get_running_loop(), None)
+    if c is not None and not c.is_closed:
+        await c.aclose()
+
+
+def mean_latency(url: str) -> float:
+    """Mean seconds to response headers for calls to `url`'s origin, sync and async together."""
+    return metrics.ratio("http_request_seconds_total", "http_requests_total", target=_origin(url))
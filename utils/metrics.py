@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+# key -> [bucket upper bounds, per-bucket counts, sum, count]
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], list] = {}
+
+# Latency buckets in seconds, from a fast HTTP call up to a long document
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _key(name: str, labels: dict) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    """Increment a process-wide counter, optionally split by labels."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Record the current value of something that goes up and down (queue depth, limits)."""
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name: str, value: float, buckets: Sequence[float] = SECONDS_BUCKETS, **labels) -> None:
+    """Record one observation in a histogram (buckets are fixed by the first call per series)."""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [tuple(buckets), [0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(hist[0]):
+            if value <= bound:
+                hist[1][i] += 1
+                break
+        hist[2] += value
+        hist[3] += 1
+
+
+@contextmanager
+def timer(name: str, cpu: bool = False, **labels):
+    """Observe the wall time (or this thread's CPU time with `cpu`) of the block into histogram `name`."""
+    clock = time.thread_time if cpu else time.perf_counter
+    start = clock()
+    try:
+        yield
+    finally:
+        observe(name, clock() - start, **labels)
+
+
+def get(name: str, **labels) -> float:
+    key = _key(name, labels)
+    with _lock:
+        return _counters.get(key, _gauges.get(key, 0.0))
+
+
+def ratio(numerator: str, denominator: str, **labels) -> float:
+    den = get(denominator, **labels)
+    return get(numerator, **labels) / den if den else 0.0
+
+
+def snapshot() -> dict:
+    """Flat {"name{label=value}": value} view for logs and JSON endpoints."""
+    with _lock:
+        items = list(_counters.items()) + list(_gauges.items())
+    out = {}
+    for (name, labels), value in items:
+        label_str = ",".join(f"{k}={v}" for k, v in labels)
+        out[f"{name}{{{label_str}}}" if label_str else name] = value
+    return out
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escape = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus() -> str:
+    """All counters, gauges and histograms in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((k, [v[0], list(v[1]), v[2], v[3]]) for k, v in _histograms.items())
+
+    lines: List[str] = []
+    typed = set()
+
+    def _type(name: str, kind: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        _type(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {_num(value)}")
+    for (name, labels), value in gauges:
+        _type(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {_num(value)}")
+    for (name, labels), (bounds, counts, total, count) in histograms:
+        _type(name, "histogram")
+        running = 0
+        for bound, n in zip(bounds, counts):
+            running += n
+            lines.append(f"{name}_bucket{_labels(labels, (('le', f'{bound:g}'),))} {running}")
+        lines.append(f"{name}_bucket{_labels(labels, (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
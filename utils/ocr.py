@@ -0,0 +1,165 @@
+"""
+Parallel OCR for scanned PDFs.
+
+Pages are rasterized a few at a time (pdf2image `first_page`/`last_page`)
+inside worker processes, so at most `workers * OCR_PAGES_PER_TASK` page images
+exist at once instead of the whole document. Each page is OCR'd at OCR_DPI;
+pages whose words come out smaller than OCR_TARGET_PX (dense, small print) or
+with low confidence are re-rendered once at a higher DPI, capped at
+OCR_MAX_DPI. Page text is returned keyed by page number so callers can join it
+in order.
+"""
+
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import metrics
+
+# Optional OCR imports (safe even if missing)
+try:
+    import pytesseract
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    OCR_AVAILABLE = True
+except ImportError:
+    pytesseract = None
+    convert_from_path = None
+    pdfinfo_from_path = None
+    OCR_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "400"))
+# Median word height (pixels) Tesseract reads reliably; smaller text gets a re-render
+OCR_TARGET_PX = int(os.getenv("OCR_TARGET_PX", "24"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "60"))
+OCR_PAGES_PER_TASK = int(os.getenv("OCR_PAGES_PER_TASK", "4"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+
+
+def poppler_bin_dir(tool: str = "pdftoppm") -> Optional[str]:
+    """Directory holding Poppler's `tool`: POPPLER_PATH or a common Windows install, else PATH (None)."""
+    candidates = [
+        os.getenv("POPPLER_PATH", r"C:\tools\poppler\Library\bin"),
+        r"C:\poppler\bin",
+        r"C:\tools\poppler\bin",
+        os.path.join(os.path.expanduser("~"), "poppler", "bin"),
+    ]
+    for path in candidates:
+        if os.path.exists(os.path.join(path, f"{tool}.exe")) or os.path.exists(os.path.join(path, tool)):
+            return path
+    return None
+
+
+def page_count(pdf_path: str, poppler_path: Optional[str] = None) -> int:
+    return int(pdfinfo_from_path(pdf_path, poppler_path=poppler_path)["Pages"])
+
+
+def _read(image, lang: str) -> Tuple[str, float, float]:
+    """OCR one image; returns (text, median word height px, mean confidence)."""
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    heights, confs = [], []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+        heights.append(data["height"][i])
+        confs.append(conf)
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    if not heights:
+        return text, 0.0, 0.0
+    return text, float(statistics.median(heights)), sum(confs) / len(confs)
+
+
+def _ocr_range(pdf_path: str, first: int, last: int, poppler_path: Optional[str], lang: str) -> List[Tuple[int, str, int]]:
+    """Worker: rasterize and OCR pages first..last; returns (page, text, dpi used)."""
+    out = []
+    images = convert_from_path(
+        pdf_path, dpi=OCR_DPI, first_page=first, last_page=last, poppler_path=poppler_path, thread_count=1
+    )
+    for page_no, image in zip(range(first, last + 1), images):
+        text, height, conf = _read(image, lang)
+        dpi = OCR_DPI
+        if height and (height < OCR_TARGET_PX or conf < OCR_MIN_CONFIDENCE):
+            # Dense or small print: scale so the median word reaches the target height
+            dpi = min(OCR_MAX_DPI, int(OCR_DPI * max(OCR_TARGET_PX / height, 1.25)))
+            if dpi > OCR_DPI:
+                hi_res = convert_from_path(
+                    pdf_path, dpi=dpi, first_page=page_no, last_page=page_no, poppler_path=poppler_path, thread_count=1
+                )[0]
+                text, _, _ = _read(hi_res, lang)
+                hi_res.close()
+        image.close()
+        out.append((page_no, text, dpi))
+    return out
+
+
+def _worker_init() -> None:
+    # One Tesseract thread per process; parallelism comes from the pool
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ranges(pages: List[int], size: int) -> List[Tuple[int, int]]:
+    """Group sorted page numbers into consecutive runs of at most `size` pages."""
+    runs: List[Tuple[int, int]] = []
+    for p in pages:
+        if runs and p == runs[-1][1] + 1 and p - runs[-1][0] < size:
+            runs[-1] = (runs[-1][0], p)
+        else:
+            runs.append((p, p))
+    return runs
+
+
+def ocr_pdf(
+    pdf_path: str,
+    pages: Optional[Iterable[int]] = None,
+    workers: Optional[int] = None,
+    poppler_path: Optional[str] = None,
+    lang: str = "eng",
+) -> Dict[int, str]:
+    """
+    OCR `pages` (1-based; default all) of a PDF across a process pool.
+    Returns {page_number: text}. Raises RuntimeError if OCR libraries are missing.
+    """
+    if not OCR_AVAILABLE:
+        raise RuntimeError("OCR libraries not installed (pytesseract/pdf2image)")
+    poppler_path = poppler_path or poppler_bin_dir()
+    wanted = sorted(set(pages)) if pages is not None else list(range(1, page_count(pdf_path, poppler_path) + 1))
+    if not wanted:
+        return {}
+    tasks = _ranges(wanted, OCR_PAGES_PER_TASK)
+    workers = max(1, min(workers or OCR_WORKERS, len(tasks)))
+
+    start = time.monotonic()
+    results: Dict[int, str] = {}
+    rerendered = 0
+    if workers == 1:
+        outputs = (_ocr_range(pdf_path, a, b, poppler_path, lang) for a, b in tasks)
+        for chunk in outputs:
+            for page_no, text, dpi in chunk:
+                results[page_no] = text
+                rerendered += dpi > OCR_DPI
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+            futures = [pool.submit(_ocr_range, pdf_path, a, b, poppler_path, lang) for a, b in tasks]
+            for future in futures:
+                for page_no, text, dpi in future.result():
+                    results[page_no] = text
+                    rerendered += dpi > OCR_DPI
+
+    elapsed = time.monotonic() - start
+    metrics.inc("ocr_pages_total", len(results))
+    metrics.inc("ocr_seconds_total", elapsed)
+    metrics.inc("ocr_rerendered_pages_total", rerendered)
+    logger.info(
+        f"OCR of {len(results)} page(s) from {os.path.basename(pdf_path)} took {elapsed:.1f}s "
+        f"with {workers} worker(s) ({rerendered} re-rendered above {OCR_DPI} dpi)"
+    )
+    return results
@@ -1,53 +1,292 @@
 import os
+import time
 import httpx
 import json
+from . import metrics, tracing
+from .concurrency import limiter_for
+from .health import health_prober
+from .http_client import async_client, client
+from .ollama_pool import get_pool, same_model
+from .vofc_schema import Schema, StructuredOutputError
+
+# A load_duration above this means the model was not resident (cold load / swap)
+COLD_LOAD_SECONDS = float(os.getenv("OLLAMA_COLD_LOAD_SECONDS", "1.0"))
+# Send fixed instructions as a chat system message so the server can reuse the
+# evaluated prefix across chunks; 0 sends one flat /api/generate prompt instead
+USE_CHAT = os.getenv("OLLAMA_USE_CHAT", "1").lower() not in ("0", "false", "no", "off")
+
+
+class ContextOverflowError(StructuredOutputError):
+    """Generation hit the token limit, so the chunk has to be made smaller."""
 
 
 def _base_url() -> str:
     return os.getenv("OLLAMA_URL", "http://localhost:11434")
 
 
-def get_model_info() -> dict:
-    # Minimal placeholder; extend to query GPU metrics if available
-    return {"version": "1.0", "gpu_load": None}
+def get_model_info(model: str | None = None) -> dict:
+    """
+    Version and residency of `model` (default OLLAMA_MODEL) from the health
+    prober's last snapshot; no request is made. gpu_load is the share of the
+    model held in VRAM on the first host that has it loaded.
+    """
+    model = model or os.getenv("OLLAMA_MODEL", "vofc-engine")
+    prober = health_prober()
+    hosts = prober.snapshot().get("ollama", {}).get("hosts", []) if prober else []
+    version = next((h.get("version") for h in hosts if h.get("version")), None)
+    for host in hosts:
+        for m in host.get("models", []):
+            if m.get("name") and (m["name"] == model or m["name"] == f"{model}:latest"):
+                return {"version": version, "gpu_load": m.get("vram_share"), "host": host["url"], "expires_at": m.get("expires_at")}
+    return {"version": version, "gpu_load": None}
 
 
-def generate_from_document(source_path: str | None, options: dict) -> dict:
+# Request timeout ceilings; the sync and async variants share them and their payloads
+DOCUMENT_TIMEOUT = 60.0
+INFERENCE_TIMEOUT = 600.0
+
+
+def _document_payload(source_path: str | None, options: dict) -> dict:
     model = os.getenv("OLLAMA_MODEL", "vofc-engine")
     if not model:
         raise RuntimeError("OLLAMA_MODEL not configured")
-
-    payload = {
+    return {
         "model": model,
         "prompt": f"Process document: {source_path}",
         "options": options or {},
     }
+
+
+def _inference_payload(file_path: str) -> dict:
+    model = os.getenv("OLLAMA_MODEL", "vofc-engine")
+    prompt = f"Extract vulnerabilities and options for consideration from file: {file_path}"
+    return {"model": model, "prompt": prompt}
+
+
+def _response_text(lines) -> tuple[str, dict]:
+    """Concatenated `response` of streamed NDJSON lines, and the last (final) chunk."""
+    parts, last = [], {}
+    for line in lines:
+        if not line:
+            continue
+        try:
+            last = json.loads(line)
+        except json.JSONDecodeError:
+            # Non-JSON chunk; skip
+            continue
+        parts.append(last.get("response", ""))
+    return "".join(parts), last
+
+
+def generate_from_document(source_path: str | None, options: dict) -> dict:
+    payload = _document_payload(source_path, options)
     url = f"{_base_url()}/api/generate"
-    with httpx.Client(timeout=60.0) as client:
-        resp = client.post(url, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    resp = client(url).post(url, json=payload, timeout=DOCUMENT_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
 
 
 def run_inference(file_path: str) -> dict:
-    model = os.getenv("OLLAMA_MODEL", "vofc-engine")
+    payload = _inference_payload(file_path)
     url = f"{_base_url()}/api/generate"
-    prompt = f"Extract vulnerabilities and options for consideration from file: {file_path}"
-    payload = {"model": model, "prompt": prompt}
+    with client(url).stream("POST", url, json=payload, timeout=INFERENCE_TIMEOUT) as resp:
+        resp.raise_for_status()
+        result_text, _ = _response_text(resp.iter_lines())
+    return {"text": result_text, "confidence": 1.0}
+
+
+async def agenerate_from_document(source_path: str | None, options: dict) -> dict:
+    """
+    `generate_from_document` for the FastAPI routes: same request, routed
+    through the Ollama pool and the chosen host's AIMD limiter.
+    """
+    payload = _document_payload(source_path, options)
 
-    result_text = ""
-    with httpx.Client(timeout=600.0) as client:
-        with client.stream("POST", url, json=payload) as resp:
+    async def _post(base: str) -> dict:
+        async with limiter_for(base).aslot() as slot:
+            resp = await async_client().post(f"{base}/api/generate", json=payload, timeout=DOCUMENT_TIMEOUT)
             resp.raise_for_status()
-            for line in resp.iter_lines():
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                    result_text += obj.get("response", "")
-                except json.JSONDecodeError:
-                    # Non-JSON chunk; skip
-                    continue
-    return {"text": result_text, "confidence": 1.0}
+            data = resp.json()
+            slot.server_seconds = (data.get("total_duration") or 0) / 1e9 or None
+        return data
+
+    return await get_pool(_base_url()).acall(payload["model"], _post)
+
+
+async def arun_inference(file_path: str) -> dict:
+    """
+    `run_inference` for the FastAPI routes: routed like `agenerate_from_document`;
+    the streamed response is read without blocking.
+    """
+    payload = _inference_payload(file_path)
+
+    async def _stream(base: str) -> str:
+        async with limiter_for(base).aslot() as slot:
+            async with async_client().stream("POST", f"{base}/api/generate", json=payload, timeout=INFERENCE_TIMEOUT) as resp:
+                resp.raise_for_status()
+                text, last = _response_text([line async for line in resp.aiter_lines()])
+            slot.server_seconds = (last.get("total_duration") or 0) / 1e9 or None
+        return text
+
+    text = await get_pool(_base_url()).acall(payload["model"], _stream)
+    return {"text": text, "confidence": 1.0}
+
+
+def record_load(model: str, data: dict) -> float:
+    """Account the model load time Ollama reports; returns it in seconds."""
+    load_s = (data.get("load_duration") or 0) / 1e9
+    metrics.inc("ollama_model_load_seconds_total", load_s, model=model)
+    if load_s >= COLD_LOAD_SECONDS:
+        metrics.inc("ollama_model_loads_total", model=model)
+    return load_s
+
+
+def is_resident(model: str, base_url: str) -> bool | None:
+    """Whether /api/ps on `base_url` lists `model`; None if the host could not say."""
+    try:
+        ps = client(base_url).get(f"{base_url}/api/ps", timeout=5.0).json().get("models", [])
+    except (httpx.HTTPError, ValueError):
+        return None
+    return any(same_model(model, m.get("name") or m.get("model") or "") for m in ps)
+
+
+def _keep_alive_request(model: str, base_url: str, keep_alive: str | int, embed: bool) -> tuple:
+    """A request that only (re)loads `model` and sets its keep_alive."""
+    if embed:
+        return f"{base_url}/api/embed", {"model": model, "input": "", "keep_alive": keep_alive}
+    return f"{base_url}/api/generate", {"model": model, "keep_alive": keep_alive}
+
+
+def load_model(model: str, base_url: str, keep_alive: str | int, embed: bool = False) -> float:
+    """
+    Load `model` on one host without generating anything (empty prompt /
+    empty embedding input) and pin it for `keep_alive`. Returns wall seconds;
+    the call counts as a cold load only if /api/ps showed the model absent.
+    """
+    was_resident = is_resident(model, base_url)
+    url, payload = _keep_alive_request(model, base_url, keep_alive, embed)
+    start = time.monotonic()
+    client(url).post(url, json=payload, timeout=300.0).raise_for_status()
+    elapsed = time.monotonic() - start
+    metrics.inc("ollama_warmup_seconds_total", elapsed, model=model)
+    if was_resident is False:
+        metrics.inc("ollama_model_loads_total", model=model)
+    return elapsed
+
+
+def renew_model(model: str, base_url: str, keep_alive: str | int, embed: bool = False) -> bool:
+    """
+    Extend `keep_alive` for `model` on one host if /api/ps shows it loaded
+    there; never loads it. Returns whether it was renewed.
+    """
+    if not is_resident(model, base_url):
+        return False
+    url, payload = _keep_alive_request(model, base_url, keep_alive, embed)
+    client(url).post(url, json=payload, timeout=30.0).raise_for_status()
+    return True
+
+
+def unload_model(model: str, base_url: str | None = None) -> int:
+    """
+    Release `model` from VRAM on every pool host that has it resident
+    (keep_alive=0 with no prompt). Returns the number of hosts unloaded.
+    """
+    unloaded = 0
+    for base in get_pool(base_url or _base_url()).urls:
+        if not is_resident(model, base):
+            continue
+        try:
+            client(base).post(f"{base}/api/generate", json={"model": model, "keep_alive": 0}, timeout=30.0).raise_for_status()
+            unloaded += 1
+        except httpx.HTTPError:
+            continue
+    return unloaded
+
+
+def record_prompt_eval(schema: str, api: str, data: dict) -> float:
+    """Account prompt evaluation time and tokens per call; returns the seconds."""
+    seconds = (data.get("prompt_eval_duration") or 0) / 1e9
+    metrics.inc("ollama_prompt_eval_calls_total", schema=schema, api=api)
+    metrics.inc("ollama_prompt_eval_seconds_total", seconds, schema=schema, api=api)
+    metrics.inc("ollama_prompt_eval_tokens_total", data.get("prompt_eval_count") or 0, schema=schema, api=api)
+    return seconds
+
+
+def prompt_eval_per_call(schema: str, api: str | None = None) -> float:
+    """Mean prompt-eval seconds per call for `schema` (default: the API currently in use)."""
+    api = api or ("chat" if USE_CHAT else "generate")
+    return metrics.ratio("ollama_prompt_eval_seconds_total", "ollama_prompt_eval_calls_total", schema=schema, api=api)
+
+
+def generate_structured(
+    prompt: str,
+    schema: Schema,
+    model: str | None = None,
+    options: dict | None = None,
+    base_url: str | None = None,
+    timeout: float = 300.0,
+    keep_alive: str | int | None = None,
+    system: str | None = None,
+):
+    """
+    Calls Ollama with `schema` as its `format` (constrained decoding) and
+    returns the validated payload as plain dicts. With `system`, the fixed
+    instructions go to /api/chat as a system message ahead of `prompt`, so
+    the evaluated prefix is shared between calls; otherwise /api/generate.
+    The request is routed through the Ollama pool (OLLAMA_HOSTS, else
+    `base_url`) and the AIMD limiter of the chosen host; `timeout` caps the
+    latency-scaled timeout.
+    Raises StructuredOutputError when the output does not fit the schema,
+    ContextOverflowError when that is because generation was cut off.
+    """
+    model = model or os.getenv("OLLAMA_MODEL", "vofc-engine")
+    payload = {
+        "model": model,
+        "stream": False,
+        "format": schema.json_schema(),
+        "options": options or {},
+    }
+    if system and USE_CHAT:
+        api = "chat"
+        payload["messages"] = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ]
+    else:
+        api = "generate"
+        payload["prompt"] = f"{system}\n\n{prompt}" if system else prompt
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+
+    def _post(base: str) -> dict:
+        limiter = limiter_for(base)
+        with limiter.slot() as slot:
+            resp = client(base).post(f"{base}/api/{api}", json=payload, timeout=limiter.timeout(timeout))
+            resp.raise_for_status()
+            data = resp.json()
+            slot.server_seconds = (data.get("total_duration") or 0) / 1e9 or None
+        return data
 
+    start = time.perf_counter()
+    with tracing.span("ollama", schema=schema.name, api=api, model=model) as span:
+        data = get_pool(base_url or _base_url()).call(model, _post)
+        if span:
+            span.set(eval_count=data.get("eval_count"), prompt_eval_count=data.get("prompt_eval_count"))
+    metrics.observe("ollama_request_seconds", time.perf_counter() - start, schema=schema.name, api=api)
+    if data.get("eval_count") and data.get("eval_duration"):
+        metrics.observe(
+            "ollama_tokens_per_second", data["eval_count"] / (data["eval_duration"] / 1e9),
+            buckets=metrics.RATE_BUCKETS, schema=schema.name,
+        )
+    record_load(model, data)
+    record_prompt_eval(schema.name, api, data)
 
+    metrics.inc("ollama_structured_calls_total", schema=schema.name)
+    text = (data.get("message") or {}).get("content", "") if api == "chat" else data.get("response", "")
+    try:
+        return schema.parse(text)
+    except StructuredOutputError as e:
+        metrics.inc("ollama_parse_failures_total", schema=schema.name)
+        if data.get("done_reason") == "length":
+            raise ContextOverflowError(f"{schema.name}: output truncated at the token limit") from e
+        raise
@@ -0,0 +1,251 @@
+"""
+Pool of Ollama endpoints shared by the heuristic pipeline, the Flask app and
+the automation pipeline.
+
+OLLAMA_HOSTS (comma-separated base URLs) lists the inference boxes; when it is
+unset the pool holds just the caller's single OLLAMA_URL / OLLAMA_HOST, so
+behaviour is unchanged. Each request goes to the least-loaded healthy host,
+preferring hosts that already have the model resident (from `/api/ps`).
+Connection errors and 5xx responses mark a host down for a growing cooldown
+and the request fails over to the next host.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+import httpx
+
+from . import metrics
+from .concurrency import limiter_for
+from .http_client import client
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PS_TTL = float(os.getenv("OLLAMA_PS_TTL", "15"))
+BASE_COOLDOWN = float(os.getenv("OLLAMA_HOST_COOLDOWN", "5"))
+MAX_COOLDOWN = 120.0
+
+
+def _is_host_failure(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        # A prompt the model cannot fit fails the same way on every host
+        return exc.response.status_code >= 500 and "context" not in exc.response.text.lower()
+    return False
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.models: Set[str] = set()
+        self.models_checked = 0.0
+        self.last_used = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def load(self) -> float:
+        """Requests routed here (running or queued in its limiter) per permit."""
+        return self.in_flight / max(1.0, limiter_for(self.url).limit)
+
+    def mark_failure(self) -> None:
+        self.failures += 1
+        cooldown = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (self.failures - 1))
+        self.down_until = time.monotonic() + cooldown
+        self.models.clear()
+        metrics.set_gauge("ollama_endpoint_up", 0, host=self.url)
+        logger.warning(f"Ollama endpoint {self.url} marked down for {cooldown:.0f}s ({self.failures} consecutive failure(s))")
+
+    def mark_success(self, model: Optional[str]) -> None:
+        if self.failures:
+            logger.info(f"Ollama endpoint {self.url} recovered")
+        self.failures = 0
+        self.down_until = 0.0
+        if model:
+            self.models.add(model)
+        metrics.set_gauge("ollama_endpoint_up", 1, host=self.url)
+
+    def refresh_models(self) -> None:
+        """Refresh resident models from /api/ps at most every PS_TTL seconds."""
+        now = time.monotonic()
+        if now - self.models_checked < PS_TTL:
+            return
+        self.models_checked = now
+        try:
+            resp = client(self.url).get(f"{self.url}/api/ps", timeout=2.0)
+            resp.raise_for_status()
+            self.models = {m.get("name") or m.get("model") for m in resp.json().get("models", [])}
+        except httpx.TransportError:
+            self.mark_failure()
+        except Exception:  # noqa: BLE001
+            # Older servers without /api/ps: keep routing on load alone
+            pass
+
+
+def same_model(a: str, b: str) -> bool:
+    """`vofc-engine` and `vofc-engine:latest` name the same model."""
+    norm = lambda m: m if ":" in m else f"{m}:latest"  # noqa: E731
+    return norm(a) == norm(b)
+
+
+class OllamaPool:
+    def __init__(self, urls: Iterable[str]):
+        self.endpoints = [Endpoint(u.rstrip("/")) for u in urls]
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self) -> List[str]:
+        return [ep.url for ep in self.endpoints]
+
+    def capacity(self) -> int:
+        """Upper bound on useful concurrent requests across all hosts."""
+        return sum(limiter_for(ep.url).max_limit for ep in self.endpoints)
+
+    def _resident(self, ep: Endpoint, model: Optional[str]) -> bool:
+        return bool(model) and any(same_model(model, m) for m in ep.models if m)
+
+    def pick(self, model: Optional[str] = None, exclude: Set[str] = frozenset()) -> Optional[Endpoint]:
+        candidates = [ep for ep in self.endpoints if ep.url not in exclude]
+        if not candidates:
+            return None
+        healthy = [ep for ep in candidates if ep.healthy]
+        if not healthy:
+            # Everything is cooling down: try the host that comes back first
+            return min(candidates, key=lambda ep: ep.down_until)
+
+        resident = [ep for ep in healthy if self._resident(ep, model)]
+        best_resident = min(resident, key=Endpoint.load) if resident else None
+        best_any = min(healthy, key=Endpoint.load)
+        # Stay where the model is loaded unless those hosts are full and another one is idle
+        if best_resident and not (best_resident.load() >= 1.0 and best_any.load() == 0.0):
+            return best_resident
+        return best_any
+
+    def _refresh_models(self) -> None:
+        if len(self.endpoints) > 1:
+            for ep in self.endpoints:
+                if ep.healthy:
+                    ep.refresh_models()
+
+    def _checkout(self, model: Optional[str], tried: Set[str]) -> Optional[Endpoint]:
+        with self._lock:
+            ep = self.pick(model, exclude=tried)
+            if ep is None:
+                return None
+            tried.add(ep.url)
+            ep.in_flight += 1
+        metrics.set_gauge("ollama_endpoint_inflight", ep.in_flight, host=ep.url)
+        return ep
+
+    def _checkin(self, ep: Endpoint) -> None:
+        with self._lock:
+            ep.in_flight -= 1
+            ep.last_used = time.monotonic()
+        metrics.set_gauge("ollama_endpoint_inflight", ep.in_flight, host=ep.url)
+
+    def _failed(self, ep: Endpoint, exc: BaseException) -> bool:
+        """Record a host-level failure; False when `exc` should propagate instead."""
+        if not _is_host_failure(exc):
+            return False
+        ep.mark_failure()
+        metrics.inc("ollama_failovers_total", host=ep.url)
+        return True
+
+    def call(self, model: Optional[str], fn: Callable[[str], T]) -> T:
+        """Run `fn(base_url)` on the best host, failing over on host-level errors."""
+        tried: Set[str] = set()
+        last_exc: Optional[BaseException] = None
+        self._refresh_models()
+        while len(tried) < len(self.endpoints):
+            ep = self._checkout(model, tried)
+            if ep is None:
+                break
+            try:
+                result = fn(ep.url)
+            except Exception as e:  # noqa: BLE001
+                if not self._failed(ep, e):
+                    raise
+                last_exc = e
+                continue
+            else:
+                ep.mark_success(model)
+                return result
+            finally:
+                self._checkin(ep)
+        raise last_exc or RuntimeError("No Ollama endpoint available")
+
+    async def acall(self, model: Optional[str], fn: Callable[[str], Awaitable[T]]) -> T:
+        """`call` for coroutines: awaits `fn(base_url)` with the same routing and failover."""
+        tried: Set[str] = set()
+        last_exc: Optional[BaseException] = None
+        if len(self.endpoints) > 1:
+            await asyncio.to_thread(self._refresh_models)
+        while len(tried) < len(self.endpoints):
+            ep = self._checkout(model, tried)
+            if ep is None:
+                break
+            try:
+                result = await fn(ep.url)
+            except Exception as e:  # noqa: BLE001
+                if not self._failed(ep, e):
+                    raise
+                last_exc = e
+                continue
+            else:
+                ep.mark_success(model)
+                return result
+            finally:
+                self._checkin(ep)
+        raise last_exc or RuntimeError("No Ollama endpoint available")
+
+    def idle_seconds(self) -> float:
+        """0 while any request is in flight, else seconds since the last one finished."""
+        if any(ep.in_flight for ep in self.endpoints):
+            return 0.0
+        last = max((ep.last_used for ep in self.endpoints), default=0.0)
+        return time.monotonic() - last if last else float("inf")
+
+    def status(self) -> List[Dict[str, object]]:
+        return [
+            {
+                "url": ep.url,
+                "healthy": ep.healthy,
+                "in_flight": ep.in_flight,
+                "limit": int(limiter_for(ep.url).limit),
+                "models": sorted(m for m in ep.models if m),
+            }
+            for ep in self.endpoints
+        ]
+
+
+_pools: Dict[Tuple[str, ...], OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def configured_hosts(default_url: Optional[str] = None) -> List[str]:
+    hosts = [h.strip().rstrip("/") for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()]
+    if not hosts:
+        hosts = [(default_url or os.getenv("OLLAMA_URL") or "http://localhost:11434").rstrip("/")]
+    return hosts
+
+
+def get_pool(default_url: Optional[str] = None) -> OllamaPool:
+    """Shared pool for OLLAMA_HOSTS, or for `default_url` alone when that is unset."""
+    key = tuple(configured_hosts(default_url))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = OllamaPool(key)
+        return pool
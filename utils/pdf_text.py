@@ -0,0 +1,214 @@
+"""
+Page-level PDF text extraction.
+
+Every page is read with PyPDF2 first. Pages that come back empty or as
+garbage (`(cid:NN)` runs, mostly non-text glyphs) are taken from Poppler's
+pdftotext instead, and only the pages that are still unusable after that are
+OCR'd. A mixed PDF with a few scanned pages therefore OCRs just those pages.
+The result keeps the character offset of every page in the joined text, for
+citations, and which extractor produced it. Results are cached by file hash
+(see text_cache), so a file is parsed and OCR'd only once.
+"""
+
+import bisect
+import logging
+import os
+import re
+import subprocess
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .ocr import OCR_AVAILABLE, ocr_pdf, poppler_bin_dir
+from .text_cache import cached_extraction
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+logger = logging.getLogger(__name__)
+
+MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "20"))
+# Bump when page extraction changes; OCR availability changes the output too
+EXTRACTOR_VERSION = "2"
+PAGE_SEPARATOR = "\n"
+
+_CID_RE = re.compile(r"\(cid:\d+\)")
+_WORD_RE = re.compile(r"[A-Za-z]{2,}")
+_TEXT_PUNCT = set(".,;:!?'\"()[]{}-–—/\\%&$#@*+=<>_|•·§©®’“”‘")
+
+
+def page_is_usable(text: str) -> bool:
+    """False for empty pages and for text that is mostly unmapped glyphs or symbols."""
+    stripped = text.strip()
+    if len(stripped) < MIN_PAGE_CHARS:
+        return False
+    cid = sum(len(m) for m in _CID_RE.findall(stripped))
+    if cid > 0.2 * len(stripped):
+        return False
+    body = _CID_RE.sub("", stripped)
+    if not body:
+        return False
+    textual = sum(1 for c in body if c.isalnum() or c.isspace() or c in _TEXT_PUNCT)
+    if textual < 0.85 * len(body):
+        return False
+    letters = sum(len(w) for w in _WORD_RE.findall(body))
+    return letters >= 0.4 * sum(1 for c in body if not c.isspace())
+
+
+class PdfText:
+    """Text of a PDF page by page, with offsets into the joined `text`."""
+
+    def __init__(self, pages: List[str], extractors: List[str]):
+        self.pages = pages
+        self.extractors = extractors
+        self.offsets: List[int] = []
+        pos = 0
+        for page in pages:
+            self.offsets.append(pos)
+            pos += len(page) + len(PAGE_SEPARATOR)
+        self.text = PAGE_SEPARATOR.join(pages)
+
+    def page_at(self, offset: int) -> int:
+        """1-based page number containing character `offset` of `text`."""
+        return max(1, bisect.bisect_right(self.offsets, offset))
+
+    def page_range(self, start: int, end: int) -> Tuple[int, int]:
+        return self.page_at(start), self.page_at(max(start, end - 1))
+
+    def stats(self) -> Dict[str, int]:
+        """Pages per extractor, e.g. {"pypdf2": 195, "ocr": 5}."""
+        return dict(Counter(self.extractors))
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {"pages": self.pages, "extractors": self.extractors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[str]]) -> "PdfText":
+        return cls(data["pages"], data["extractors"])
+
+
+def _pypdf_pages(pdf_path: str, reader_factory: Optional[Callable[[], Any]] = None) -> Optional[List[str]]:
+    if reader_factory is None and not PdfReader:
+        return None
+    try:
+        reader = reader_factory() if reader_factory else PdfReader(pdf_path)
+        if reader is None:
+            return None
+        if reader.is_encrypted:
+            # Some PDFs are encrypted but allow an empty password
+            reader.decrypt("")
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"PyPDF2 failed on {os.path.basename(pdf_path)}: {e}")
+        return None
+
+
+def _pdftotext_cmd() -> List[str]:
+    bin_dir = poppler_bin_dir("pdftotext")
+    if bin_dir:
+        exe = os.path.join(bin_dir, "pdftotext.exe")
+        return [exe if os.path.exists(exe) else os.path.join(bin_dir, "pdftotext")]
+    return ["pdftotext"]
+
+
+def _poppler_pages(pdf_path: str) -> Optional[List[str]]:
+    """All pages from one pdftotext run (pages are separated by form feeds)."""
+    try:
+        result = subprocess.run(
+            _pdftotext_cmd() + ["-layout", pdf_path, "-"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="replace",
+            timeout=120,
+        )
+    except FileNotFoundError:
+        logger.warning("pdftotext not found — install Poppler and retry.")
+        return None
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Poppler extraction error: {e}")
+        return None
+    pages = (result.stdout or "").split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages or None
+
+
+def extract_pdf_text(
+    pdf_path: str,
+    reader_factory: Optional[Callable[[], Any]] = None,
+    sha256: Optional[str] = None,
+) -> PdfText:
+    """
+    Extract text page by page, falling back per page: PyPDF2 → Poppler → OCR.
+    `reader_factory` supplies an already-opened PdfReader (see
+    utils.document.Document); it is only called on a cache miss.
+    """
+    version = f"{EXTRACTOR_VERSION}+ocr" if OCR_AVAILABLE else EXTRACTOR_VERSION
+    entry = cached_extraction(
+        pdf_path, "pdf_pages", version,
+        lambda: _extract(pdf_path, reader_factory).to_dict(),
+        keep=lambda e: any(p.strip() for p in e["pages"]),
+        sha256=sha256,
+    )
+    return PdfText.from_dict(entry)
+
+
+def _extract(pdf_path: str, reader_factory: Optional[Callable[[], Any]] = None) -> PdfText:
+    pages = _pypdf_pages(pdf_path, reader_factory)
+    extractors = ["pypdf2"] * len(pages) if pages else []
+    bad = [i for i, text in enumerate(pages or []) if not page_is_usable(text)]
+
+    if pages is None or bad:
+        poppler = _poppler_pages(pdf_path)
+        if poppler is not None:
+            if pages is None or len(poppler) != len(pages):
+                # PyPDF2 failed or paginated differently: take Poppler's pages as a whole
+                pages, extractors = poppler, ["poppler"] * len(poppler)
+                bad = [i for i, text in enumerate(pages) if not page_is_usable(text)]
+            else:
+                for i in bad:
+                    if page_is_usable(poppler[i]):
+                        pages[i], extractors[i] = poppler[i], "poppler"
+                bad = [i for i in bad if extractors[i] != "poppler"]
+
+    if pages is None:
+        if not OCR_AVAILABLE:
+            logger.warning("OCR libraries not installed (pytesseract/pdf2image). Skipping OCR fallback.")
+            return PdfText([], [])
+        try:
+            ocr = ocr_pdf(pdf_path)
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"OCR failed: {e}")
+            return PdfText([], [])
+        pages = [ocr.get(n, "") for n in range(1, max(ocr, default=0) + 1)]
+        extractors = ["ocr"] * len(pages)
+    elif bad and OCR_AVAILABLE:
+        try:
+            ocr = ocr_pdf(pdf_path, pages=[i + 1 for i in bad])
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"OCR failed: {e}")
+            ocr = {}
+        for i in bad:
+            text = ocr.get(i + 1, "")
+            if text.strip():
+                pages[i], extractors[i] = text, "ocr"
+    elif bad:
+        logger.warning(f"{len(bad)} page(s) need OCR but pytesseract/pdf2image are not installed")
+
+    extractors = [
+        e if page_is_usable(p) or (e == "ocr" and p.strip()) else "empty" for p, e in zip(pages, extractors)
+    ]
+    # Garbage from a page no extractor could read must not reach the chunker
+    pages = ["" if e == "empty" else p for p, e in zip(pages, extractors)]
+    doc = PdfText(pages, extractors)
+    for name, count in doc.stats().items():
+        metrics.inc("pdf_pages_total", count, extractor=name)
+    logger.info(
+        f"Extracted {len(doc.text)} characters from {len(pages)} page(s) of {os.path.basename(pdf_path)} "
+        f"({', '.join(f'{k}={v}' for k, v in sorted(doc.stats().items()))})"
+    )
+    return doc
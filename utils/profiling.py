@@ -0,0 +1,249 @@
+"""
+On-demand CPU and memory profiling of one submission or one request.
+
+`profile("cpu" | "memory", name)` wraps a block and writes its results under
+PROFILE_DIR (default logs/profiles) as `<name>-<timestamp>.*`:
+
+- cpu: `.pstats` from cProfile (the calling thread; open it with
+  `python -m pstats` or snakeviz) and `.collapsed`, stacks of every thread
+  sampled every `sample_interval` seconds in the one-line-per-stack format
+  that flamegraph.pl / speedscope read. Sampling also sees the chunk
+  worker threads, which cProfile does not.
+- memory: `.alloc.txt`, the top-N allocation sites overall and per pipeline
+  stage. Stages are the tracing spans (extract, chunk, llm, merge, link,
+  persist, ...); each one's report is the tracemalloc difference between
+  its start and end.
+
+The heuristic pipeline CLI exposes this as `--profile cpu|memory`. With
+DEBUG_PROFILE_HEADER=1 the web apps also profile any request carrying
+`X-Debug-Profile: cpu|memory` and name the output files in the
+`X-Profile-Output` response header. On the FastAPI app cProfile sees
+everything the event loop runs meanwhile, other requests included. Only one
+profile runs at a time; requests arriving while one is active are served
+unprofiled.
+"""
+
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from . import tracing
+
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cpu", "memory")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getenv("LOG_DIR", os.path.join(os.getcwd(), "logs")), "profiles"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_MS", "5")) / 1000
+TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+HEADER = "X-Debug-Profile"
+HEADER_ENABLED = os.getenv("DEBUG_PROFILE_HEADER", "0").lower() in ("1", "true", "yes", "on")
+# Spans reported as stages in memory mode (per-call spans such as "ollama" overlap too much to be useful)
+STAGES = ("extract", "chunk", "llm", "merge", "link", "persist", "embed", "dedupe")
+
+_active = threading.Lock()
+
+
+class ProfileBusy(RuntimeError):
+    """Another profile is already running in this process."""
+
+
+class StackSampler:
+    """Samples the stacks of all threads (but its own) into collapsed-stack counts."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = max(interval, 0.001)
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _own(filename: str) -> bool:
+    # Allocations made by the profiler's own bookkeeping
+    return filename in (tracemalloc.__file__, __file__)
+
+
+class StageAllocations:
+    """Span listener: per-stage tracemalloc differences, summed over every span of the stage."""
+
+    def __init__(self, stages=STAGES):
+        self.stages = set(stages)
+        self.by_stage: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        self._starts: Dict[str, tracemalloc.Snapshot] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, span: tracing.Span, started: bool) -> None:
+        if span.name not in self.stages:
+            return
+        snapshot = tracemalloc.take_snapshot()
+        if started:
+            with self._lock:
+                self._starts[span.span_id] = snapshot
+            return
+        with self._lock:
+            before = self._starts.pop(span.span_id, None)
+        if before is None:
+            return
+        stage = self.by_stage[span.name]
+        for stat in snapshot.compare_to(before, "lineno"):
+            if stat.size_diff and not _own(stat.traceback[0].filename):
+                site = str(stat.traceback[0])
+                stage[site][0] += stat.size_diff
+                stage[site][1] += stat.count_diff
+
+    def report(self, top: int = TOP_N) -> List[str]:
+        lines = []
+        for name, sites in self.by_stage.items():
+            total = sum(size for size, _ in sites.values())
+            lines += ["", f"Stage {name}: {total / 1024:+.1f} KiB net"]
+            ranked = sorted(sites.items(), key=lambda kv: -abs(kv[1][0]))[:top]
+            lines += [f"  {size / 1024:+10.1f} KiB {count:+8d} blocks  {site}" for site, (size, count) in ranked]
+        return lines
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")[:80] or "profile"
+
+
+class Profile:
+    def __init__(self, mode: str, name: str, out_dir: str = PROFILE_DIR,
+                 sample_interval: float = SAMPLE_INTERVAL, top: int = TOP_N):
+        if mode not in MODES:
+            raise ValueError(f"profile mode must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.prefix = os.path.join(out_dir, f"{_slug(name)}-{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}")
+        self.sample_interval = sample_interval
+        self.top = top
+        self.outputs: List[str] = []
+
+    def _finish_cpu(self, profiler: cProfile.Profile, sampler: StackSampler) -> None:
+        profiler.dump_stats(f"{self.prefix}.pstats")
+        sampler.write(f"{self.prefix}.collapsed")
+        self.outputs += [f"{self.prefix}.pstats", f"{self.prefix}.collapsed"]
+
+    def _finish_memory(self, stages: StageAllocations, started: float) -> None:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"{self.prefix}: {time.time() - started:.2f}s, traced memory {current / 1024 / 1024:.1f} MiB now, "
+            f"{peak / 1024 / 1024:.1f} MiB peak",
+            "",
+            f"Top {self.top} allocation sites still held at the end:",
+        ]
+        stats = [stat for stat in snapshot.statistics("lineno") if not _own(stat.traceback[0].filename)]
+        lines += [f"  {stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback[0]}"
+                  for stat in stats[: self.top]]
+        lines += stages.report(self.top)
+        with open(f"{self.prefix}.alloc.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.outputs.append(f"{self.prefix}.alloc.txt")
+
+    @contextmanager
+    def run(self) -> Iterator["Profile"]:
+        os.makedirs(os.path.dirname(self.prefix), exist_ok=True)
+        if self.mode == "cpu":
+            profiler, sampler = cProfile.Profile(), StackSampler(self.sample_interval).start()
+            profiler.enable()
+            try:
+                yield self
+            finally:
+                profiler.disable()
+                sampler.stop()
+                self._finish_cpu(profiler, sampler)
+        else:
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            stages, started = StageAllocations(), time.time()
+            tracing.add_listener(stages)
+            try:
+                yield self
+            finally:
+                tracing.remove_listener(stages)
+                self._finish_memory(stages, started)
+                if not was_tracing:
+                    tracemalloc.stop()
+
+
+@contextmanager
+def profile(mode: str, name: str, **kwargs) -> Iterator[Profile]:
+    """Profile the block (see module docstring); raises ProfileBusy if a profile is already running."""
+    prof = Profile(mode, name, **kwargs)
+    if not _active.acquire(blocking=False):
+        raise ProfileBusy("A profile is already running")
+    try:
+        with prof.run():
+            yield prof
+    finally:
+        _active.release()
+        if prof.outputs:
+            logger.info(f"Profile ({mode}) written: {', '.join(prof.outputs)}")
+
+
+def requested_mode(header_value: Optional[str]) -> Optional[str]:
+    """The profile mode a request asked for via X-Debug-Profile, if the header is enabled and valid."""
+    mode = (header_value or "").strip().lower()
+    return mode if HEADER_ENABLED and mode in MODES else None
+
+
+def wsgi_middleware(wsgi_app: Callable) -> Callable:
+    """Profile WSGI requests that carry X-Debug-Profile (when DEBUG_PROFILE_HEADER=1)."""
+
+    def _app(environ, start_response):
+        mode = requested_mode(environ.get("HTTP_X_DEBUG_PROFILE"))
+        if not mode:
+            return wsgi_app(environ, start_response)
+        name = f"{environ.get('REQUEST_METHOD')}-{environ.get('PATH_INFO')}"
+        try:
+            with profile(mode, name) as prof:
+                def _start_response(status, headers, exc_info=None):
+                    return start_response(status, headers + [("X-Profile-Output", prof.prefix)], exc_info)
+
+                # The body is built inside the profile; a streamed body is only covered this far
+                result = wsgi_app(environ, _start_response)
+                try:
+                    return list(result)
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+        except ProfileBusy:
+            return wsgi_app(environ, start_response)
+
+    return _app
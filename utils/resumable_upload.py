@@ -0,0 +1,172 @@
+"""
+Resumable uploads: init, PUT parts at byte offsets, complete.
+
+Each upload is a directory under `<incoming>/.uploads/<upload_id>/` holding
+`meta.json` and one file per received part, named by its starting offset.
+A part is streamed to a temp file and renamed into place, so a dropped
+connection leaves no half-written part; the client asks for the received
+ranges and re-sends only what is missing. On completion the parts are read
+back in offset order into a StreamingUpload (sha256 computed as it goes),
+checked against the declared size and hash, and renamed into the incoming
+folder in one step.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .file_handler import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES, StreamingUpload, UploadTooLarge
+
+
+UPLOAD_TTL_SECONDS = float(os.getenv("UPLOAD_TTL_HOURS", "24")) * 3600
+_PART_SUFFIX = ".part"
+
+
+class UploadError(ValueError):
+    """Client-side problem with an upload; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _merge(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class ResumableUpload:
+    def __init__(self, incoming_dir: str, upload_id: str):
+        if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+            raise UploadError("Unknown upload", status=404)
+        self.incoming_dir = incoming_dir
+        self.upload_id = upload_id
+        self.dir = os.path.join(incoming_dir, ".uploads", upload_id)
+        try:
+            with open(os.path.join(self.dir, "meta.json"), "r", encoding="utf-8") as f:
+                self.meta: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Unknown upload", status=404)
+
+    @classmethod
+    def create(cls, incoming_dir: str, filename: str, size: int, sha256: Optional[str] = None) -> "ResumableUpload":
+        if size <= 0:
+            raise UploadError("size must be a positive byte count")
+        if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+            raise UploadError(str(UploadTooLarge(MAX_UPLOAD_BYTES)), status=413)
+        cls.expire(incoming_dir)
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(incoming_dir, ".uploads", upload_id)
+        os.makedirs(path)
+        meta = {
+            "filename": os.path.basename(filename) or "upload.bin",
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "created": time.time(),
+        }
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return cls(incoming_dir, upload_id)
+
+    @staticmethod
+    def expire(incoming_dir: str) -> int:
+        """Delete uploads untouched for UPLOAD_TTL_SECONDS; returns how many were removed."""
+        root = os.path.join(incoming_dir, ".uploads")
+        if not os.path.isdir(root):
+            return 0
+        cutoff = time.time() - UPLOAD_TTL_SECONDS
+        removed = 0
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _parts(self) -> List[Tuple[int, str, int]]:
+        """(offset, path, length) of every complete part, by offset."""
+        parts = []
+        for name in os.listdir(self.dir):
+            if name.startswith(".") or not name.endswith(_PART_SUFFIX):
+                continue
+            path = os.path.join(self.dir, name)
+            parts.append((int(name[: -len(_PART_SUFFIX)]), path, os.path.getsize(path)))
+        return sorted(parts)
+
+    def received(self) -> List[Tuple[int, int]]:
+        """Merged [start, end) byte ranges received so far."""
+        return _merge((offset, offset + length) for offset, _, length in self._parts() if length)
+
+    def missing(self) -> List[Tuple[int, int]]:
+        gaps, pos = [], 0
+        for start, end in self.received():
+            if start > pos:
+                gaps.append((pos, start))
+            pos = max(pos, end)
+        if pos < self.meta["size"]:
+            gaps.append((pos, self.meta["size"]))
+        return gaps
+
+    def status(self) -> Dict[str, Any]:
+        received = self.received()
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.meta["filename"],
+            "size": self.meta["size"],
+            "received_bytes": sum(end - start for start, end in received),
+            "received": [list(r) for r in received],
+            "missing": [list(r) for r in self.missing()],
+        }
+
+    def part_writer(self, offset: int) -> StreamingUpload:
+        """A StreamingUpload for the part starting at `offset`; call `commit_part` on it when done."""
+        if offset < 0 or offset >= self.meta["size"]:
+            raise UploadError(f"offset must be in [0, {self.meta['size']})", status=416)
+        return StreamingUpload(self.dir, max_bytes=self.meta["size"] - offset)
+
+    def commit_part(self, writer: StreamingUpload, offset: int) -> Dict[str, Any]:
+        # Re-sending a part at the same offset replaces it
+        writer.commit(f"{offset:015d}{_PART_SUFFIX}")
+        os.utime(self.dir)
+        return self.status()
+
+    def complete(self, sha256: Optional[str] = None) -> Tuple[str, str, int]:
+        """
+        Assemble the parts into the incoming folder. Returns (final name, sha256, size).
+        Raises UploadError on gaps (409) or a hash mismatch (422, upload discarded).
+        """
+        missing = self.missing()
+        if missing:
+            raise UploadError(f"Upload incomplete; missing byte ranges {missing}", status=409)
+        expected = (sha256 or self.meta.get("sha256") or "").lower() or None
+
+        with StreamingUpload(self.incoming_dir, max_bytes=self.meta["size"]) as out:
+            pos = 0
+            for offset, path, length in self._parts():
+                if offset + length <= pos:
+                    continue
+                with open(path, "rb") as f:
+                    # Parts may overlap when a retry used a different split; skip bytes already written
+                    f.seek(pos - offset if offset < pos else 0)
+                    for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+                        out.write(chunk)
+                pos = offset + length
+            if expected and out.sha256 != expected:
+                self.discard()
+                raise UploadError(f"sha256 mismatch: expected {expected}, got {out.sha256}", status=422)
+            name = f"{out.sha256[:12]}_{self.meta['filename']}"
+            out.commit(name)
+
+        self.discard()
+        return name, out.sha256, out.size
+
+    def discard(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import List, Dict, Any
 import numpy as np
@@ -37,3 +38,30 @@ def filter_unique(vulnerabilities: List[Dict[str, Any]]) -> List[Dict[str, Any]]
     return unique
 
 
+def _rank_unique(vulnerabilities: List[Dict[str, Any]], vectors: List[List[float]], matches: List[List[Dict[str, Any]]], threshold: float) -> List[Dict[str, Any]]:
+    unique: List[Dict[str, Any]] = []
+    for v, vector, found in zip(vulnerabilities, vectors, matches):
+        best = 0.0
+        for m in found:
+            mvec = m.get("embedding") or []
+            if mvec:
+                best = max(best, cosine_similarity(vector, mvec))
+        if best < threshold:
+            unique.append({**v, "embedding": vector})
+    return unique
+
+
+async def afilter_unique(vulnerabilities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    `filter_unique` for the async routes: one batched embedding call, library
+    lookups run concurrently, the similarity scoring runs in a worker thread.
+    """
+    threshold = float(os.getenv("SIM_THRESHOLD", "0.88"))
+    items = [v for v in vulnerabilities if v.get("vulnerability") or v.get("text")]
+    vectors = await emb.aembed_texts([v.get("vulnerability") or v.get("text") for v in items])
+    # A failed embedding comes back empty; the RPC would reject it
+    matches = await asyncio.gather(*(
+        sbc.aquery_embeddings(vec, match_threshold=threshold, match_count=5) if vec else asyncio.sleep(0, [])
+        for vec in vectors
+    ))
+    return await asyncio.to_thread(_rank_unique, items, list(vectors), list(matches), threshold)
@@ -1,10 +1,49 @@
 import os
+import socket
+from datetime import datetime, timedelta, timezone
 from supabase import create_client, Client
 from typing import List, Dict, Any
 
+from . import metrics
+from .http_client import async_client
+
 
 _client: Client | None = None
 
+# Submissions are claimed atomically by the claim_submissions RPC: one update
+# from 'submitted' to 'processing' that stamps claimed_by and lease_expires_at
+# and increments attempts, so replicas sharing one queue never pick the same
+# row and every claim is counted. A failed submission is released at once
+# (back to 'submitted', or 'error' after MAX_ATTEMPTS claims); a claim whose
+# lease runs out because the worker died is released the same way by the
+# reaper. The columns and the RPC are created by
+# migrations/001_submission_claims.sql.
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "1800"))
+MAX_ATTEMPTS = int(os.getenv("CLAIM_MAX_ATTEMPTS", "3"))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _claim_patch(worker_id: str | None, lease_seconds: int | None) -> Dict[str, Any]:
+    expires = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds or LEASE_SECONDS)
+    return {"status": "processing", "claimed_by": worker_id or WORKER_ID, "lease_expires_at": expires.isoformat()}
+
+
+_UNCLAIMED = {"status": "submitted", "claimed_by": None, "lease_expires_at": None}
+_GAVE_UP = {"status": "error", "error": f"gave up after {MAX_ATTEMPTS} attempts", "claimed_by": None, "lease_expires_at": None}
+
+
+def _status_patch(status: str, worker_id: str | None, error: str | None) -> Dict[str, Any]:
+    patch: Dict[str, Any] = {"status": status}
+    if worker_id:
+        patch.update(claimed_by=None, lease_expires_at=None)
+    if error:
+        patch["error"] = error[:500]
+    return patch
+
 
 def get_client() -> Client:
     global _client
@@ -18,21 +57,88 @@ def get_client() -> Client:
     return _client
 
 
-def pull_pending(limit: int = 5) -> List[Dict[str, Any]]:
+def _claim_args(limit: int, worker_id: str | None, lease_seconds: int | None) -> Dict[str, Any]:
+    return {"p_worker_id": worker_id or WORKER_ID, "p_limit": limit, "p_lease_seconds": lease_seconds or LEASE_SECONDS}
+
+
+def _release_patch(attempts: int, error: str | None) -> Dict[str, Any]:
+    """Back to the queue, or failed for good once the row has been claimed MAX_ATTEMPTS times."""
+    if attempts >= MAX_ATTEMPTS:
+        return {**_GAVE_UP, "error": f"{_GAVE_UP['error']}: {error}"[:500]} if error else _GAVE_UP
+    return {**_UNCLAIMED, "error": error[:500]} if error else _UNCLAIMED
+
+
+def pull_pending(limit: int = 5, worker_id: str | None = None, lease_seconds: int | None = None) -> List[Dict[str, Any]]:
+    """
+    Claim up to `limit` submitted rows for this worker and return them, with
+    `attempts` already counting this claim.
+    """
+    sb = get_client()
+    reap_expired_leases()
+    res = sb.rpc("claim_submissions", _claim_args(limit, worker_id, lease_seconds)).execute()
+    return res.data or []
+
+
+def renew_lease(submission_id: str, worker_id: str | None = None, lease_seconds: int | None = None) -> bool:
+    """Extend this worker's claim; False if the claim was lost (reaped or taken over)."""
+    sb = get_client()
+    res = (
+        sb.table("submissions")
+        .update(_claim_patch(worker_id, lease_seconds))
+        .eq("id", submission_id)
+        .eq("claimed_by", worker_id or WORKER_ID)
+        .execute()
+    )
+    return bool(res.data)
+
+
+def reap_expired_leases() -> List[Dict[str, Any]]:
+    """
+    Return rows whose worker stopped renewing its lease to the queue, or set
+    them to 'error' once they have been claimed MAX_ATTEMPTS times. Returns
+    the re-queued rows.
+    """
     sb = get_client()
+    now = _now()
+    (
+        sb.table("submissions")
+        .update(_GAVE_UP)
+        .eq("status", "processing")
+        .lt("lease_expires_at", now)
+        .gte("attempts", MAX_ATTEMPTS)
+        .execute()
+    )
     res = (
         sb.table("submissions")
-        .select("*")
-        .eq("status", "submitted")
-        .limit(limit)
+        .update(_UNCLAIMED)
+        .eq("status", "processing")
+        .lt("lease_expires_at", now)
         .execute()
     )
     return res.data or []
 
 
-def mark_status(submission_id: str, status: str) -> None:
+def release_claim(submission_id: str, attempts: int, worker_id: str | None = None, error: str | None = None) -> bool:
+    """Give up this worker's claim after a failure; False if it no longer held it."""
+    sb = get_client()
+    res = (
+        sb.table("submissions")
+        .update(_release_patch(attempts, error))
+        .eq("id", submission_id)
+        .eq("claimed_by", worker_id or WORKER_ID)
+        .execute()
+    )
+    return bool(res.data)
+
+
+def mark_status(submission_id: str, status: str, worker_id: str | None = None, error: str | None = None) -> None:
+    """Set `status` (and `error`); with `worker_id`, only while that worker holds the claim (and release it)."""
     sb = get_client()
-    sb.table("submissions").update({"status": status}).eq("id", submission_id).execute()
+    q = sb.table("submissions").update(_status_patch(status, worker_id, error)).eq("id", submission_id)
+    if worker_id:
+        q = q.eq("claimed_by", worker_id)
+    with metrics.timer("supabase_write_seconds", table="submissions"):
+        q.execute()
 
 
 def push_extraction(
@@ -43,15 +149,16 @@ def push_extraction(
     runtime_ms: int,
 ) -> None:
     sb = get_client()
-    sb.table("extractions").insert(
-        {
-            "submission_id": submission_id,
-            "model_version": model_version,
-            "raw_json": data,
-            "confidence": confidence,
-            "run_time_ms": runtime_ms,
-        }
-    ).execute()
+    with metrics.timer("supabase_write_seconds", table="extractions"):
+        sb.table("extractions").insert(
+            {
+                "submission_id": submission_id,
+                "model_version": model_version,
+                "raw_json": data,
+                "confidence": confidence,
+                "run_time_ms": runtime_ms,
+            }
+        ).execute()
 
 
 def query_embeddings(vector: List[float], match_threshold: float = 0.88, match_count: int = 5) -> List[Dict[str, Any]]:
@@ -73,12 +180,146 @@ def query_similar_vulnerabilities(vector: List[float], threshold: float = 0.88,
 
 def insert_vulnerability(text: str, embedding_vec: List[float], source_doc: str | None = None) -> None:
     sb = get_client()
-    sb.table("vulnerability_library").insert(
-        {
+    with metrics.timer("supabase_write_seconds", table="vulnerability_library"):
+        sb.table("vulnerability_library").insert(
+            {
+                "vulnerability": text,
+                "embedding": embedding_vec,
+                "source_doc": source_doc,
+            }
+        ).execute()
+
+
+# ---- Async variants over PostgREST on the shared AsyncClient (FastAPI routes) ----
+
+def _rest_config() -> tuple[str, Dict[str, str]]:
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise RuntimeError("Supabase not configured: set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+    return f"{url.rstrip('/')}/rest/v1", {"apikey": key, "Authorization": f"Bearer {key}"}
+
+
+async def _rest(method: str, path: str, params: Dict[str, Any] | None = None, json: Any = None, prefer: str | None = None) -> Any:
+    base, headers = _rest_config()
+    if prefer:
+        headers["Prefer"] = prefer
+    if method == "GET" or path.startswith("rpc/"):
+        resp = await async_client().request(method, f"{base}/{path}", params=params, json=json, headers=headers)
+    else:
+        with metrics.timer("supabase_write_seconds", table=path):
+            resp = await async_client().request(method, f"{base}/{path}", params=params, json=json, headers=headers)
+    resp.raise_for_status()
+    return resp.json() if resp.content else None
+
+
+async def apull_pending(limit: int = 5, worker_id: str | None = None, lease_seconds: int | None = None) -> List[Dict[str, Any]]:
+    """Async `pull_pending`: claim up to `limit` submitted rows for this worker."""
+    await areap_expired_leases()
+    rows = await _rest("POST", "rpc/claim_submissions", json=_claim_args(limit, worker_id, lease_seconds))
+    return rows or []
+
+
+async def arenew_lease(submission_id: str, worker_id: str | None = None, lease_seconds: int | None = None) -> bool:
+    rows = await _rest(
+        "PATCH",
+        "submissions",
+        params={"id": f"eq.{submission_id}", "claimed_by": f"eq.{worker_id or WORKER_ID}"},
+        json=_claim_patch(worker_id, lease_seconds),
+        prefer="return=representation",
+    )
+    return bool(rows)
+
+
+async def areap_expired_leases() -> List[Dict[str, Any]]:
+    now = _now()
+    await _rest(
+        "PATCH",
+        "submissions",
+        params={"status": "eq.processing", "lease_expires_at": f"lt.{now}", "attempts": f"gte.{MAX_ATTEMPTS}"},
+        json=_GAVE_UP,
+        prefer="return=minimal",
+    )
+    rows = await _rest(
+        "PATCH",
+        "submissions",
+        params={"status": "eq.processing", "lease_expires_at": f"lt.{now}"},
+        json=_UNCLAIMED,
+        prefer="return=representation",
+    )
+    return rows or []
+
+
+async def arelease_claim(submission_id: str, attempts: int, worker_id: str | None = None, error: str | None = None) -> bool:
+    rows = await _rest(
+        "PATCH",
+        "submissions",
+        params={"id": f"eq.{submission_id}", "claimed_by": f"eq.{worker_id or WORKER_ID}"},
+        json=_release_patch(attempts, error),
+        prefer="return=representation",
+    )
+    return bool(rows)
+
+
+async def amark_status(submission_id: str, status: str, worker_id: str | None = None, error: str | None = None) -> None:
+    params = {"id": f"eq.{submission_id}"}
+    if worker_id:
+        params["claimed_by"] = f"eq.{worker_id}"
+    await _rest("PATCH", "submissions", params=params, json=_status_patch(status, worker_id, error), prefer="return=minimal")
+
+
+async def apush_extraction(
+    submission_id: str,
+    model_version: str,
+    data: Dict[str, Any],
+    confidence: float,
+    runtime_ms: int,
+) -> None:
+    await _rest(
+        "POST",
+        "extractions",
+        json={
+            "submission_id": submission_id,
+            "model_version": model_version,
+            "raw_json": data,
+            "confidence": confidence,
+            "run_time_ms": runtime_ms,
+        },
+        prefer="return=minimal",
+    )
+
+
+async def aquery_embeddings(vector: List[float], match_threshold: float = 0.88, match_count: int = 5) -> List[Dict[str, Any]]:
+    rows = await _rest(
+        "POST",
+        "rpc/match_vulnerabilities",
+        json={
+            "query_embedding": vector,
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+        },
+    )
+    return rows or []
+
+
+async def aquery_similar_vulnerabilities(vector: List[float], threshold: float = 0.88, count: int = 5) -> List[Dict[str, Any]]:
+    return await aquery_embeddings(vector, match_threshold=threshold, match_count=count)
+
+
+async def ainsert_vulnerability(text: str, embedding_vec: List[float], source_doc: str | None = None) -> None:
+    await _rest(
+        "POST",
+        "vulnerability_library",
+        json={
             "vulnerability": text,
             "embedding": embedding_vec,
             "source_doc": source_doc,
-        }
-    ).execute()
+        },
+        prefer="return=minimal",
+    )
 
 
+async def ainsert_vulnerabilities(rows: List[Dict[str, Any]]) -> None:
+    """Bulk insert {vulnerability, embedding, source_doc} rows in one request."""
+    if rows:
+        await _rest("POST", "vulnerability_library", json=rows, prefer="return=minimal")
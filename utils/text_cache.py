@@ -0,0 +1,94 @@
+"""
+Content-addressed cache of extracted document text.
+
+Entries are keyed by the file's sha256 plus the extractor name and version,
+stored as gzipped JSON under TEXT_CACHE_DIR (default data/text_cache). Any
+pipeline that sees the same file again gets its text, page offsets and
+metadata back without parsing the PDF or running OCR. Bump an extractor's
+version whenever its output changes so stale entries are ignored.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("TEXT_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class TextCache:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("TEXT_CACHE_DIR", os.path.join(os.getcwd(), "data", "text_cache"))
+
+    def _path(self, sha256: str, extractor: str, version: str) -> str:
+        tag = re.sub(r"[^A-Za-z0-9_.+-]", "_", f"{extractor}-{version}")
+        return os.path.join(self.root, sha256[:2], f"{sha256}.{tag}.json.gz")
+
+    def get(self, sha256: str, extractor: str, version: str) -> Optional[Dict[str, Any]]:
+        path = self._path(sha256, extractor, version)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable text cache entry {path}: {e}")
+            return None
+
+    def put(self, sha256: str, extractor: str, version: str, entry: Dict[str, Any]) -> None:
+        path = self._path(sha256, extractor, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def cached_extraction(
+    path: str,
+    extractor: str,
+    version: str,
+    extract: Callable[[], Dict[str, Any]],
+    keep: Callable[[Dict[str, Any]], bool] = lambda entry: True,
+    sha256: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Return the cached entry for (`path` content, extractor, version), or run
+    `extract()` and store its result when `keep(result)` says it is worth
+    keeping (e.g. not empty). Pass `sha256` when the caller already has it.
+    """
+    if not ENABLED:
+        with metrics.timer("document_extraction_seconds", extractor=extractor):
+            return extract()
+    cache = TextCache()
+    digest = sha256 or file_sha256(path)
+    entry = cache.get(digest, extractor, version)
+    if entry is not None:
+        metrics.inc("text_cache_hits_total", extractor=extractor)
+        logger.info(f"Text cache hit for {os.path.basename(path)} ({extractor} {version})")
+        return entry
+    metrics.inc("text_cache_misses_total", extractor=extractor)
+    with metrics.timer("document_extraction_seconds", extractor=extractor):
+        entry = extract()
+    if keep(entry):
+        try:
+            cache.put(digest, extractor, version, entry)
+        except OSError as e:
+            logger.warning(f"Could not write text cache entry for {os.path.basename(path)}: {e}")
+    return entry
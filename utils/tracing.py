@@ -0,0 +1,353 @@
+"""
+Lightweight per-stage tracing.
+
+`span(name, **attrs)` times a block and appends one JSON line per finished
+span to TRACE_FILE (default logs/traces.jsonl): trace id, span id, parent id,
+start, duration and attributes. Nesting follows the current span
+(contextvars), so asyncio tasks inherit it; use `wrap(fn)` for work handed to
+a thread pool. The context crosses process and HTTP boundaries as a W3C
+`traceparent` value: `subprocess_env()` passes it to a child process
+(read back from TRACEPARENT by the child's first span), outbound requests
+on the shared HTTP clients carry it as a header, and the web apps continue
+an incoming one.
+
+Summarize where a submission's time went (critical path plus totals per
+stage):
+
+    python -m utils.tracing <submission_id> [--file logs/traces.jsonl]
+"""
+
+import argparse
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+ENABLED = os.getenv("TRACING", "1").lower() not in ("0", "false", "no", "off")
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(os.getenv("LOG_DIR", os.path.join(os.getcwd(), "logs")), "traces.jsonl"))
+TRACEPARENT_ENV = "TRACEPARENT"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "deferred")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        # Set by defer(): the span is written by end() instead of when its block exits
+        self.deferred = False
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+_write_lock = threading.Lock()
+# Called as fn(span, started) when a span starts (True) and ends (False); used by utils.profiling
+_listeners: List[Callable[[Span, bool], None]] = []
+
+
+def add_listener(fn: Callable[[Span, bool], None]) -> None:
+    _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[Span, bool], None]) -> None:
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def _notify(s: Span, started: bool) -> None:
+    for fn in list(_listeners):
+        try:
+            fn(s, started)
+        except Exception:  # noqa: BLE001
+            pass
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span id) from a `traceparent` value, or None if malformed."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def _write(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        try:
+            os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass
+
+
+def _record(s: Span, end: float, error: Optional[str] = None) -> Dict[str, Any]:
+    rec = {
+        "trace_id": s.trace_id,
+        "span_id": s.span_id,
+        "parent_id": s.parent_id,
+        "name": s.name,
+        "start": s.start,
+        "duration_ms": round((end - s.start) * 1000, 3),
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+        "attrs": s.attrs,
+    }
+    if error:
+        rec["error"] = error[:500]
+    return rec
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Time the block as span `name`. The parent is the current span, else
+    `traceparent`, else the TRACEPARENT environment variable (set by a parent
+    process); otherwise a new trace starts. `submission_id` is inherited from
+    the enclosing span so every span of a submission can be found by it.
+    """
+    if not ENABLED and not _listeners:
+        yield None
+        return
+    parent = _current.get()
+    if attrs.get("submission_id") is None:
+        attrs.pop("submission_id", None)
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+        if "submission_id" in parent.attrs:
+            attrs.setdefault("submission_id", parent.attrs["submission_id"])
+    else:
+        remote = parse_traceparent(traceparent) or parse_traceparent(os.getenv(TRACEPARENT_ENV))
+        trace_id, parent_id = remote if remote else (secrets.token_hex(16), None)
+    s = Span(name, trace_id, parent_id, attrs)
+    token = _current.set(s)
+    _notify(s, True)
+    error = None
+    try:
+        yield s
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        if not s.deferred or error:
+            s.deferred = False
+            end(s, error)
+
+
+def defer(s: Optional[Span]) -> None:
+    """Keep `s` open after its `span()` block exits, until `end(s)` (e.g. while a response body streams)."""
+    if s is not None:
+        s.deferred = True
+
+
+def end(s: Optional[Span], error: Optional[str] = None) -> None:
+    """Finish span `s` now: notify listeners and write it."""
+    if s is None:
+        return
+    finished = time.time()
+    _notify(s, False)
+    if ENABLED:
+        _write(_record(s, finished, error))
+
+
+def record(name: str, start: float, end: Optional[float] = None, **attrs) -> None:
+    """Write an already-timed block (wall-clock `start`/`end`) as a child of the current span."""
+    parent = _current.get()
+    if not ENABLED or parent is None:
+        return
+    if "submission_id" in parent.attrs:
+        attrs.setdefault("submission_id", parent.attrs["submission_id"])
+    s = Span(name, parent.trace_id, parent.span_id, attrs)
+    s.start = start
+    _write(_record(s, end or time.time()))
+
+
+def traced(name: str, **attrs) -> Callable:
+    """Decorator: run the function in span `name`, tagged with its `submission_id` argument if it has one."""
+
+    def _decorate(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def _run(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            with span(name, submission_id=bound.arguments.get("submission_id"), **attrs):
+                return fn(*args, **kwargs)
+
+        return _run
+
+    return _decorate
+
+
+def wrap(fn: Callable) -> Callable:
+    """Bind `fn` to the current trace context, for callables run on pool threads."""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def _run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return _run
+
+
+def headers() -> Dict[str, str]:
+    """{"traceparent": ...} for the current span, or {} outside a trace."""
+    s = _current.get()
+    return {"traceparent": s.traceparent} if s else {}
+
+
+def subprocess_env(env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """A copy of `env` (default os.environ) carrying the current span as TRACEPARENT."""
+    out = dict(os.environ if env is None else env)
+    # The child may run in another directory; keep its spans in the same file
+    out.setdefault("TRACE_FILE", os.path.abspath(TRACE_FILE))
+    s = _current.get()
+    if s:
+        out[TRACEPARENT_ENV] = s.traceparent
+    return out
+
+
+def wsgi_middleware(wsgi_app: Callable) -> Callable:
+    """
+    Run each WSGI request in a span, continuing the caller's `traceparent`
+    header. The span ends when the server closes the response, so it covers
+    sending a streamed body too.
+    """
+
+    def _body(result, s: Span) -> Iterator[bytes]:
+        error = None
+        try:
+            yield from result
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+            end(s, error)
+
+    def _app(environ, start_response):
+        with span(
+            f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}",
+            traceparent=environ.get("HTTP_TRACEPARENT"),
+        ) as s:
+            result = wsgi_app(environ, start_response)
+            if s is None:
+                return result
+            defer(s)
+            return _body(result, s)
+
+    return _app
+
+
+# ---- Summaries ---------------------------------------------------------------
+
+def load_spans(submission_id: str, path: str = TRACE_FILE) -> List[Dict[str, Any]]:
+    """
+    The spans of `submission_id` plus their ancestors (the request, batch or
+    watcher spans it ran under), so a shared batch trace is cut down to the
+    part this submission took.
+    """
+    spans: Dict[str, Dict[str, Any]] = {}
+    matched = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            spans[rec["span_id"]] = rec
+            if str(rec.get("attrs", {}).get("submission_id")) == str(submission_id):
+                matched.append(rec)
+    keep = {}
+    for rec in matched:
+        while rec is not None and rec["span_id"] not in keep:
+            keep[rec["span_id"]] = rec
+            rec = spans.get(rec["parent_id"])
+    return list(keep.values())
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    (depth, span) pairs along the critical path: from each span, walk back
+    from its end through the children that finished last without overlapping
+    the one chosen after them, and recurse into those.
+    """
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in by_id else None
+        children[parent].append(s)
+
+    end = lambda s: s["start"] + s["duration_ms"] / 1000  # noqa: E731
+    path: List[Tuple[int, Dict[str, Any]]] = []
+
+    def _walk(s: Dict[str, Any], depth: int) -> None:
+        path.append((depth, s))
+        cursor = end(s)
+        chosen = []
+        for child in sorted(children[s["span_id"]], key=end, reverse=True):
+            if end(child) <= cursor + 1e-6:
+                chosen.append(child)
+                cursor = child["start"]
+        for child in reversed(chosen):
+            _walk(child, depth + 1)
+
+    for root in sorted(children[None], key=lambda s: s["start"]):
+        _walk(root, 0)
+    return path
+
+
+def summarize(submission_id: str, path: str = TRACE_FILE) -> str:
+    spans = load_spans(submission_id, path)
+    if not spans:
+        return f"No spans found for submission {submission_id} in {path}"
+    # Wall time of the submission's own spans; enclosing batch spans may run longer
+    own = [s for s in spans if str(s.get("attrs", {}).get("submission_id")) == str(submission_id)]
+    start = min(s["start"] for s in own)
+    wall = max(s["start"] + s["duration_ms"] / 1000 for s in own) - start
+    own_ids = {s["span_id"] for s in own}
+    lines = [f"Submission {submission_id}: {len(spans)} span(s), {wall:.2f}s wall", "", "Critical path:"]
+    for depth, s in critical_path(spans):
+        share = f"{s['duration_ms'] / 1000 / wall:6.1%}" if wall and s["span_id"] in own_ids else "     -"
+        flag = "  !" + s["error"] if s.get("error") else ""
+        lines.append(f"  {'  ' * depth}{s['name']:<{max(1, 32 - 2 * depth)}} {s['duration_ms'] / 1000:9.3f}s {share}{flag}")
+
+    totals: Dict[str, List[float]] = defaultdict(list)
+    for s in spans:
+        totals[s["name"]].append(s["duration_ms"] / 1000)
+    lines += ["", f"{'Stage':<32} {'count':>6} {'total s':>10} {'max s':>9}"]
+    for name, values in sorted(totals.items(), key=lambda kv: -sum(kv[1])):
+        lines.append(f"{name:<32} {len(values):>6} {sum(values):>10.3f} {max(values):>9.3f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Summarize the traced stages of one submission.")
+    p.add_argument("submission_id")
+    p.add_argument("--file", default=TRACE_FILE, help="Trace JSONL file")
+    args = p.parse_args()
+    print(summarize(args.submission_id, args.file))
@@ -0,0 +1,157 @@
+"""
+Pydantic models for the VOFC payloads the Ollama models are asked to return.
+
+Each `Schema` is sent to Ollama as the `format` JSON schema (constrained
+decoding) and used to validate the response, so callers get plain dicts
+instead of re-parsing free text.
+"""
+
+import json
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+
+from . import metrics
+
+
+class StructuredOutputError(ValueError):
+    """Model output could not be validated against the requested schema."""
+
+
+class _Model(BaseModel):
+    # Every field is emitted as required in the schema sent to Ollama,
+    # but validation still tolerates models that leave optional keys out.
+    model_config = ConfigDict(extra="ignore", json_schema_serialization_defaults_required=True)
+
+
+# ---- heuristic_pipeline.VOFC_SYSTEM_PROMPT ----------------------------------
+class OptionForConsideration(_Model):
+    option: str
+    description: str = ""
+
+
+class VulnerabilityItem(_Model):
+    question: str = ""
+    vulnerability: str
+    what: str = ""
+    so_what: str = ""
+    sector: str = ""
+    subsector: str = ""
+    discipline: str = ""
+    category: str = ""
+    options_for_consideration: List[OptionForConsideration] = Field(default_factory=list)
+
+
+# ---- automation/vofc_pipeline.EXTRACTION_SCHEMA -----------------------------
+class SourceReference(_Model):
+    reference_number: int = 0
+    source_text: str = ""
+
+
+class ExtractionOption(_Model):
+    option_text: str
+    sources: List[SourceReference] = Field(default_factory=list)
+
+
+class ExtractionItem(_Model):
+    category: str = ""
+    vulnerability: str
+    options_for_consideration: List[ExtractionOption] = Field(default_factory=list)
+
+
+# ---- app/services/vofc_parser.SYSTEM_PROMPT ---------------------------------
+class DocVulnerability(_Model):
+    id: str = "auto"
+    category: str = ""
+    vulnerability: str
+    citations: List[str] = Field(default_factory=list)
+
+
+class DocOption(_Model):
+    id: str = "auto"
+    category: str = ""
+    ofc: str
+    citations: List[str] = Field(default_factory=list)
+
+
+class DocLink(_Model):
+    vulnerability_id: str
+    ofc_id: str
+    strength: str = ""
+    rationale: str = ""
+
+
+class VOFCDocument(_Model):
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    vulnerabilities: List[DocVulnerability] = Field(default_factory=list)
+    options_for_consideration: List[DocOption] = Field(default_factory=list)
+    links: List[DocLink] = Field(default_factory=list)
+
+
+def _inline_refs(node: Any, defs: Dict[str, Any]) -> Any:
+    """Resolve `$ref`s so the grammar converter only sees a self-contained schema."""
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if ref and ref.startswith("#/$defs/"):
+            return _inline_refs(defs[ref.split("/")[-1]], defs)
+        return {
+            k: _inline_refs(v, defs)
+            for k, v in node.items()
+            if k != "$defs" and not (k == "title" and isinstance(v, str))
+        }
+    if isinstance(node, list):
+        return [_inline_refs(v, defs) for v in node]
+    return node
+
+
+class Schema:
+    """A named response shape: JSON schema for `format` plus a fast validator."""
+
+    def __init__(self, name: str, model: type, many: bool):
+        self.name = name
+        self.many = many
+        self._item = TypeAdapter(model)
+        self._adapter = TypeAdapter(List[model]) if many else self._item
+        raw = self._adapter.json_schema(mode="serialization")
+        self._json_schema = _inline_refs(raw, raw.get("$defs", {}))
+
+    def json_schema(self) -> Dict[str, Any]:
+        return self._json_schema
+
+    def parse(self, raw: str) -> Any:
+        """
+        Validate raw model output and return plain dicts.
+        Valid output takes the pydantic-core fast path; otherwise valid items
+        are salvaged one by one and StructuredOutputError is raised only
+        when nothing usable remains.
+        """
+        try:
+            return self._dump(self._adapter.validate_json(raw))
+        except ValidationError as first_error:
+            try:
+                data = json.loads(raw)
+            except (TypeError, ValueError) as e:
+                raise StructuredOutputError(f"{self.name}: invalid JSON ({e})") from e
+            if not self.many:
+                raise StructuredOutputError(f"{self.name}: {first_error.error_count()} validation error(s)") from first_error
+            items = data if isinstance(data, list) else [data]
+            kept = []
+            for item in items:
+                try:
+                    kept.append(self._item.validate_python(item))
+                except ValidationError:
+                    continue
+            if not kept:
+                raise StructuredOutputError(f"{self.name}: no item matched the schema") from first_error
+            metrics.inc("ollama_parse_salvaged_total", schema=self.name)
+            return self._dump(kept)
+
+    def _dump(self, value: Any) -> Any:
+        if self.many:
+            return [v.model_dump() for v in value]
+        return value.model_dump()
+
+
+VOFC_ITEMS = Schema("vofc_items", VulnerabilityItem, many=True)
+EXTRACTION_ITEMS = Schema("extraction_items", ExtractionItem, many=True)
+VOFC_DOCUMENT = Schema("vofc_document", VOFCDocument, many=False)
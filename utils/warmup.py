@@ -0,0 +1,168 @@
+"""
+Model warmup and residency management for the long-running services.
+
+At startup the configured generation and embedding models are loaded on every
+pool host with an empty request, so the first real request does not pay a cold
+load. While there is work, residency is renewed every KEEPALIVE_INTERVAL with
+OLLAMA_KEEP_ALIVE (the server default is only 5m) on the hosts that still have
+the model loaded; once the service has been idle for IDLE_RELEASE seconds the
+models are unloaded to free VRAM.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .ollama_client import load_model, renew_model, unload_model
+from .ollama_pool import get_pool
+
+
+logger = logging.getLogger(__name__)
+
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "15m")
+KEEPALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", "120"))
+IDLE_RELEASE = float(os.getenv("OLLAMA_IDLE_RELEASE", "900"))
+ENABLED = os.getenv("OLLAMA_WARMUP", "1").lower() not in ("0", "false", "no", "off")
+
+
+def default_models() -> List[Tuple[str, bool]]:
+    """(model, is_embedding) pairs for OLLAMA_MODEL and OLLAMA_EMBED_MODEL."""
+    return [
+        (os.getenv("OLLAMA_MODEL", "vofc-engine"), False),
+        (os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text"), True),
+    ]
+
+
+class ModelKeeper:
+    """
+    Keeps `models` resident while `busy()` is true and releases them after
+    `idle()` has held for IDLE_RELEASE seconds. By default both are derived
+    from the Ollama pool's own traffic.
+    """
+
+    def __init__(
+        self,
+        models: Optional[List[Tuple[str, bool]]] = None,
+        base_url: Optional[str] = None,
+        busy: Optional[Callable[[], bool]] = None,
+        idle: Optional[Callable[[], bool]] = None,
+        keep_alive: str = KEEP_ALIVE,
+        interval: float = KEEPALIVE_INTERVAL,
+        idle_release: float = IDLE_RELEASE,
+    ):
+        self.models = models or default_models()
+        self.pool = get_pool(base_url)
+        self.busy = busy or (lambda: self.pool.idle_seconds() < self.interval)
+        self.idle = idle or (lambda: not self.busy())
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.idle_release = idle_release
+        self.resident = False
+        self.warmup_seconds: Dict[str, float] = {}
+        self._idle_since: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def warmup(self) -> Dict[str, float]:
+        """Load every model on every host; returns the slowest load per model."""
+        start = time.monotonic()
+        loaded = 0
+        for model, embed in self.models:
+            slowest = 0.0
+            for url in self.pool.urls:
+                try:
+                    slowest = max(slowest, load_model(model, url, self.keep_alive, embed=embed))
+                    loaded += 1
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"Warmup of {model} on {url} failed: {e}")
+            self.warmup_seconds[model] = round(slowest, 2)
+            metrics.set_gauge("ollama_warmup_seconds", slowest, model=model)
+        self.resident = loaded > 0
+        logger.info(
+            f"Models resident after {time.monotonic() - start:.1f}s "
+            f"({', '.join(f'{m}={s}s' for m, s in self.warmup_seconds.items())}, keep_alive={self.keep_alive})"
+        )
+        return self.warmup_seconds
+
+    def renew(self) -> int:
+        """Extend keep_alive wherever a model is still loaded; returns the number of renewals."""
+        renewed = 0
+        for model, embed in self.models:
+            for url in self.pool.urls:
+                try:
+                    renewed += renew_model(model, url, self.keep_alive, embed=embed)
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"Keep-alive of {model} on {url} failed: {e}")
+        return renewed
+
+    def release(self) -> None:
+        for model, _ in self.models:
+            unload_model(model, self.pool.urls[0])
+        self.resident = False
+        logger.info(f"Idle for {self.idle_release:.0f}s; released {', '.join(m for m, _ in self.models)}")
+
+    def tick(self) -> None:
+        if self.busy():
+            self._idle_since = None
+            if self.resident:
+                self.renew()
+            else:
+                # Released earlier and work is waiting for these models again
+                self.warmup()
+            return
+        if not self.idle():
+            self._idle_since = None
+            return
+        now = time.monotonic()
+        if self._idle_since is None:
+            self._idle_since = now
+        elif self.resident and now - self._idle_since >= self.idle_release:
+            self.release()
+
+    def _run(self) -> None:
+        self.warmup()
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Keep-alive tick failed: {e}")
+
+    def start(self) -> "ModelKeeper":
+        """Warm up in the background (startup is not blocked) and keep renewing."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-keeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "resident": self.resident,
+            "keep_alive": self.keep_alive,
+            "warmup_seconds": dict(self.warmup_seconds),
+            "cold_starts": {m: int(metrics.get("ollama_model_loads_total", model=m)) for m, _ in self.models},
+        }
+
+
+_keeper: Optional[ModelKeeper] = None
+_keeper_lock = threading.Lock()
+
+
+def start_model_keeper(**kwargs) -> Optional[ModelKeeper]:
+    """Start the process-wide keeper once; returns None when OLLAMA_WARMUP is off."""
+    global _keeper
+    if not ENABLED:
+        return None
+    with _keeper_lock:
+        if _keeper is None:
+            _keeper = ModelKeeper(**kwargs).start()
+        return _keeper
+
+
+def model_keeper() -> Optional[ModelKeeper]:
+    return _keeper